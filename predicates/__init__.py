@@ -26,38 +26,527 @@ from collections import (
     Set,
     MutableSet,
     Sized,
+
+    OrderedDict,
     )
 
+from itertools import izip, imap, compress, repeat, islice
+from functools import partial
+
+from abc import ABCMeta
+from bisect import bisect_left
+
+import time
+import weakref
+
+
+# Predicate nodes
+# ---------------
+
+class Predicate (object):
+    """
+    Base class for the `callables` produced by the `predicate
+    factories`. Rather than opaque closures, the factories return
+    small, callable nodes, which make up an introspectable expression
+    tree. Each node exposes:
+
+    ``op``
+       The name of the factory which produced it (e.g., ``'_and'``).
+
+    ``children``
+       A tuple of the predicates it composes or applies (empty for
+       leaves, like :func:`_isa`).
+
+    ``params``
+       A tuple of its other (non-predicate) arguments (e.g., the
+       `classinfo` of an :func:`_isa`).
+
+    Nodes compare (and hash) *structurally*: two nodes are equal if
+    they have the same type, the same ``params``, and equal
+    ``children``. Parameters which aren't hashable (and :func:`_is`'s
+    `it`, always) compare by identity. E.g.,
+
+    .. code-block:: python
+
+       >>> _and(isstring, _not(isempty)) == _and(isstring, _not(isempty))
+       True
+
+    The ``&``, ``|``, and ``~`` operators build the same trees as
+    :func:`_and`, :func:`_or`, and :func:`_not`, respectively. E.g.,
+
+    .. code-block:: python
+
+       >>> (isstring & ~isempty) == _and(isstring, _not(isempty))
+       True
+
+    Every node can also evaluate a whole batch of values at once (see
+    :meth:`evaluate_many`).
+
+    The factories *intern* the (stateless) nodes they build, so that
+    structurally identical predicates are the same object. E.g.,
+
+    .. code-block:: python
+
+       >>> _and(isstring, _not(isempty)) is _and(isstring, _not(isempty))
+       True
+
+    So an interned node is shared by everything which built the same
+    predicate: anything set on it (e.g., its ``__doc__``) is seen by
+    all of them. A node whose docstring is changed, though, is no
+    longer handed out by the factories, which build (and intern) a new
+    one instead. To give a predicate a docstring of its own, pass it
+    to the factory, where it takes one (e.g., :func:`_isa`).
+
+    Subclasses must declare ``'__doc__'`` in their own `__slots__`
+    (and so can't have class docstrings), since each node carries its
+    own docstring.
+    """
+    # (the intern table holds its nodes by weak reference; `_hash`
+    # caches the structural hash, so that hashing a node doesn't
+    # descend into its children every time; and `_interneddoc` is the
+    # docstring an interned node was interned with)
+    __slots__ = ('__weakref__', '_hash', '_interneddoc')
+
+    op = None
+    children = ()
+    params = ()
+
+    @property
+    def __name__ (self):
+        # (the closures which nodes replaced had names, which
+        # `functools.wraps` copies onto the functions it wraps)
+        return self.op
+
+    def _key (self):
+        """
+        Returns the structural identity of this node (used for
+        equality and hashing).
+        """
+        return (tuple(_frozen(param) for param in self.params),
+                self.children)
+
+    def __eq__ (self, other):
+        # compares the keys of the two trees side by side, with a stack
+        # of the pairs still to compare (rather than recursing, so that
+        # deep trees can be compared), skipping identical subtrees, and
+        # those whose hashes differ
+        pending = [(self, other)]
+        while pending:
+            (a, b) = pending.pop()
+            if a is b:
+                continue
+            if isinstance(a, Predicate) and isinstance(b, Predicate):
+                if a.__class__ is not b.__class__:
+                    return False
+                try:
+                    if hash(a) != hash(b):
+                        return False
+                except TypeError:
+                    pass
+                pending.append((a._key(), b._key()))
+            elif type(a) is tuple and type(b) is tuple:
+                if len(a) != len(b):
+                    return False
+                pending.extend(izip(a, b))
+            elif isinstance(a, Predicate) or isinstance(b, Predicate):
+                return False
+            elif not a == b:
+                return False
+        return True
+
+    def __ne__ (self, other):
+        return not self == other
+
+    def __hash__ (self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.__class__, self._key()))
+            return self._hash
+
+    def __and__ (self, other):
+        return _and(self, other)
+
+    def __rand__ (self, other):
+        return _and(other, self)
+
+    def __or__ (self, other):
+        return _or(self, other)
+
+    def __ror__ (self, other):
+        return _or(other, self)
+
+    def __invert__ (self):
+        return _not(self)
+
+    def __repr__ (self):
+        return "%s(%s)" % (self.op,
+                           ", ".join(_name(arg)
+                                     for arg
+                                     in self.children + self.params))
+
+    def evaluate_many (self, values):
+        """
+        Returns a :func:`bytearray` of the truth of this predicate for
+        each of ``values`` (each of which is passed to it as its only
+        argument): ``1`` where it is true, and ``0`` where it is false.
+
+        The overhead is paid per batch, not per value: e.g., an
+        :func:`_and` evaluates each child only on the values which
+        survived the children before it, and an :func:`_isa` checks
+        each distinct type just once.
+        """
+        if not isinstance(values, list):
+            values = list(values)
+        return self._many(values)
+
+    def filter_many (self, values):
+        """
+        Returns a list of the ``values`` for which this predicate is
+        true (see :meth:`evaluate_many`).
+        """
+        if not isinstance(values, list):
+            values = list(values)
+        return list(compress(values, self._many(values)))
+
+    def partition_many (self, values):
+        """
+        Returns a tuple of two lists: the ``values`` for which this
+        predicate is true, and those for which it is false (see
+        :meth:`evaluate_many`).
+        """
+        if not isinstance(values, list):
+            values = list(values)
+        flags = self._many(values)
+        return (list(compress(values, flags)),
+                list(compress(values, flags.translate(_inverse))))
+
+    def _many (self, values):
+        """
+        Returns the :meth:`evaluate_many` of the list ``values``.
+        Nodes which can do better than a call per value override this.
+        """
+        return bytearray(imap(truth, imap(self, values)))
+
+    def _fast (self):
+        """
+        Returns a `callable` equivalent to this node, for callers which
+        hold on to it and call it over and over (e.g., a composite
+        calling its children). Calling a node goes through its class's
+        ``__call__`` slot, which costs about twice what calling a
+        function does, so nodes which can be stood in for by a closure
+        (or a builtin) override this.
+        """
+        return self.__call__
+
+def _fast (pred):
+    """
+    Returns the :meth:`~Predicate._fast` callable of ``pred``, or
+    ``pred`` itself if it isn't a node.
+    """
+    if isinstance(pred, Predicate):
+        return pred._fast()
+    return pred
+
+class _Identity (object):
+    # stand-in for parameters that compare by identity in a node's
+    # structural key (it holds on to `obj`, so its `id` can't be
+    # reused while the key is alive)
+    __slots__ = ('obj',)
+
+    def __init__ (self, obj):
+        self.obj = obj
+
+    def __eq__ (self, other):
+        return isinstance(other, _Identity) and self.obj is other.obj
+
+    def __ne__ (self, other):
+        return not self == other
+
+    def __hash__ (self):
+        return id(self.obj)
+
+def _frozen (val):
+    """
+    Returns ``val`` if it is hashable, otherwise a stand-in which
+    compares by identity, so it can be part of a node's structural
+    key.
+    """
+    try:
+        hash(val)
+    except TypeError:
+        return _Identity(val)
+    return val
+
+# the most nodes the intern table holds (it's emptied when it's full)
+#
+# Interning isn't free: building a node, and looking up its structural
+# key, costs several microseconds (many times what building a closure
+# did), so build predicates once, ahead of time, rather than in a hot
+# loop. The commonest factories (the composites, :func:`_args`, and
+# :func:`_isa`) look their nodes up by the identities of their
+# children first (see :func:`_quickly`), which is cheaper, but still
+# not free.
+maxinterned = 65536
+
+_interntable = weakref.WeakValueDictionary()
+
+# the interned nodes, by `id` (they stay here, until they're collected,
+# even once the table is emptied)
+_internedids = weakref.WeakValueDictionary()
+
+def _interned (node):
+    """
+    Returns the interned node which is structurally identical to
+    ``node`` (and has the same docstring, and the same types of
+    ``params``, so, e.g., ``_nis(1, 2)`` is not ``_nis(1.0, 2.0)``),
+    interning ``node`` itself if there isn't one yet.
+
+    The table holds its nodes by weak reference, so a node drops out
+    of it as soon as nothing else uses it. Nodes with unhashable
+    children aren't interned.
+
+    Only *stateless* nodes may be interned: the factories of nodes
+    with caches or statistics (e.g., :func:`_memo`, or :func:`_isa`
+    with a `cachesize`) build a new node every time. Nor is any node
+    with a child node which wasn't interned, since the child may have
+    state of its own, which an interned twin (equal, but for its
+    state) would lose.
+
+    An interned node whose docstring has since been changed is no
+    longer returned (see :func:`_current`): ``node`` takes its place.
+    """
+    for child in node.children:
+        if (isinstance(child, Predicate) and
+            _internedids.get(id(child)) is not child):
+            # (hashed now, while its children's hashes are cached, so
+            # that hashing a deep tree never descends all the way down)
+            try:
+                hash(node)
+            except TypeError:
+                pass
+            return node
+
+    try:
+        key = (node.__class__, node.__doc__, node._key(),
+               tuple(imap(type, node.params)))
+        interned = _interntable.get(key)
+    except TypeError:
+        return node
+
+    if interned is not None and _current(interned):
+        return interned
+
+    if len(_interntable) >= maxinterned:
+        _interntable.clear()
+    _interntable[key] = node
+    _internedids[id(node)] = node
+    node._interneddoc = node.__doc__
+    return node
+
+def _current (node):
+    """
+    `True` unless the docstring of the interned ``node`` has changed
+    since it was interned (under its old docstring).
+    """
+    return node.__doc__ is node._interneddoc
+
+# the interned nodes, by a key of their class and (hashable) params and
+# the `id`s of their children (which they hold on to, so the `id`s
+# can't be reused while they're in here)
+_quicktable = weakref.WeakValueDictionary()
+
+def _quickly (prefix, children, build, *args):
+    """
+    Returns the interned ``build(*args)``, whose ``children`` are
+    exactly (by identity) ``children``, and whose class and params are
+    summed up by the (hashable) ``prefix``. It's looked up by
+    ``prefix`` and the identities of ``children`` first, so that a
+    factory called again with the same arguments skips building, and
+    keying, a new node.
+    """
+    key = prefix + tuple(imap(id, children))
+    try:
+        node = _quicktable.get(key)
+    except TypeError:
+        return _interned(build(*args))
+    if node is not None and _current(node):
+        return node
+
+    node = _interned(build(*args))
+    # (only a node which holds on to `children` itself may be found by
+    # their `id`s)
+    if (_internedids.get(id(node)) is node and
+        len(node.children) == len(children) and
+        all(imap(is_, node.children, children))):
+        if len(_quicktable) >= maxinterned:
+            _quicktable.clear()
+        _quicktable[key] = node
+    return node
+
+# :meth:`bytearray.translate` table which inverts batch results
+_inverse = bytearray(256)
+_inverse[0] = 1
+
+def _evaluated (pred, values):
+    """
+    Returns the :meth:`~Predicate.evaluate_many` of ``pred`` (which
+    needn't be a node) for the list ``values``.
+    """
+    if isinstance(pred, Predicate):
+        return pred._many(values)
+    return bytearray(imap(truth, imap(pred, values)))
+
+def _name (obj):
+    """
+    Returns a short, readable name for ``obj`` (for node reprs).
+    """
+    if isinstance(obj, Predicate):
+        return repr(obj)
+    return getattr(obj, '__name__', None) or repr(obj)
+
 
 # Predicate composition
 # ---------------------
 
+class _Composite (Predicate):
+    __slots__ = ()
+
+    # `calls` holds the :func:`_fast` callables of the children, which
+    # are what `__call__` actually calls
+    def __init__ (self, predicates):
+        self.children = predicates
+        self.calls = tuple(imap(_fast, predicates))
+        self.__doc__ = None
+
+    def _undecided (self, values, decides):
+        """
+        Returns the indices of the ``values`` for which *none* of the
+        children is ``decides``, evaluating each child only on the
+        values left undecided by the children before it.
+        """
+        indices = range(len(values))
+        remaining = values
+        for pred in self.children:
+            if not indices:
+                break
+            flags = _evaluated(pred, remaining)
+            if decides:
+                flags = flags.translate(_inverse)
+            indices = list(compress(indices, flags))
+            remaining = map(values.__getitem__, indices)
+        return indices
+
+class _And (_Composite):
+    __slots__ = ('__doc__', 'children', 'calls')
+    op = '_and'
+
+    def __call__ (self, *args, **kwargs):
+        for pred in self.calls:
+            if not pred(*args, **kwargs):
+                return False
+        return True
+
+    def _many (self, values):
+        result = bytearray(len(values))
+        for i in self._undecided(values, False):
+            result[i] = 1
+        return result
+
+class _Or (_Composite):
+    __slots__ = ('__doc__', 'children', 'calls')
+    op = '_or'
+
+    def __call__ (self, *args, **kwargs):
+        for pred in self.calls:
+            if pred(*args, **kwargs):
+                return True
+        return False
+
+    def _many (self, values):
+        result = bytearray(b'\x01') * len(values)
+        for i in self._undecided(values, True):
+            result[i] = 0
+        return result
+
+class _Not (_Composite):
+    __slots__ = ('__doc__', 'children', 'calls')
+    op = '_not'
+
+    def __call__ (self, *args, **kwargs):
+        for pred in self.calls:
+            if pred(*args, **kwargs):
+                return False
+        return True
+
+    def _many (self, values):
+        result = bytearray(len(values))
+        for i in self._undecided(values, True):
+            result[i] = 1
+        return result
+
+class _Zip (_Composite):
+    __slots__ = ('__doc__', 'children', 'calls')
+    op = '_zip'
+
+    def __call__ (self, *args, **kwargs):
+        for (predicate, arg) in izip(self.calls, args):
+            if not predicate(arg):
+                return False
+        return True
+
+    def _many (self, values):
+        # a single argument only meets the first predicate
+        if not self.children:
+            return bytearray(b'\x01') * len(values)
+        return _evaluated(self.children[0], values)
+
 def _and (*predicates):
     """
     Returns a `callable` which returns `True` if *all* ``predicates``
     are true. This *is* short-circuiting.
+
+    If *all* of the ``predicates`` are argument-structure predicates
+    (:func:`_npos`, :func:`_nkw`, :func:`_nargs`, :func:`_inkw`, and
+    :func:`_arity`), they are fused into a single :func:`_arity`. E.g.,
+    ``_and(_npos(atmost=2), _inkw(atleast=['jack']))`` checks both
+    constraints in one call.
     """
-    def _and (*args, **kwargs):
-        return all(pred(*args, **kwargs) for pred in predicates)
-    return _and
+    if len(predicates) > 1 and all(isinstance(pred, _Arity)
+                                   for pred in predicates):
+        return _fusedarity(predicates)
+    return _quickly((_And,), predicates, _And, predicates)
 
 def _or (*predicates):
     """
     Returns a `callable` which returns `True` if *any* ``predicates``
     are true. This *is* short-circuiting.
+
+    If *all* of the ``predicates`` are :func:`_isa` predicates, they
+    are fused into a single :func:`_isa` of all of their classes
+    (which :func:`isinstance` checks in a single call). E.g.,
+    ``_or(isint, isfloat)`` is ``_isa((int, float))``.
     """
-    def _or (*args, **kwargs):
-        return any(pred(*args, **kwargs) for pred in predicates)
-    return _or
+    if len(predicates) > 1 and all(isinstance(pred, _IsA)
+                                   for pred in predicates):
+        return _fused(predicates)
+    return _quickly((_Or,), predicates, _Or, predicates)
 
 def _not (*predicates):
     """
     Returns a `callable` which returns `True` if *none* of the
     ``predicates`` are true.
+
+    As with :func:`_or`, if *all* of the ``predicates`` are
+    :func:`_isa` predicates, they are fused into a single
+    :func:`_isa`. E.g., ``_not(isint, isfloat)`` is
+    ``_not(_isa((int, float)))``.
     """
-    def _not (*args, **kwargs):
-        return not any(pred(*args, **kwargs) for pred in predicates)
-    return _not
+    if len(predicates) > 1 and all(isinstance(pred, _IsA)
+                                   for pred in predicates):
+        fused = (_fused(predicates),)
+        return _quickly((_Not,), fused, _Not, fused)
+    return _quickly((_Not,), predicates, _Not, predicates)
 
 def _zip (*predicates):
     """
@@ -78,42 +567,191 @@ def _zip (*predicates):
     (i.e., `n x m`). While we're on the subject, should we add a
     cross-product factory?
     """
-    def _zip (*args, **kwargs):
-        return all(predicate(arg)
-                   for (predicate, arg)
-                   in zip(predicates, args))
-    return _zip
+    return _quickly((_Zip,), predicates, _Zip, predicates)
 
 
 # Predicate application
 # ---------------------
 
+class _Application (Predicate):
+    __slots__ = ()
+
+    def __init__ (self, predicate):
+        self.predicate = predicate
+        self.__doc__ = None
+
+    @property
+    def children (self):
+        return (self.predicate,)
+
+class _All (_Application):
+    __slots__ = ('__doc__', 'predicate')
+    op = '_all'
+
+    def __call__ (self, *args, **kwargs):
+        predicate = self.predicate
+        for arg in args:
+            if not predicate(arg):
+                return False
+        return True
+
+    def _many (self, values):
+        return _evaluated(self.predicate, values)
+
+class _Any (_Application):
+    __slots__ = ('__doc__', 'predicate')
+    op = '_any'
+
+    def __call__ (self, *args, **kwargs):
+        predicate = self.predicate
+        for arg in args:
+            if predicate(arg):
+                return True
+        return False
+
+    def _many (self, values):
+        return _evaluated(self.predicate, values)
+
+class _None (_Application):
+    __slots__ = ('__doc__', 'predicate')
+    op = '_none'
+
+    def __call__ (self, *args, **kwargs):
+        predicate = self.predicate
+        for arg in args:
+            if predicate(arg):
+                return False
+        return True
+
+    def _many (self, values):
+        return _evaluated(self.predicate, values).translate(_inverse)
+
 def _all (predicate):
     """
     Returns a `callable` which returns `True` if ``predicate`` returns
     `True` for *all* of its *positional* arguments.
     """
-    def _all (*args, **kwargs):
-        return all(predicate(arg) for arg in args)
-    return _all
+    return _quickly((_All,), (predicate,), _All, predicate)
 
 def _any (predicate):
     """
     Returns a `callable` which returns `True` if ``predicate`` returns
     `True` for *any* of its *positional* arguments.
     """
-    def _any (*args, **kwargs):
-        return any(predicate(arg) for arg in args)
-    return _any
+    return _quickly((_Any,), (predicate,), _Any, predicate)
 
 def _none (predicate):
     """
     Returns a `callable` which returns `True` if ``predicate`` returns
     `True` for *none* of its *positional* arguments.
     """
-    def _none (*args, **kwargs):
-        return all(not predicate(arg) for arg in args)
-    return _none
+    return _quickly((_None,), (predicate,), _None, predicate)
+
+class _Streaming (_Application):
+    # `chunksize` is `None` to evaluate one item at a time
+    __slots__ = ()
+
+    def __init__ (self, predicate, chunksize):
+        self.predicate = predicate
+        self.chunksize = chunksize
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return (self.chunksize,)
+
+    def _flags (self, iterable):
+        """
+        Yields the :meth:`~Predicate.evaluate_many` of each chunk of
+        ``iterable``.
+        """
+        iterator = iter(iterable)
+        while True:
+            chunk = list(islice(iterator, self.chunksize))
+            if not chunk:
+                return
+            yield _evaluated(self.predicate, chunk)
+
+class _Each (_Streaming):
+    __slots__ = ('__doc__', 'predicate', 'chunksize')
+    op = '_each'
+
+    def __call__ (self, iterable):
+        if self.chunksize is None:
+            return all(imap(self.predicate, iterable))
+        for flags in self._flags(iterable):
+            if 0 in flags:
+                return False
+        return True
+
+class _Some (_Streaming):
+    __slots__ = ('__doc__', 'predicate', 'chunksize')
+    op = '_some'
+
+    def __call__ (self, iterable):
+        if self.chunksize is None:
+            return any(imap(self.predicate, iterable))
+        for flags in self._flags(iterable):
+            if 1 in flags:
+                return True
+        return False
+
+class _NoneOf (_Streaming):
+    __slots__ = ('__doc__', 'predicate', 'chunksize')
+    op = '_noneof'
+
+    def __call__ (self, iterable):
+        if self.chunksize is None:
+            return not any(imap(self.predicate, iterable))
+        for flags in self._flags(iterable):
+            if 1 in flags:
+                return False
+        return True
+
+def _chunksize (chunksize):
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("'chunksize' must be at least 1")
+    return chunksize
+
+def _each (predicate, chunksize=None):
+    """
+    Returns a `callable` which returns `True` if ``predicate`` returns
+    `True` for *each* item of its (single) `iterable` argument.
+
+    The signature of the returned `callable` is:
+
+    .. function:: fn (iterable) -> bool
+
+    Unlike ``_apply(_all(predicate))``, which unpacks the whole
+    `iterable` into `*args` before checking anything, it consumes the
+    `iterable` lazily, and stops at the first item for which
+    ``predicate`` is false. E.g., it checks a generator over a huge
+    file without ever holding more than one line in memory.
+
+    If `chunksize` is given, it consumes (up to) `chunksize` items at
+    a time, and evaluates each chunk with
+    :meth:`~Predicate.evaluate_many`, which amortizes the per-item
+    overhead, at the cost of stopping at the end of the first chunk
+    with a false item, rather than at the item itself.
+    """
+    return _interned(_Each(predicate, _chunksize(chunksize)))
+
+def _some (predicate, chunksize=None):
+    """
+    Returns a `callable` which returns `True` if ``predicate`` returns
+    `True` for *any* item of its (single) `iterable` argument. It
+    stops at the first such item. See :func:`_each`.
+    """
+    return _interned(_Some(predicate, _chunksize(chunksize)))
+
+def _noneof (predicate, chunksize=None):
+    """
+    Returns a `callable` which returns `True` if ``predicate`` returns
+    `True` for *none* of the items of its (single) `iterable`
+    argument. It stops at the first item for which ``predicate`` is
+    true. See :func:`_each`.
+    """
+    return _interned(_NoneOf(predicate, _chunksize(chunksize)))
 
 
 # Argument predicates
@@ -271,50 +909,41 @@ class ArgSlicer (object):
          >>> fn("bad robot!", 'sawyer', 23, jack=4, kate='15')
          False
 
-    .. note::
-
-       **TODO:** use multi-dimensional extended slice syntax to apply
-       predicates to specific args. E.g.,
+    * Multi-dimensional :meth:`~object.__getitem__` access to
+      positional and keyword arguments:
 
-       .. code-block:: python
+      Apply a separate predicate to each selector of the key: here,
+      `args[0]` must be a string, `args[1]` an integer, `args[3:5]`
+      floats, and the ``hurley`` keyword argument an integer. Selectors
+      may be indices, slices, or keyword names (and keyword predicates
+      may also be passed as keyword arguments, as above).
 
-          >>> fn = _args[0, 1, 3:5](isstring, isint, isfloat, hurley=isint)
-          >>> fn("bad robot!", 4, (), 8.0, 15.0, hurley=16)
-          True
-
-       Another option is to put the keyword args into the slice:
-
-       .. code-block:: python
+      .. code-block:: python
 
-          >>> fn = _args[0, 1, 3:5, 'hurley'](
-          ...         isstring, isint, isfloat, isint)
-          >>> fn("bad robot!", 4, (), 8.0, 15.0, hurley=16)
-          True
+         >>> fn = _args[0, 1, 3:5, 'hurley'](
+         ...         isstring, isint, isfloat, isint)
+         >>> fn("bad robot!", 4, (), 8.0, 15.0, hurley=16)
+         True
+         >>> fn("bad robot!", 4, (), 8.0, 15, hurley=16)
+         False
 
-       ...or is it starting to get ridiculous? I don't like the
-       increasing distance between the arg selector (the `key` to
-       :meth:`~object.__getitem__`) and the corresponding
-       predicate. Maybe we should move to the simpler ``_args(p0, p1,
-       p2, key1=p3, key2=p4)`` form? Combining :func:`_all` and
-       :func:`_apply` would let us duplicate the behaviour of the
-       current ``_args(predicate)``, but we'd lose the ability to
-       (easily) apply separate predicates to *ranges* of args,
-       including *overlapping* ranges, like we get with the
-       multidimensional slice. E.g.,
+      Selectors may overlap, in which case the arguments they share
+      must satisfy each of their predicates:
 
-       .. code-block:: python
+      .. code-block:: python
 
-          >>> fn = _args[0:4, 3:5](isstring, _not(isempty))
-          >>> fn('', '', "bad robot!")
-          True
-          >>> fn('', "bad robot!", '', 'jack', (42,))
-          True
-          >>> fn('', "bad robot!", '', 'jack', ())
-          False
+         >>> fn = _args[0:4, 3:5](isstring, _not(isempty))
+         >>> fn('', '', "bad robot!")
+         True
+         >>> fn('', "bad robot!", '', 'jack', (42,))
+         True
+         >>> fn('', "bad robot!", '', 'jack', ())
+         False
 
-       Ultimately, what I'm looking for is a "single point of truth"
-       for specifying, concisely, constraints on all of the arguments
-       I care about.
+      The selectors are resolved into a table of the predicates for
+      each argument index (once for each number of positional
+      arguments seen), so each call checks each argument exactly once,
+      in a single pass.
     """
 
     def __call__ (self, pos_predicate=None, **kwargs):
@@ -332,15 +961,14 @@ class ArgSlicer (object):
         each element of the slice of its args using this function's
         `key` argument. I.e., ``args[key]``.
 
-        **NOTE:** keys must (currently) be integers or :func:`slice`
-        objects.
+        Keys are integers, :func:`slice` objects, keyword names, or
+        tuples of them (i.e., multi-dimensional keys), in which case the
+        factory takes one predicate for each element of the key.
         """
-        # replace each non-slice element of `key` with an equivalent
-        # slice, forcing the result to be a tuple (we need `args[0]`
-        # to return `(x,)`, not `x`, so we can use it as `*args[0]` ).
-        key = (key if isslice(key)
-               else slice(key, key+1) if key >= 0
-               else slice(key, None))
+        if istuple(key) or isstring(key):
+            return self._multi(key if istuple(key) else (key,))
+
+        key = _selector(key)
 
         def _args_factory (pos_predicate=None, **kw_predicates):
             """
@@ -357,33 +985,240 @@ class ArgSlicer (object):
                     "must specify a predicate for positional args, " +
                     "a set of predicates for keyword args, or both.")
 
-            # keyword predicates only
-            if not pos_predicate:
-                def _args (*args, **kwargs):
-                    return all(predicate(kwargs.get(kw, None))
-                               for (kw, predicate)
-                               in kw_predicates.items())
-                return _args
-
-            # get a predicate to map the predicate to an iterable
-            pos_predicate = _all(pos_predicate)
-
-            # positional predicate only
-            if not kw_predicates:
-                def _args (*args, **kwargs):
-                    return pos_predicate(*args[key])
-                return _args
-
-            # positional *and* keyword predicates
-            def _args (*args, **kwargs):
-                return (pos_predicate(*args[key]) and
-                        all(predicate(kwargs.get(kw, None))
-                            for (kw, predicate)
-                            in kw_predicates.items()))
-            return _args
+            pos_predicate = pos_predicate or None
+            kws = tuple(sorted(kw_predicates))
+            children = tuple(kw_predicates[kw] for kw in kws)
+            if pos_predicate is not None:
+                children = (pos_predicate,) + children
+            return _quickly((_Args, key.start, key.stop, key.step,
+                             pos_predicate is None, kws),
+                            children, _Args, key, pos_predicate,
+                            kw_predicates)
         return _args_factory
+
+    def _multi (self, key):
+        """
+        Returns the `predicate factory` for the multi-dimensional
+        ``key``.
+        """
+        selectors = tuple(sel if isstring(sel) else _selector(sel)
+                          for sel in key)
+
+        def _args_factory (*predicates, **kw_predicates):
+            """
+            Returns a `callable` which returns `True` if each of the
+            ``predicates`` returns `True` for each of the args its
+            corresponding selector (in the original `key`) selects,
+            and, for each `(kw, predicate)` pair in `kw_predicates`,
+            applying the predicate to ``kwargs[kw]`` returns `True`.
+            """
+            if len(predicates) != len(selectors):
+                raise ValueError(
+                    "must specify one predicate for each of the %d "
+                    "selectors (got %d)" % (len(selectors), len(predicates)))
+
+            return _ArgsPlan(zip(selectors, predicates) +
+                             sorted(kw_predicates.items()))
+        return _args_factory
+
+def _selector (key):
+    """
+    Returns the slice equivalent to the `_args[...]` selector ``key``
+    (an index, or a slice), forcing the selection to be a tuple (we
+    need `args[0]` to return `(x,)`, not `x`, so we can use it as
+    `*args[0]`).
+    """
+    if isslice(key):
+        return key
+    return slice(key, key + 1 or None)
+
+# the most shapes of `_args` node to generate a subclass for (nodes of
+# any other shape are `_GenericArgs`)
+maxargshapes = 256
+
+# the `_Args` subclass for each shape of `_args` node
+_argshapes = {}
+
+class _Args (Predicate):
+    # each distinct *shape* of node (its slice, whether or not it has a
+    # positional predicate, and its keyword names) is an instance of
+    # its own subclass (up to `maxargshapes` of them), whose `__call__`
+    # is generated, straight-line code (see
+    # :func:`predicates.codegen._validator`), which calls the
+    # :func:`_fast` callables, `call` and `kwcalls`, of the predicates
+    __slots__ = ('key', 'predicate', 'kw_predicates', 'call', 'kwcalls')
+    op = '_args'
+
+    def __new__ (cls, key, predicate, kw_predicates):
+        shape = ((key.start, key.stop, key.step),
+                 predicate is not None,
+                 tuple(sorted(kw_predicates)))
+        try:
+            shaped = _argshapes[shape]
+        except KeyError:
+            if len(_argshapes) >= maxargshapes:
+                return Predicate.__new__(_GenericArgs)
+            shaped = _argshapes[shape] = type('_Args', (_Args,), {
+                '__slots__': ('__doc__',),
+                '__call__': _validator(key, shape[1], shape[2]),
+                })
+        return Predicate.__new__(shaped)
+
+    def __init__ (self, key, predicate, kw_predicates):
+        self.key = key
+        self.predicate = predicate
+        self.kw_predicates = tuple(sorted(kw_predicates.items()))
+        self.call = _fast(predicate)
+        self.kwcalls = tuple((kw, _fast(pred))
+                             for (kw, pred) in self.kw_predicates)
+        self.__doc__ = None
+
+    @property
+    def children (self):
+        children = tuple(pred for (kw, pred) in self.kw_predicates)
+        if self.predicate is not None:
+            children = (self.predicate,) + children
+        return children
+
+    @property
+    def params (self):
+        return (self.key,) + tuple(kw for (kw, pred) in self.kw_predicates)
+
+    def _key (self):
+        # slices aren't hashable
+        key = self.key
+        return ((key.start, key.stop, key.step),
+                self.predicate, self.kw_predicates)
+
+    def __repr__ (self):
+        bounds = [self.key.start, self.key.stop, self.key.step]
+        if bounds[-1] is None:
+            bounds.pop()
+        key = ':'.join('' if bound is None else str(bound)
+                       for bound in bounds)
+        args = ([_name(self.predicate)] if self.predicate is not None
+                else [])
+        args.extend("%s=%s" % (kw, _name(pred))
+                    for (kw, pred) in self.kw_predicates)
+        return "_args[%s](%s)" % (key, ", ".join(args))
+
+class _GenericArgs (_Args):
+    # the (shared) `_Args` subclass for nodes whose shape there's no
+    # room for in `_argshapes`, which loops over the slice and the
+    # keywords, rather than running straight-line code
+    __slots__ = ('__doc__',)
+
+    def __call__ (self, *args, **kwargs):
+        call = self.call
+        if call is not None:
+            for arg in args[self.key]:
+                if not call(arg):
+                    return False
+        for (kw, call) in self.kwcalls:
+            if not call(kwargs.get(kw)):
+                return False
+        return True
+
+class _ArgsPlan (Predicate):
+    # `selectors` pairs each element of a multi-dimensional key (a
+    # slice, or a keyword name) with its predicate. `keywords` pairs
+    # each keyword name with the predicate(s) for it, and `plans`
+    # caches, by the number of positional args, the `(index,
+    # predicate)` pairs to check.
+    __slots__ = ('__doc__', 'selectors', 'keywords', 'plans')
+    op = '_args'
+
+    # the most plans to cache (one per distinct number of args)
+    maxplans = 64
+
+    def __init__ (self, selectors):
+        self.selectors = tuple(selectors)
+        keywords = {}
+        for (sel, pred) in self.selectors:
+            if isstring(sel):
+                keywords.setdefault(sel, []).append(pred)
+        self.keywords = tuple((kw, _combined(preds))
+                              for (kw, preds) in sorted(keywords.items()))
+        self.plans = {}
+        self.__doc__ = None
+
+    @property
+    def children (self):
+        return tuple(pred for (sel, pred) in self.selectors)
+
+    @property
+    def params (self):
+        return tuple(sel for (sel, pred) in self.selectors)
+
+    def _key (self):
+        # slices aren't hashable
+        return (tuple(sel if isstring(sel) else (sel.start, sel.stop, sel.step)
+                      for (sel, pred) in self.selectors),
+                self.children)
+
+    def _plan (self, nargs):
+        """
+        Returns (and caches) the `(index, predicate)` pairs to check
+        for a call with ``nargs`` positional args, in index order, with
+        a single predicate for each index.
+        """
+        table = {}
+        for (sel, pred) in self.selectors:
+            if not isstring(sel):
+                for i in xrange(*sel.indices(nargs)):
+                    preds = table.setdefault(i, [])
+                    if pred not in preds:
+                        preds.append(pred)
+
+        plan = tuple((i, _combined(table[i])) for i in sorted(table))
+        if len(self.plans) >= self.maxplans:
+            self.plans.clear()
+        self.plans[nargs] = plan
+        return plan
+
+    def __call__ (self, *args, **kwargs):
+        try:
+            plan = self.plans[len(args)]
+        except KeyError:
+            plan = self._plan(len(args))
+
+        for (i, predicate) in plan:
+            if not predicate(args[i]):
+                return False
+        for (kw, predicate) in self.keywords:
+            if not predicate(kwargs.get(kw)):
+                return False
+        return True
+
+    def __repr__ (self):
+        keys = []
+        for (sel, pred) in self.selectors:
+            if isstring(sel):
+                keys.append(repr(sel))
+                continue
+            bounds = [sel.start, sel.stop, sel.step]
+            if bounds[-1] is None:
+                bounds.pop()
+            keys.append(':'.join('' if bound is None else str(bound)
+                                 for bound in bounds))
+        return "_args[%s](%s)" % (", ".join(keys),
+                                  ", ".join(_name(pred)
+                                            for pred in self.children))
+
+def _combined (predicates):
+    """
+    Returns the single predicate which is true where all of
+    ``predicates`` are.
+    """
+    if len(predicates) == 1:
+        return predicates[0]
+    return _And(tuple(predicates))
+
 _args = ArgSlicer()
 
+# the upper bound of an unbounded range
+_inf = float('inf')
+
 def _nargs (atleast=False, atmost=False, exactly=False):
     """
     Returns a `callable` which returns `True` if it is called with `at
@@ -394,10 +1229,12 @@ def _nargs (atleast=False, atmost=False, exactly=False):
 
     `atleast` and `atmost` may be combined, but `exactly` must stand
     alone.
+
+    Like the other argument-structure predicates, it returns an
+    :func:`_arity` node, and an :func:`_and` of them is fused into one.
     """
-    def length (*args, **kwargs):
-        return len(args) + len(kwargs)
-    return _fnis(length, atleast, atmost, exactly)
+    nis = _nis(atleast, atmost, exactly)
+    return _interned(_Arity(nargs=(nis.atleast, nis.atmost)))
 
 def _npos (atleast=False, atmost=False, exactly=False):
     """
@@ -409,9 +1246,8 @@ def _npos (atleast=False, atmost=False, exactly=False):
     `atleast` and `atmost` may be combined, but `exactly` must stand
     alone.
     """
-    def length (*args, **kwargs):
-        return len(args)
-    return _fnis(length, atleast, atmost, exactly)
+    nis = _nis(atleast, atmost, exactly)
+    return _interned(_Arity(npos=(nis.atleast, nis.atmost)))
 
 def _nkw (atleast=False, atmost=False, exactly=False):
     """
@@ -423,9 +1259,8 @@ def _nkw (atleast=False, atmost=False, exactly=False):
     `atleast` and `atmost` may be combined, but `exactly` must stand
     alone.
     """
-    def length (*args, **kwargs):
-        return len(kwargs)
-    return _fnis(length, atleast, atmost, exactly)
+    nis = _nis(atleast, atmost, exactly)
+    return _interned(_Arity(nkw=(nis.atleast, nis.atmost)))
 
 def _inkw (atleast=False, atmost=False, exactly=False):
     """
@@ -450,10 +1285,8 @@ def _inkw (atleast=False, atmost=False, exactly=False):
             raise ValueError(
                 "cannot mix 'exactly' and 'atleast' or 'atmost'")
 
-        def _inkw (*args, **kwargs):
-            return (len(kwargs) == len(exactly)
-                    and all(kw in kwargs for kw in exactly))
-        return _inkw
+        exactly = frozenset(exactly)
+        return _interned(_Arity(required=exactly, allowed=exactly))
 
     if atleast is False and atmost is False:
         raise ValueError(
@@ -461,19 +1294,90 @@ def _inkw (atleast=False, atmost=False, exactly=False):
 
     if atleast is False:
         atleast = ()
-    atleast = frozenset(atleast)
 
-    if atmost is False:
-        def _inkw (*args, **kwargs):
-            keys = frozenset(kwargs.keys())
-            return keys >= atleast
-        return _inkw
+    return _interned(_Arity(required=frozenset(atleast),
+                            allowed=(None if atmost is False
+                                     else frozenset(atmost))))
 
-    atmost = frozenset(atmost)
-    def _inkw (*args, **kwargs):
-        keys = frozenset(kwargs.keys())
-        return atleast <= keys <= atmost
-    return _inkw
+def _arity (npos=(0, _inf), nkw=(0, _inf), nargs=(0, _inf),
+            required=frozenset(), allowed=None):
+    """
+    Returns a `callable` which returns `True` if it is called with
+    between ``npos[0]`` and ``npos[1]`` positional arguments, between
+    ``nkw[0]`` and ``nkw[1]`` keyword arguments, and between
+    ``nargs[0]`` and ``nargs[1]`` arguments in all (inclusive), *all*
+    of the keyword arguments named in `required`, and (unless
+    `allowed` is :data:`None`) *only* keyword arguments named in
+    `allowed`.
+
+    This is the single check into which :func:`_npos`, :func:`_nkw`,
+    :func:`_nargs`, and :func:`_inkw` (and :func:`_and`\ s of them)
+    compile. It makes no allocations of its own, and a single call,
+    however many constraints it combines.
+    """
+    return _interned(_Arity(npos, nkw, nargs, frozenset(required),
+                            None if allowed is None else frozenset(allowed)))
+
+class _Arity (Predicate):
+    # the bounds are inclusive; `allowed` is `None` when any keyword
+    # names are allowed
+    __slots__ = ('__doc__', 'minpos', 'maxpos', 'minkw', 'maxkw',
+                 'minargs', 'maxargs', 'required', 'allowed')
+    op = '_arity'
+
+    def __init__ (self, npos=(0, _inf), nkw=(0, _inf), nargs=(0, _inf),
+                  required=frozenset(), allowed=None):
+        (self.minpos, self.maxpos) = npos
+        (self.minkw, self.maxkw) = nkw
+        (self.minargs, self.maxargs) = nargs
+        self.required = required
+        self.allowed = allowed
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return ((self.minpos, self.maxpos), (self.minkw, self.maxkw),
+                (self.minargs, self.maxargs), self.required, self.allowed)
+
+    def __call__ (self, *args, **kwargs):
+        npos = len(args)
+        nkw = len(kwargs)
+        if not (self.minpos <= npos <= self.maxpos and
+                self.minkw <= nkw <= self.maxkw and
+                self.minargs <= npos + nkw <= self.maxargs):
+            return False
+
+        # (iterating over `required` doesn't build a set of the
+        # `kwargs`, as :meth:`frozenset.issubset` would)
+        for kw in self.required:
+            if kw not in kwargs:
+                return False
+
+        # (nor over the `kwargs`, to check them against `allowed`,
+        # which, unlike comparing their keys view, allocates nothing)
+        allowed = self.allowed
+        if allowed is not None:
+            for kw in kwargs:
+                if kw not in allowed:
+                    return False
+        return True
+
+def _fusedarity (predicates):
+    """
+    Returns a single :func:`_arity` which is true wherever *all* of
+    the :func:`_arity` ``predicates`` are (i.e., their :func:`_and`).
+    """
+    allowed = [pred.allowed for pred in predicates
+               if pred.allowed is not None]
+    return _interned(_Arity(
+        (max(pred.minpos for pred in predicates),
+         min(pred.maxpos for pred in predicates)),
+        (max(pred.minkw for pred in predicates),
+         min(pred.maxkw for pred in predicates)),
+        (max(pred.minargs for pred in predicates),
+         min(pred.maxargs for pred in predicates)),
+        frozenset().union(*[pred.required for pred in predicates]),
+        frozenset.intersection(*allowed) if allowed else None))
 
 
 # Value predicates
@@ -488,7 +1392,7 @@ def isempty (val):
     Use :func:`~operator.truth` and :func:`~operator.not_` for
     'standard' truth testing.
     """
-    return issized(val) and len(val) == 0
+    return _issized(val) and len(val) == 0
 
 def _contains (*contents):
     """
@@ -500,27 +1404,198 @@ def _contains (*contents):
     .. function:: fn (container:Container) -> bool
     """
 
-    # :func:`all` would return `True` with an empty `contents`
+    # every container contains 'nothing'
     if len(contents) == 0:
         return true_
 
-    # no reason to call :func:`all` if we're only testing one value
-    if len(contents) == 1:
-        el = contents[0]
-        def _contains (container):
-            return el in container
-        return _contains
+    return _interned(_Contains(contents))
+
+class _Contains (Predicate):
+    __slots__ = ('__doc__', 'contents')
+    op = '_contains'
+
+    def __init__ (self, contents):
+        self.contents = contents
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return self.contents
+
+    def __call__ (self, container):
+        for el in self.contents:
+            if el not in container:
+                return False
+        return True
+
+    def _fast (self):
+        contents = self.contents
+        def contains (container):
+            for el in contents:
+                if el not in container:
+                    return False
+            return True
+        return contains
+
+def _in (values, identity=False):
+    """
+    Returns a `callable` which returns `True` if its argument is equal
+    to one of ``values`` (or, if `identity` is true, *is* one of
+    them).
+
+    The signature of the returned callable is:
+
+    .. function:: fn (obj) -> bool
+
+    It's equivalent to an :func:`_or` of ``partial(eq, val)`` (or of
+    :func:`_is`) for each of ``values``, but, however many there are,
+    it's a single lookup of ``obj`` in a :class:`frozenset` of them
+    (or, if `identity` is true, in a set of their :func:`id`\ s).
+    :func:`_optimize` rewrites such :func:`_or`\ s into `_in`.
+
+    Unhashable ``values`` which are totally ordered (lists and tuples
+    of numbers, :func:`str`\ s, and, in turn, lists and tuples of
+    them, which sort consistently with their equality) go into a
+    sorted list, in which ``obj`` is found by bisection; the rest go
+    into a list, which is searched in turn, as do values which aren't
+    equal to themselves (like NaN, which the set would find by
+    identity). An unhashable ``obj`` (say, a list) is looked up the
+    same way.
+    """
+    values = tuple(values)
+
+    # nothing is one of 'nothing'
+    if not values:
+        return false_
+
+    if identity:
+        return _interned(_IsIn(values))
+    return _interned(_In(values))
+
+# the types of hashable values whose equality with a list, a dict, or
+# a set is known (they're never equal, but for a set and a frozenset)
+_plaintypes = frozenset([int, long, float, complex, bool, type(None),
+                         str, unicode, tuple, frozenset])
+
+class _In (Predicate):
+    # `members` holds the hashable values (and `odd`, those of them
+    # which aren't of `_plaintypes`), and `others`, the rest: the
+    # totally ordered ones `bisected` (sorted), and the rest `scanned`
+    __slots__ = ('__doc__', 'values', 'members', 'odd', 'others',
+                 'bisected', 'scanned')
+    op = '_in'
+
+    def __init__ (self, values):
+        self.values = values
+        # (a value which isn't equal to itself, like NaN, must not be
+        # found by the set's identity check)
+        members = [val for val in values
+                   if _frozen(val) is val and _reflexive(val)]
+        others = [val for val in values
+                  if _frozen(val) is not val or not _reflexive(val)]
+        self.members = frozenset(members)
+        self.odd = [val for val in members if type(val) not in _plaintypes]
+        self.others = others
+        self.bisected = sorted(val for val in others if _ordered(val))
+        self.scanned = [val for val in others if not _ordered(val)]
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return (self.values,)
+
+    def _key (self):
+        return (self.members,
+                frozenset(_Identity(val) for val in self.others))
+
+    def __call__ (self, obj):
+        try:
+            if obj in self.members:
+                return True
+        except TypeError:
+            # an unhashable `obj` may still equal a hashable value; but a
+            # list or a dict only equals a value of `_plaintypes` which
+            # it is, and a set, only a frozenset
+            cls = type(obj)
+            if cls not in (list, dict, set):
+                return any(obj == val for val in self.values)
+            if cls is set and frozenset(obj) in self.members:
+                return True
+            if any(obj == val for val in self.odd):
+                return True
+
+        if not self.others:
+            return False
+        bisected = self.bisected
+        if bisected:
+            if _ordered(obj):
+                i = bisect_left(bisected, obj)
+                if i < len(bisected) and bisected[i] == obj:
+                    return True
+            elif any(obj == val for val in bisected):
+                return True
+        return any(obj == val for val in self.scanned)
+
+    def _many (self, values):
+        if self.others:
+            return Predicate._many(self, values)
+        try:
+            return bytearray(imap(self.members.__contains__, values))
+        except TypeError:
+            return Predicate._many(self, values)
+
+def _ordered (val):
+    """
+    `True` if ``val`` is totally ordered, consistently with its
+    equality, among the other such values: a number (but neither NaN,
+    nor a :class:`complex`), a :func:`str`, or a list or a tuple of
+    such values.
+    """
+    cls = type(val)
+    if cls is list or cls is tuple:
+        return all(imap(_ordered, val))
+    if cls is float:
+        return val == val
+    return cls in (int, long, bool, str)
+
+def _reflexive (val):
+    """
+    `True` if ``val`` is equal to itself (which NaN, e.g., isn't).
+    """
+    try:
+        return bool(val == val)
+    except Exception:
+        return False
+
+class _IsIn (Predicate):
+    # (`values` keeps the objects alive, so their `id`s aren't reused)
+    __slots__ = ('__doc__', 'values', 'ids')
+    op = '_in'
+
+    def __init__ (self, values):
+        self.values = values
+        self.ids = frozenset(imap(id, values))
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return (self.values, True)
 
-    # otherwise, we need to check each element.
-    def _contains (container):
-        return all(el in container for el in contents)
-    return _contains
+    def _key (self):
+        # identity, not equality
+        return (frozenset(_Identity(val) for val in self.values),)
+
+    def __call__ (self, obj):
+        return id(obj) in self.ids
+
+    def _many (self, values):
+        return bytearray(imap(self.ids.__contains__, imap(id, values)))
 
 
 # Type predicates
 # ---------------
 
-def _isa (classinfo, docstring=None):
+def _isa (classinfo, docstring=None, cachesize=0):
     """
     A wrapper around :func:`isinstance` to swap the argument ordering,
     so it can be used as a partial.
@@ -532,10 +1607,29 @@ def _isa (classinfo, docstring=None):
     If `docstring` is supplied, it will become the docstring of the
     new `callable`. If `docstring` is :data:`None`, a docstring will
     be created based on `classinfo`.
-    """
-    def _isa (obj):
-        return isinstance(obj, classinfo)
 
+    If `cachesize` is non-zero, the `callable` memoizes its answer
+    for (up to `cachesize`) types of `obj`, so repeated checks of
+    objects of the same type cost a single :class:`dict` lookup. This
+    pays off when `classinfo` includes :mod:`abstract base classes
+    <abc>`, whose :func:`isinstance` checks run through
+    :meth:`~abc.ABCMeta.__instancecheck__`. The cache is cleared
+    whenever any ABC's :meth:`~abc.ABCMeta.register` is called (which
+    might change the answers), or when it is full. See
+    :func:`cachetypes`.
+    """
+    if not cachesize:
+        return _quickly((_IsA, classinfo, docstring), (),
+                        _newisa, classinfo, docstring)
+    # (nodes with a cache of their own aren't interned)
+    isa = _newisa(classinfo, docstring)
+    isa.setcachesize(cachesize)
+    return isa
+
+def _newisa (classinfo, docstring):
+    """
+    Returns a new :func:`_isa` node (see there for its docstring).
+    """
     # Make the docstring reflect what the new method does
     if docstring is None:
         name = getattr(classinfo, '__name__', None)
@@ -550,9 +1644,123 @@ def _isa (classinfo, docstring=None):
             else:
                 name = str(classinfo)
         docstring = "`True` if `obj` is an instance of %s" % name
-    _isa.__doc__ = docstring
-
-    return _isa
+    return _IsA(classinfo, docstring)
+
+class _IsA (Predicate):
+    # `cache` is `None` unless the per-type cache is enabled, and
+    # `token` is the ABC invalidation counter it was filled under
+    __slots__ = ('__doc__', 'classinfo', 'cache', 'cachesize', 'token')
+    op = '_isa'
+
+    def __init__ (self, classinfo, docstring):
+        self.classinfo = classinfo
+        self.__doc__ = docstring
+        self.cache = None
+        self.cachesize = 0
+        self.token = None
+
+    @property
+    def params (self):
+        return (self.classinfo,)
+
+    def setcachesize (self, cachesize):
+        """
+        Enables (or, if `cachesize` is zero, disables) the per-type
+        result cache, discarding anything already cached.
+        """
+        self.cachesize = cachesize
+        self.cache = {} if cachesize else None
+        self.token = None
+
+    def __call__ (self, obj):
+        cache = self.cache
+        if cache is None:
+            return isinstance(obj, self.classinfo)
+
+        # `ABCMeta.register` bumps the counter, and may change answers
+        if self.token != ABCMeta._abc_invalidation_counter:
+            cache.clear()
+            self.token = ABCMeta._abc_invalidation_counter
+
+        cls = type(obj)
+        try:
+            return cache[cls]
+        except KeyError:
+            pass
+
+        result = isinstance(obj, self.classinfo)
+
+        # only cache for objects whose `__class__` is their type (it
+        # isn't for old-style instances, or for some proxies, and
+        # :func:`isinstance` consults both)
+        if obj.__class__ is cls:
+            if len(cache) >= self.cachesize:
+                cache.clear()
+            cache[cls] = result
+        return result
+
+    def _many (self, values):
+        # one check per distinct type (with the same caveat as the
+        # cache: only if every value's `__class__` is its type)
+        classes = map(type, values)
+        if classes != [val.__class__ for val in values]:
+            return Predicate._many(self, values)
+
+        classinfo = self.classinfo
+        verdicts = dict((cls, issubclass(cls, classinfo))
+                        for cls in set(classes))
+        return bytearray(imap(verdicts.__getitem__, classes))
+
+    def _fast (self):
+        # the cache can be enabled later (see :func:`cachetypes`), so
+        # it's checked on every call
+        node = self
+        classinfo = self.classinfo
+        def isa (obj):
+            if node.cache is None:
+                return isinstance(obj, classinfo)
+            return node(obj)
+        return isa
+
+    def _bound (self):
+        """
+        Returns a `callable` equivalent to this node *as it is now*:
+        :func:`isinstance` itself, in a closure, unless the cache is
+        enabled. Unlike :meth:`_fast`'s, it must be bound again if
+        the cache is enabled (or disabled) later.
+        """
+        if self.cache is not None:
+            return self.__call__
+        classinfo = self.classinfo
+        def isa (obj):
+            return isinstance(obj, classinfo)
+        return isa
+
+def _fused (predicates):
+    """
+    Returns a single :func:`_isa` which is true wherever *any* of the
+    :func:`_isa` ``predicates`` is (i.e., their :func:`_or`). Its
+    docstring is created from the combined `classinfo`, just as
+    :func:`_isa` does.
+    """
+    classes = []
+    for pred in predicates:
+        for cls in _classes(pred.classinfo):
+            if cls not in classes:
+                classes.append(cls)
+    return _isa(classes[0] if len(classes) == 1 else tuple(classes))
+
+def _classes (classinfo):
+    """
+    Yields each class in ``classinfo``, which may be a class, or a
+    (possibly nested) tuple of classes, as :func:`isinstance` allows.
+    """
+    if istuple(classinfo):
+        for item in classinfo:
+            for cls in _classes(item):
+                yield cls
+    else:
+        yield classinfo
 
 doctmpl = "`True` if `obj` %s."
 
@@ -584,9 +1792,44 @@ isint       = _isa(int,             doctmpl % 'is an :func:`int`')
 islong      = _isa(long,            doctmpl % 'is a :func:`long`')
 isfloat     = _isa(float,           doctmpl % 'is a :func:`float`')
 
+# the generated type predicates which check against ABCs, and so
+# benefit from a per-type cache
+_abcpredicates = (iscallable, iscontainer, ishashable, isiterable,
+                  isiterator, ismap, ismmap, ismapv, isitemsv, iskeysv,
+                  isvalsv, isseq, ismseq, isset, ismset, issized)
+
+def cachetypes (cachesize=1024):
+    """
+    Enables (or, if `cachesize` is zero, disables) the per-type result
+    cache (see :func:`_isa`) of each of the generated type predicates
+    which checks against an :mod:`abstract base class <abc>`
+    (:func:`iscallable`, :func:`isiterable`, :func:`ismap`,
+    :func:`isseq`, :func:`issized`, etc.), caching results for up to
+    `cachesize` types in each. This speeds up the predicates built on
+    them, too (e.g., :func:`isempty`, :func:`isnsiterable`, and
+    :func:`isatom`).
+
+    It is off by default, and is process-wide.
+    """
+    for pred in _abcpredicates:
+        pred.setcachesize(cachesize)
+    _bindhelpers()
+
+def _bindhelpers ():
+    """
+    Binds the callables through which the helpers (:func:`isempty`,
+    :func:`isnsiterable`, and :func:`isatom`) call the type predicates,
+    so that they don't pay for calling the nodes themselves. They're
+    bound again whenever :func:`cachetypes` changes the nodes.
+    """
+    global _issized, _isiterable, _isstring
+    _issized = issized._bound()
+    _isiterable = isiterable._bound()
+    _isstring = isstring._bound()
+
 def isnsiterable (obj):
     """`True` if `obj` is a non-string `iterable`"""
-    return isiterable(obj) and not isstring(obj)
+    return _isiterable(obj) and not _isstring(obj)
 
 def isatom (val):
     """
@@ -596,6 +1839,8 @@ def isatom (val):
     """
     return not isnsiterable(val)
 
+_bindhelpers()
+
 
 # Identity predicates
 # -------------------
@@ -605,14 +1850,35 @@ def _is (it, docstring=None):
     A wrapper around :func:`~operator.is_` to set the docstring (which
     :func:`~functools.partial` does not).
     """
-    def _is (obj):
-        return obj is it
-
     # Make the docstring reflect what the new method does
-    _is.__doc__ = (docstring or
-                   ("`True` if `obj` is %s" %
-                    getattr(it, '__name__', it)))
-    return _is
+    return _interned(_Is(it, (docstring or
+                              ("`True` if `obj` is %s" %
+                               getattr(it, '__name__', it)))))
+
+class _Is (Predicate):
+    __slots__ = ('__doc__', 'it')
+    op = '_is'
+
+    def __init__ (self, it, docstring):
+        self.it = it
+        self.__doc__ = docstring
+
+    @property
+    def params (self):
+        return (self.it,)
+
+    def _key (self):
+        # identity, not equality
+        return (_Identity(self.it),)
+
+    def __call__ (self, obj):
+        return obj is self.it
+
+    def _many (self, values):
+        return bytearray(imap(is_, values, repeat(self.it)))
+
+    def _fast (self):
+        return partial(is_, self.it)
 
 isnone      = _is(None,             doctmpl % '*is* :data:`None`')
 istrue      = _is(True,             doctmpl % '*is* :data:`True`')
@@ -636,7 +1902,9 @@ def _apply (func):
     Its principal use is to make predicates which operate on all of
     their arguments (i.e., `*args`) operate on *any* iterable. E.g.,
     ``_apply(_all(isstring))(['jack', 'kate'])`` is equivalent to
-    ``_all(isstring)('jack', 'hurley')``.
+    ``_all(isstring)('jack', 'hurley')``. (For large, or lazy,
+    iterables, prefer :func:`_each`, :func:`_some`, and
+    :func:`_noneof`, which don't unpack the iterable first.)
 
     This is especially useful when testing the *contents* of arguments
     passed to a :func:`_zip` callable. E.g.,
@@ -647,11 +1915,203 @@ def _apply (func):
        >>> int_and_strings(42, ['jack', 'kate', 'sawyer'])
        True
     """
-    def _apply (args=(), kwargs={}):
-        return func(*args, **kwargs)
-    return _apply
+    return _interned(_Apply(func))
+
+class _Apply (Predicate):
+    __slots__ = ('__doc__', 'func')
+    op = '_apply'
+
+    def __init__ (self, func):
+        self.func = func
+        self.__doc__ = None
+
+    @property
+    def children (self):
+        return (self.func,)
+
+    def __call__ (self, args=(), kwargs={}):
+        return self.func(*args, **kwargs)
+
+def _memo (predicate, maxsize=128, ttl=None):
+    """
+    Returns a `callable` which returns the result of ``predicate``,
+    memoized for (up to) the `maxsize` most recently used distinct
+    argument lists, for (up to) `ttl` seconds, if `ttl` is not
+    :data:`None`. Arguments of different types are distinct (e.g.,
+    ``1``, ``1.0``, and ``True``), even if they're equal. Calls with
+    unhashable arguments go straight to ``predicate``, uncached.
+
+    It's meant for expensive predicates (those which parse, or look
+    things up), and, since it's a node like any other, it works
+    inside an :func:`_and`, :func:`_or`, etc. Sharing one `_memo` node
+    among several trees (or several places in one tree) computes the
+    shared check once per distinct input.
+
+    The callable keeps count of its cache ``hits``, ``misses``, and
+    ``evictions`` (of least recently used entries, to stay within
+    `maxsize`; expired entries count as misses), and its ``clear()``
+    method empties the cache.
+    """
+    if maxsize < 1:
+        raise ValueError("'maxsize' must be at least 1")
+    return _Memo(predicate, maxsize, ttl)
+
+# separates the positional arguments from the keyword arguments in a
+# :func:`_memo` key (so no list of positional arguments alone can
+# collide with one which has keyword arguments)
+_kwmark = object()
+
+class _Memo (Predicate):
+    # `cache` maps argument keys to `(result, expiry)` pairs, least
+    # recently used first (`expiry` is `None` without a `ttl`)
+    __slots__ = ('__doc__', 'predicate', 'maxsize', 'ttl', 'cache',
+                 'hits', 'misses', 'evictions')
+    op = '_memo'
+
+    def __init__ (self, predicate, maxsize, ttl):
+        self.predicate = predicate
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self.__doc__ = getattr(predicate, '__doc__', None)
+
+    @property
+    def children (self):
+        return (self.predicate,)
+
+    @property
+    def params (self):
+        return (self.maxsize, self.ttl)
+
+    def clear (self):
+        """
+        Empties the cache (but keeps the counts).
+        """
+        self.cache.clear()
+
+    def __call__ (self, *args, **kwargs):
+        cache = self.cache
+        try:
+            # (typed, so that, e.g., `1`, `1.0`, and `True` are
+            # cached apart)
+            key = args + tuple(imap(type, args))
+            if kwargs:
+                key += (_kwmark, frozenset((kw, val, type(val))
+                                           for (kw, val)
+                                           in kwargs.iteritems()))
+            (result, expiry) = cache.pop(key)
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable arguments
+            return self.predicate(*args, **kwargs)
+        else:
+            if expiry is None or time.time() < expiry:
+                # (re-inserting makes it the most recently used)
+                cache[key] = (result, expiry)
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        result = self.predicate(*args, **kwargs)
+        if len(cache) >= self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+        cache[key] = (result,
+                      None if self.ttl is None else time.time() + self.ttl)
+        return result
+
+def _weakmemo (predicate, version=None):
+    """
+    Returns a `callable` which returns the result of ``predicate`` for
+    its (single) argument, memoized by the argument's *identity*, for
+    as long as the argument lives. This suits predicates which are
+    applied, over and over, to the same long-lived objects, which
+    needn't be hashable.
+
+    The signature of the returned `callable` is:
+
+    .. function:: fn (obj) -> object
+
+    If the objects can change (in ways which matter to ``predicate``),
+    pass a `version` function, which returns a value which changes
+    whenever ``obj`` does (e.g., a generation counter). The cached
+    result is only used while ``version(obj)`` is equal to its value
+    when the result was cached.
+
+    Entries are held by :mod:`weak reference <weakref>`, and so vanish
+    with their objects. Objects which can't be weakly referenced
+    (including plain :class:`dict`, :class:`list`, :class:`tuple`,
+    :class:`str`, and :class:`int` instances, but *not* instances of
+    their subclasses) go straight to ``predicate``, uncached.
+
+    The callable keeps count of its cache ``hits`` and ``misses``, and
+    of the calls which were ``uncached``, and its ``clear()`` method
+    empties the cache.
+    """
+    return _WeakMemo(predicate, version)
+
+class _WeakMemo (Predicate):
+    # `cache` maps the `id` of each argument to a `(ref, version,
+    # result)` triple, where `ref` is a weak reference to it
+    __slots__ = ('__doc__', 'predicate', 'version', 'cache',
+                 'hits', 'misses', 'uncached')
+    op = '_weakmemo'
+
+    def __init__ (self, predicate, version):
+        self.predicate = predicate
+        self.version = version
+        self.cache = {}
+        self.hits = self.misses = self.uncached = 0
+        self.__doc__ = getattr(predicate, '__doc__', None)
+
+    @property
+    def children (self):
+        return (self.predicate,)
+
+    @property
+    def params (self):
+        return (self.version,)
+
+    def clear (self):
+        """
+        Empties the cache (but keeps the counts).
+        """
+        self.cache.clear()
+
+    def __call__ (self, obj):
+        key = id(obj)
+        version = self.version(obj) if self.version is not None else None
+
+        entry = self.cache.get(key)
+        # (the `ref` check guards against reuse of a dead object's `id`)
+        if entry is not None and entry[0]() is obj and entry[1] == version:
+            self.hits += 1
+            return entry[2]
+
+        result = self.predicate(obj)
+        try:
+            ref = weakref.ref(obj, _forget(self.cache, key))
+        except TypeError:
+            self.uncached += 1
+            return result
+
+        self.misses += 1
+        self.cache[key] = (ref, version, result)
+        return result
+
+def _forget (cache, key):
+    """
+    Returns a :mod:`weakref` callback which removes the entry for
+    ``key`` from ``cache`` (unless it has been replaced, by then).
+    """
+    def callback (ref):
+        entry = cache.get(key)
+        if entry is not None and entry[0] is ref:
+            del cache[key]
+    return callback
 
-__cache_return = {}
 def _return (val):
     """
     Always returns `val`.
@@ -660,21 +2120,39 @@ def _return (val):
     closure over ``return val``. E.g., in the 'no contents'
     special-case in :func:`_contains`.
 
-    **NOTE:** This is one of the few memoized factories, because we
-    don't want a proliferation of `_return(True)` and `_return(False)`
-    helpers (of course, that's why we have :func:`true_` and
-    :func:`false_`, but no matter).
+    **NOTE:** Like the other factories, it interns its nodes, because
+    we don't want a proliferation of `_return(True)` and
+    `_return(False)` helpers (of course, that's why we have
+    :func:`true_` and :func:`false_`, but no matter). Unlike the
+    others, it only interns hashable values, since an unhashable value
+    may well be mutated.
     """
     if ishashable(val):
-        if val not in __cache_return:
-            def _return (*args, **kwargs):
-                return val
-            __cache_return[val] = _return
-        return __cache_return[val]
+        return _interned(_Return(val))
+
+    return _Return(val)
+
+class _Return (Predicate):
+    __slots__ = ('__doc__', 'val')
+    op = '_return'
+
+    def __init__ (self, val):
+        self.val = val
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return (self.val,)
+
+    def _key (self):
+        # `_return(1)` is not `_return(True)`
+        return (type(self.val), _frozen(self.val))
 
-    def _return (*args, **kwargs):
-        return val
-    return _return
+    def __call__ (self, *args, **kwargs):
+        return self.val
+
+    def _many (self, values):
+        return bytearray((1 if self.val else 0,)) * len(values)
 
 true_ = _return(True)
 false_ = _return(False)
@@ -690,18 +2168,22 @@ def _nis (atleast=False, atmost=False, exactly=False):
     .. function:: fn (n:number) -> bool
 
     `atleast` and `atmost` may be combined, but `exactly` must stand
-    alone.
+    alone. `exactly` is checked by equality, so it needn't be ordered
+    (e.g., ``3+0j``).
     """
-    if (atleast < 0) or (atmost < 0) or (exactly < 0):
+    try:
+        negative = (atleast < 0) or (atmost < 0) or (exactly < 0)
+    except TypeError:
+        # (`atleast` and `atmost` must still be ordered)
+        negative = (atleast < 0) or (atmost < 0)
+    if negative:
         raise ValueError("arg limits cannot be negative")
 
     if not exactly is False:
         if not ((atleast is False) and (atmost is False)):
             raise ValueError(
                 "cannot mix 'exactly' and 'atleast' or 'atmost'")
-        def _nis_exactly (n):
-            return n == exactly
-        return _nis_exactly
+        return _interned(_Nis(exactly, exactly))
 
     if atleast is False and atmost is False:
         raise ValueError(
@@ -711,11 +2193,40 @@ def _nis (atleast=False, atmost=False, exactly=False):
         atleast = 0
 
     if atmost is False:
-        atmost = float('inf')
-
-    def _nis_between (n):
-        return (atleast <= n <= atmost)
-    return _nis_between
+        atmost = _inf
+
+    return _interned(_Nis(atleast, atmost))
+
+class _Nis (Predicate):
+    # `exactly` is just `atleast` and `atmost` of the same value, which
+    # is checked by equality (so it needn't be ordered, e.g., `3+0j`)
+    __slots__ = ('__doc__', 'atleast', 'atmost', 'exact')
+    op = '_nis'
+
+    def __init__ (self, atleast, atmost):
+        self.atleast = atleast
+        self.atmost = atmost
+        self.exact = atleast == atmost
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return (self.atleast, self.atmost)
+
+    def __call__ (self, n):
+        if self.exact:
+            return n == self.atleast
+        return self.atleast <= n <= self.atmost
+
+    def _fast (self):
+        (atleast, atmost) = (self.atleast, self.atmost)
+        if self.exact:
+            def nis (n):
+                return n == atleast
+        else:
+            def nis (n):
+                return atleast <= n <= atmost
+        return nis
 
 def _fnis (func, atleast=False, atmost=False, exactly=False):
     """
@@ -727,7 +2238,58 @@ def _fnis (func, atleast=False, atmost=False, exactly=False):
     `atleast` and `atmost` may be combined, but `exactly` must stand
     alone.
     """
-    __nis = _nis(atleast, atmost, exactly)
-    def _fnis (*args, **kwargs):
-        return __nis(func(*args, **kwargs))
-    return _fnis
+    return _interned(_FNis(func, _nis(atleast, atmost, exactly)))
+
+class _FNis (Predicate):
+    __slots__ = ('__doc__', 'func', 'nis')
+    op = '_fnis'
+
+    def __init__ (self, func, nis):
+        self.func = func
+        self.nis = nis
+        self.__doc__ = None
+
+    @property
+    def children (self):
+        return (self.nis,)
+
+    @property
+    def params (self):
+        return (self.func,)
+
+    def __call__ (self, *args, **kwargs):
+        return self.nis(self.func(*args, **kwargs))
+
+
+# Predicate compilation and optimization
+# --------------------------------------
+
+from predicates.codegen import _compile, _validator
+from predicates.optimize import _optimize
+from predicates.adaptive import _adaptive, Profile
+from predicates.vectorize import _vectorize
+from predicates.rules import RuleSet
+from predicates.index import TypeIndex, RuleNetwork, RangeIndex
+
+
+# String matching
+# ---------------
+
+from predicates.strings import (
+    _contains_any,
+    _contains_all,
+    _startswith,
+    _endswith,
+    )
+
+
+# Approximate membership
+# ----------------------
+
+from predicates.bloom import _inbloom, BloomFilter, SortedFile
+
+
+# Call guards
+# -----------
+
+from predicates.guards import validate
@@ -0,0 +1,512 @@
+"""
+Adaptive, statistics-driven ordering of composite predicates.
+
+Short-circuiting only pays off when the cheap, decisive predicates
+come first. :func:`_adaptive` rebuilds a predicate tree with composites
+which measure each child's cost and pass rate on a sample of their
+calls, and periodically reorder their children to minimize the
+expected cost of a call.
+
+A :class:`Profile` persists those statistics, so that a new process
+can start out with the order an earlier one learned.
+"""
+
+import json
+
+from functools import partial
+from hashlib import sha1
+from timeit import default_timer
+from types import ClassType
+
+from predicates import (
+    Predicate,
+    _And,
+    _Or,
+    _Not,
+    )
+from predicates.optimize import _rebuilt
+
+def _adaptive (predicate, sample=100, period=100, profile=None):
+    """
+    Returns a predicate equivalent to ``predicate``, in which every
+    :func:`~predicates._and`, :func:`~predicates._or`, and
+    :func:`~predicates._not` composite learns the best order in which
+    to evaluate its children.
+
+    Each composite evaluates one call in every `sample` *fully*,
+    timing every child (even those it could have short-circuited
+    past), and counting how often each one *decides* the composite
+    (i.e., is false, for an :func:`~predicates._and`, or true, for an
+    :func:`~predicates._or` or a :func:`~predicates._not`). After every
+    `period` such samples, it sorts its children by the expected cost
+    of reaching a decision (cost divided by the rate at which the child
+    decides), and halves its statistics, so that the order keeps
+    tracking the workload.
+
+    The composite's result doesn't depend on the order, so long as the
+    children are pure (free of side effects) and total (never raise).
+    Reordering can change which exceptions escape: a child which
+    raises may be skipped, where the original order would have reached
+    it, or reached, where it would have been short-circuited past. The
+    composite copes with the latter (e.g., ``s.startswith('a')`` after
+    ``isstring``): once a child raises out of order, it's never again
+    put ahead of the children before it, and the call is evaluated
+    again, in the original order (calling some children twice).
+
+    Its ``children`` are in the current order (so, e.g.,
+    :func:`~predicates._compile` captures the learned order), but it
+    compares and hashes by the original order.
+
+    If a :class:`Profile` is supplied, the composites start out in the
+    order it recorded (see :meth:`Profile.apply`).
+    """
+    if sample < 1 or period < 1:
+        raise ValueError("'sample' and 'period' must be at least 1")
+
+    if profile is not None:
+        predicate = profile.apply(predicate)
+    return _adapted(predicate, sample, period, {})
+
+def _adapted (pred, sample, period, memo):
+    # keep `pred` alive in the memo, so its `id` isn't reused
+    if id(pred) in memo:
+        return memo[id(pred)][1]
+
+    adapted = pred
+    if isinstance(pred, Predicate):
+        children = [_adapted(child, sample, period, memo)
+                    for child in pred.children]
+        if pred.op in _composites:
+            adapted = _composites[pred.op](tuple(children), sample, period)
+        elif any(new is not old
+                 for (new, old) in zip(children, pred.children)):
+            adapted = _rebuilt(pred, children)
+
+    memo[id(pred)] = (pred, adapted)
+    return adapted
+
+class _Adaptive (Predicate):
+    # `predicates` is in the original order, and `ordered` in the
+    # current order. `cost` and `decisive` are, for each predicate (in
+    # the original order), the time spent in it, and the number of
+    # times it decided the composite, across all of the `samples`, and
+    # `raised` whether it has ever raised where the original order
+    # would have short-circuited past it.
+    __slots__ = ()
+
+    # the (truth) value of a child which decides the composite, and
+    # the composite's value when a child does
+    decides = None
+    decision = None
+
+    def __init__ (self, predicates, sample, period):
+        self.predicates = self.ordered = predicates
+        self.sample = self.countdown = sample
+        self.period = period
+        self.samples = 0
+        self.cost = [0.0] * len(predicates)
+        self.decisive = [0] * len(predicates)
+        self.raised = [False] * len(predicates)
+        self.__doc__ = None
+
+    @property
+    def children (self):
+        return self.ordered
+
+    def _key (self):
+        return ((), self.predicates)
+
+    def statistics (self):
+        """
+        Returns a list of `(predicate, samples, cost, decisive)`
+        tuples, one for each child (in the original order), where
+        `cost` is the total time spent in the predicate, and
+        `decisive` the number of times it decided the composite,
+        across `samples` calls.
+        """
+        return [(pred, self.samples, cost, decisive)
+                for (pred, cost, decisive)
+                in zip(self.predicates, self.cost, self.decisive)]
+
+    def _sampled (self, args, kwargs):
+        """
+        Evaluates *all* of the children (in the original order),
+        recording their statistics, and returns the composite's value.
+
+        Concurrent callers can push the countdown past zero, so a call
+        samples whenever it's zero *or less*.
+
+        Children after the first which decides the composite may well
+        raise (they may depend on a guard before them), so their
+        exceptions count as indecisive, rather than propagating.
+        """
+        self.countdown = self.sample
+
+        decided = False
+        cost, decisive = self.cost, self.decisive
+        for (i, pred) in enumerate(self.predicates):
+            start = default_timer()
+            try:
+                result = pred(*args, **kwargs)
+            except Exception:
+                if not decided:
+                    raise
+                cost[i] += default_timer() - start
+                self.raised[i] = True
+                continue
+            cost[i] += default_timer() - start
+            if bool(result) is self.decides:
+                decisive[i] += 1
+                decided = True
+
+        self.samples += 1
+        if self.samples % self.period == 0:
+            self._reorder()
+
+        return self.decision if decided else not self.decision
+
+    def _reorder (self):
+        """
+        Sorts the children by their expected cost per decision, and
+        decays the statistics.
+        """
+        self._resort()
+        self.samples //= 2
+        self.cost = [c / 2 for c in self.cost]
+        self.decisive = [d // 2 for d in self.decisive]
+
+    def _resort (self):
+        cost, decisive = self.cost, self.decisive
+        order = _ordering([_rank(cost[i], decisive[i])
+                           for i in range(len(self.predicates))],
+                          self.raised)
+        if order != range(len(self.predicates)):
+            self.ordered = tuple(self.predicates[i] for i in order)
+        else:
+            self.ordered = self.predicates
+
+    def _unordered (self, args, kwargs, pred):
+        """
+        Returns the composite's value in the original order, after
+        ``pred`` raised in the current order (and so is kept, from
+        now on, after the children before it).
+        """
+        for (i, child) in enumerate(self.predicates):
+            if child is pred:
+                self.raised[i] = True
+        self._resort()
+
+        for child in self.predicates:
+            if bool(child(*args, **kwargs)) is self.decides:
+                return self.decision
+        return not self.decision
+
+def _rank (cost, decisive):
+    """
+    Returns the sort key of a child which took ``cost`` seconds, and
+    decided its composite ``decisive`` times, over the same number of
+    calls as its siblings: the expected cost per decision. Children
+    which never decide go last, cheapest first.
+    """
+    if not decisive:
+        return (1, cost)
+    return (0, cost / decisive)
+
+def _ordering (ranks, raised):
+    """
+    Returns the indices of children, sorted by their ``ranks``, except
+    that a child which has ``raised`` stays after each of the children
+    before it (which may be guarding it).
+    """
+    ranked = sorted(range(len(ranks)), key=ranks.__getitem__)
+    order = []
+    placed = set()
+    while ranked:
+        for (k, i) in enumerate(ranked):
+            if not raised[i] or all(j in placed for j in xrange(i)):
+                break
+        del ranked[k]
+        order.append(i)
+        placed.add(i)
+    return order
+
+class _AdaptiveAnd (_Adaptive):
+    __slots__ = ('__doc__', 'predicates', 'ordered', 'sample', 'countdown',
+                 'period', 'samples', 'cost', 'decisive', 'raised')
+    op = '_and'
+    decides = False
+    decision = False
+
+    def __call__ (self, *args, **kwargs):
+        self.countdown -= 1
+        if self.countdown <= 0:
+            return self._sampled(args, kwargs)
+        try:
+            for pred in self.ordered:
+                if not pred(*args, **kwargs):
+                    return False
+            return True
+        except Exception:
+            if self.ordered is self.predicates:
+                raise
+            return self._unordered(args, kwargs, pred)
+
+class _AdaptiveOr (_Adaptive):
+    __slots__ = ('__doc__', 'predicates', 'ordered', 'sample', 'countdown',
+                 'period', 'samples', 'cost', 'decisive', 'raised')
+    op = '_or'
+    decides = True
+    decision = True
+
+    def __call__ (self, *args, **kwargs):
+        self.countdown -= 1
+        if self.countdown <= 0:
+            return self._sampled(args, kwargs)
+        try:
+            for pred in self.ordered:
+                if pred(*args, **kwargs):
+                    return True
+            return False
+        except Exception:
+            if self.ordered is self.predicates:
+                raise
+            return self._unordered(args, kwargs, pred)
+
+class _AdaptiveNot (_Adaptive):
+    __slots__ = ('__doc__', 'predicates', 'ordered', 'sample', 'countdown',
+                 'period', 'samples', 'cost', 'decisive', 'raised')
+    op = '_not'
+    decides = True
+    decision = False
+
+    def __call__ (self, *args, **kwargs):
+        self.countdown -= 1
+        if self.countdown <= 0:
+            return self._sampled(args, kwargs)
+        try:
+            for pred in self.ordered:
+                if pred(*args, **kwargs):
+                    return False
+            return True
+        except Exception:
+            if self.ordered is self.predicates:
+                raise
+            return self._unordered(args, kwargs, pred)
+
+_composites = {
+    '_and': _AdaptiveAnd,
+    '_or':  _AdaptiveOr,
+    '_not': _AdaptiveNot,
+    }
+
+
+# Profiles
+# --------
+
+class Profile (object):
+    """
+    Cost and pass-rate statistics for the composites of one or more
+    predicate trees, which survive the process that collected them.
+
+    Statistics are keyed by the *structural* identity of each
+    composite (and of each of its children), so they apply to any
+    structurally equal tree, including one built by another process,
+    or in another order. E.g., in production:
+
+    .. code-block:: python
+
+       >>> rules = _adaptive(rules)
+       >>> # ... serve traffic ...
+       >>> profile = Profile()
+       >>> profile.record(rules)
+       >>> profile.save('rules.profile')
+
+    ...and, in a fresh worker:
+
+    .. code-block:: python
+
+       >>> profile = Profile.load('rules.profile')
+       >>> rules = profile.apply(rules)
+
+    Structural identities are built from names (classes and functions
+    by their modules and names, other values by their :func:`repr`\ s),
+    so distinct predicates *can* collide. A collision can only cost
+    performance, never correctness, since it only affects the order
+    of a composite's children.
+    """
+
+    def __init__ (self, composites=None):
+        # {composite fingerprint:
+        #     {child fingerprint: [samples, cost, decisive, raised]}}
+        self.composites = composites if composites is not None else {}
+
+    def record (self, predicate):
+        """
+        Adds the statistics gathered by each :func:`_adaptive`
+        composite in ``predicate`` to the profile.
+        """
+        seen = set()
+
+        def walk (pred):
+            if id(pred) in seen or not isinstance(pred, Predicate):
+                return
+            seen.add(id(pred))
+
+            if isinstance(pred, _Adaptive):
+                stats = self.composites.setdefault(_fingerprint(pred), {})
+                for ((child, samples, cost, decisive), raised) in zip(
+                        pred.statistics(), pred.raised):
+                    totals = stats.setdefault(_fingerprint(child),
+                                              [0, 0.0, 0, False])
+                    totals[0] += samples
+                    totals[1] += cost
+                    totals[2] += decisive
+                    totals[3] = totals[3] or raised
+
+            for child in pred.children:
+                walk(child)
+
+        walk(predicate)
+
+    def apply (self, predicate):
+        """
+        Returns a predicate equivalent to ``predicate``, with the
+        children of each composite for which the profile has
+        statistics in the order they recommend. Children without
+        statistics keep their relative order, after those with, and
+        children which have raised where the composite would have
+        short-circuited past them stay after the children before them.
+        """
+        memo = {}
+
+        def applied (pred):
+            # keep `pred` alive in the memo, so its `id` isn't reused
+            if id(pred) in memo:
+                return memo[id(pred)][1]
+
+            result = pred
+            if isinstance(pred, Predicate):
+                children = [applied(child) for child in pred.children]
+                if pred.op in _composites:
+                    result = _ordered[pred.op](self._order(pred, children))
+                elif any(new is not old
+                         for (new, old) in zip(children, pred.children)):
+                    result = _rebuilt(pred, children)
+
+            memo[id(pred)] = (pred, result)
+            return result
+
+        return applied(predicate)
+
+    def _order (self, composite, children):
+        """
+        Returns ``children`` (the new children of ``composite``) as a
+        tuple, in the order the profile recommends.
+        """
+        stats = self.composites.get(_fingerprint(composite))
+        if not stats:
+            return tuple(children)
+
+        ranks = []
+        raised = []
+        for child in children:
+            totals = stats.get(_fingerprint(child))
+            if totals is None:
+                ranks.append((2, 0))
+                raised.append(False)
+            else:
+                ranks.append(_rank(totals[1], totals[2]))
+                raised.append(totals[3])
+
+        return tuple(children[i] for i in _ordering(ranks, raised))
+
+    def save (self, path):
+        """
+        Writes the profile to the file at ``path``.
+        """
+        with open(path, 'w') as out:
+            json.dump({'version': 1, 'composites': self.composites}, out)
+
+    @classmethod
+    def load (cls, path):
+        """
+        Returns the profile saved in the file at ``path``.
+        """
+        with open(path) as infile:
+            saved = json.load(infile)
+        if saved.get('version') != 1:
+            raise ValueError("unsupported profile version: %r"
+                             % saved.get('version'))
+        # (profiles saved before `raised` was recorded lack it)
+        return cls(dict((str(composite), dict((str(child),
+                                               (totals + [False])[:4])
+                                              for (child, totals)
+                                              in stats.items()))
+                        for (composite, stats)
+                        in saved['composites'].items()))
+
+_ordered = {
+    '_and': _And,
+    '_or':  _Or,
+    '_not': _Not,
+    }
+
+def _fingerprint (obj):
+    """
+    Returns the structural identity of ``obj``, which is stable across
+    processes.
+    """
+    canonical = _canonical(obj)
+    if isinstance(canonical, unicode):
+        canonical = canonical.encode('utf-8')
+    return sha1(canonical).hexdigest()
+
+def _canonical (obj):
+    """
+    Returns a string which describes the structure of ``obj``.
+    """
+    if isinstance(obj, Predicate):
+        children = [_canonical(child)
+                    for child
+                    in (obj.predicates if isinstance(obj, _Adaptive)
+                        else obj.children)]
+
+        # the order of a composite's children is what we're learning,
+        # so it can't be part of its identity
+        if obj.op in _composites:
+            children.sort()
+
+        return "%s(%s;%s)" % (obj.op,
+                              ",".join(_canonical(param)
+                                       for param in obj.params),
+                              ",".join(children))
+
+    if isinstance(obj, (type, ClassType)):
+        return "%s.%s" % (obj.__module__, obj.__name__)
+
+    if isinstance(obj, (tuple, list)):
+        return "(%s)" % ",".join(_canonical(item) for item in obj)
+
+    if isinstance(obj, (set, frozenset)):
+        return "{%s}" % ",".join(sorted(_canonical(item) for item in obj))
+
+    if (obj is None or
+        isinstance(obj, (basestring, bool, int, long, float, slice))):
+        return repr(obj)
+
+    # (the library's leaves are mostly partials, e.g., `partial(eq, x)`)
+    if isinstance(obj, partial):
+        return "partial(%s;%s;%s)" % (_canonical(obj.func),
+                                      _canonical(obj.args),
+                                      ",".join(sorted(
+                                          "%s=%s" % (key, _canonical(val))
+                                          for (key, val)
+                                          in (obj.keywords or {}).items())))
+
+    name = getattr(obj, '__name__', None)
+    if name:
+        code = getattr(obj, '__code__', None)
+        return "%s.%s%s" % (getattr(obj, '__module__', None), name,
+                            ":%d" % code.co_firstlineno if code else '')
+
+    return "<%s.%s>" % (type(obj).__module__, type(obj).__name__)
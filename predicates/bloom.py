@@ -0,0 +1,251 @@
+"""
+Approximate membership for very large sets of strings.
+
+A :class:`frozenset` (behind :func:`~predicates._in`, say) of hundreds
+of millions of keys costs gigabytes in every process which uses it. A
+:class:`BloomFilter` answers "definitely not a member" from a compact
+bit array (a few bits per key), which can be saved to disk, and mapped
+into memory (and shared, through the page cache) by each process;
+:func:`_inbloom` checks only its possible members against an exact
+set, such as a :class:`SortedFile` on disk.
+"""
+
+from __future__ import absolute_import
+
+import math
+import mmap
+import struct
+from hashlib import md5
+
+from predicates import (
+    Predicate,
+    _interned,
+    )
+
+# the header of a saved :class:`BloomFilter`: a magic string, then its
+# number of bits, of hashes, and of keys
+_magic = 'predicates.bloom/1\n'
+_header = struct.Struct('<QQQ')
+
+# the two 64-bit hashes of a key, from its (128-bit) digest
+_hashes = struct.Struct('<QQ')
+
+def _inbloom (bloom, exact=None):
+    """
+    Returns a `callable` which returns `True` if its argument (a
+    string) is in the :class:`BloomFilter` ``bloom``, and, unless
+    `exact` is :data:`None`, in `exact`, too (any container, e.g., a
+    :class:`SortedFile`, a :class:`set`, or a database-backed object
+    with a ``__contains__``).
+
+    The signature of the returned `callable` is:
+
+    .. function:: fn (obj:basestring) -> bool
+
+    Most non-members are turned away by ``bloom`` alone, in a few
+    hashes, so `exact` is only consulted for members, and for the
+    (`error_rate` of) non-members which ``bloom`` mistakes for members.
+    Without `exact`, the `callable` is true for those, too.
+
+    It is false for anything which isn't a string.
+    """
+    return _interned(_InBloom(bloom, exact))
+
+class _InBloom (Predicate):
+    __slots__ = ('__doc__', 'bloom', 'exact')
+    op = '_inbloom'
+
+    def __init__ (self, bloom, exact):
+        self.bloom = bloom
+        self.exact = exact
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return (self.bloom, self.exact)
+
+    def __call__ (self, obj):
+        if obj not in self.bloom:
+            return False
+        return self.exact is None or obj in self.exact
+
+class BloomFilter (object):
+    """
+    A Bloom filter of strings (:class:`unicode` strings are encoded as
+    UTF-8), sized to hold `capacity` keys with (about) an `error_rate`
+    chance of mistaking a non-member for a member. It never mistakes a
+    member for a non-member. E.g.,
+
+    .. code-block:: python
+
+       >>> bloom = BloomFilter.fromfile('denied.txt', error_rate=0.001)
+       >>> bloom.save('denied.bloom')
+       >>> # ... and, in each worker:
+       >>> denied = _inbloom(BloomFilter.load('denied.bloom'),
+       ...                   SortedFile('denied.sorted.txt'))
+
+    Its bits live in a :mod:`mmap`: an anonymous one, as it's built,
+    or, once it's saved, the file itself, mapped read-only by
+    :meth:`load` (so processes which load the same file share its
+    pages). A filter of `n` keys with an `error_rate` of ``0.01`` takes
+    about ``1.2 * n`` bytes.
+    """
+    __slots__ = ('bits', 'offset', 'nbits', 'nhashes', 'count')
+
+    def __init__ (self, capacity, error_rate=0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError("'error_rate' must be between 0 and 1")
+        capacity = max(1, capacity)
+
+        # the optimal number of bits, and of hashes, for the capacity
+        nbits = int(math.ceil(-capacity * math.log(error_rate) /
+                              math.log(2) ** 2))
+        self.nbits = max(8, nbits)
+        self.nhashes = max(1, int(round(float(self.nbits) / capacity *
+                                        math.log(2))))
+        self.bits = mmap.mmap(-1, (self.nbits + 7) // 8)
+        self.offset = 0
+        self.count = 0
+
+    def __len__ (self):
+        """
+        Returns the number of keys added (counting any repeats).
+        """
+        return self.count
+
+    def _positions (self, key):
+        # double hashing: the `i`th hash is `h1 + i * h2`
+        (h1, h2) = _hashes.unpack(md5(key).digest())
+        nbits = self.nbits
+        return [(h1 + i * h2) % nbits for i in xrange(self.nhashes)]
+
+    def add (self, key):
+        """
+        Adds the string ``key``.
+        """
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        bits = self.bits
+        offset = self.offset
+        for position in self._positions(key):
+            i = offset + (position >> 3)
+            bits[i] = chr(ord(bits[i]) | 1 << (position & 7))
+        self.count += 1
+
+    def update (self, keys):
+        """
+        Adds each of the strings ``keys``.
+        """
+        for key in keys:
+            self.add(key)
+
+    def __contains__ (self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        elif not isinstance(key, str):
+            return False
+
+        (h1, h2) = _hashes.unpack(md5(key).digest())
+        (bits, offset, nbits) = (self.bits, self.offset, self.nbits)
+        for i in xrange(self.nhashes):
+            position = (h1 + i * h2) % nbits
+            if not ord(bits[offset + (position >> 3)]) & 1 << (position & 7):
+                return False
+        return True
+
+    @classmethod
+    def fromfile (cls, path, error_rate=0.01, capacity=None):
+        """
+        Returns a new filter of the keys in the file at ``path``, one
+        per line, reading them one at a time. If `capacity` is
+        :data:`None`, it's the number of lines (which takes an extra
+        pass over the file).
+        """
+        if capacity is None:
+            with open(path, 'rb') as lines:
+                capacity = sum(1 for line in lines)
+
+        bloom = cls(capacity, error_rate)
+        with open(path, 'rb') as lines:
+            bloom.update(_stripped(line) for line in lines)
+        return bloom
+
+    def save (self, path):
+        """
+        Saves the filter to the file at ``path``.
+        """
+        with open(path, 'wb') as out:
+            out.write(_magic)
+            out.write(_header.pack(self.nbits, self.nhashes, self.count))
+            out.write(self.bits[self.offset:
+                                self.offset + (self.nbits + 7) // 8])
+
+    @classmethod
+    def load (cls, path):
+        """
+        Returns the filter saved in the file at ``path``, mapped
+        read-only into memory.
+        """
+        with open(path, 'rb') as saved:
+            bits = mmap.mmap(saved.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if bits[:len(_magic)] != _magic:
+            raise ValueError("%r isn't a saved BloomFilter" % path)
+        offset = len(_magic) + _header.size
+
+        bloom = cls.__new__(cls)
+        (bloom.nbits, bloom.nhashes, bloom.count) = _header.unpack(
+            bits[len(_magic):offset])
+        if len(bits) < offset + (bloom.nbits + 7) // 8:
+            raise ValueError("%r is truncated" % path)
+        (bloom.bits, bloom.offset) = (bits, offset)
+        return bloom
+
+class SortedFile (object):
+    """
+    An exact set of strings, in a file of one key per line, sorted by
+    byte value (e.g., by ``LC_ALL=C sort -u``). It's mapped read-only
+    into memory, and searched by bisection, so it costs nothing up
+    front, and only the pages it touches after that.
+
+    Keys can't contain newlines. :class:`unicode` keys are encoded as
+    UTF-8, and anything other than a string is never a member.
+    """
+    __slots__ = ('path', 'lines')
+
+    def __init__ (self, path):
+        self.path = path
+        with open(path, 'rb') as lines:
+            # (an empty file can't be mapped)
+            self.lines = (mmap.mmap(lines.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+                          if lines.read(1)
+                          else '')
+
+    def __contains__ (self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        elif not isinstance(key, str):
+            return False
+
+        lines = self.lines
+        (lo, hi) = (0, len(lines))
+        while lo < hi:
+            # the line around the midpoint
+            mid = (lo + hi) // 2
+            start = lines.rfind('\n', lo, mid) + 1 or lo
+            end = lines.find('\n', start, hi)
+            if end < 0:
+                end = hi
+
+            line = lines[start:end]
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+def _stripped (line):
+    return line[:-1] if line.endswith('\n') else line
@@ -0,0 +1,201 @@
+"""
+Source-generating compiler for :ref:`predicate_composition` trees.
+
+The composition factories (:func:`~predicates._and`,
+:func:`~predicates._or`, :func:`~predicates._not`) each return a node
+which loops over its children on every call, so a nested composite
+costs a Python-level call per level, per evaluation. :func:`_compile`
+flattens such a tree into a single Python function whose body is one
+short-circuiting ``and``/``or`` expression over the tree's leaves.
+
+It also generates the straight-line validators behind
+:func:`~predicates._args` (see :func:`_validator`).
+"""
+
+from predicates import _fast
+
+# the composites we know how to inline, mapped to the boolean
+# operator which joins their children, and the value of the composite
+# when it has no children.
+_operators = {
+    '_and': (' and ', 'True'),
+    '_or':  (' or ',  'False'),
+    '_not': (' or ',  'False'),
+    }
+
+# the deepest nesting of composites which is inlined into one generated
+# function: the parser can only handle so many nested parentheses (about
+# a hundred), so deeper subtrees are compiled into functions of their
+# own
+_maxdepth = 24
+
+def _define (name, source, namespace):
+    """
+    Executes the generated ``source`` in ``namespace``, and returns
+    the object it binds to ``name``.
+    """
+    code = compile(source, "<predicates: %s>" % name, 'exec')
+    exec(code, namespace)
+    return namespace[name]
+
+def _compile (predicate):
+    """
+    Returns a `callable` equivalent to ``predicate``, with all of its
+    nested :func:`~predicates._and`, :func:`~predicates._or`, and
+    :func:`~predicates._not` composites inlined into a single function.
+    E.g.,
+
+    .. code-block:: python
+
+       >>> fn = _compile(_and(isstring, _or(isempty, _not(isatom))))
+
+    is equivalent to:
+
+    .. code-block:: python
+
+       def fn (*args, **kwargs):
+           return True if (isstring(*args, **kwargs) and
+                           (isempty(*args, **kwargs) or
+                            not (isatom(*args, **kwargs)))) else False
+
+    The compiled function short-circuits exactly as the original tree
+    does, and, like the composites, always returns a :func:`bool`.
+
+    Any other predicate is a leaf, and is called through its
+    :func:`~predicates._fast` callable (so a leaf node costs no more
+    than a function). If
+    ``predicate`` is, itself, a leaf, there's nothing to inline, so it
+    is returned unchanged. Composites nested more than
+    :data:`_maxdepth` deep are compiled separately, and called as
+    leaves.
+    """
+    if getattr(predicate, 'op', None) not in _operators:
+        return predicate
+
+    # each distinct leaf becomes a free variable of the generated
+    # function (which makes it a fast `LOAD_DEREF`, rather than a
+    # `LOAD_GLOBAL`, in the generated code)
+    leaves = []
+    names = {}
+
+    def leaf (pred):
+        if id(pred) not in names:
+            names[id(pred)] = 'p%d' % len(leaves)
+            leaves.append(pred)
+        return "%s(*args, **kwargs)" % names[id(pred)]
+
+    # the separately compiled subtrees, by the `id` of each subtree
+    deep = {}
+
+    def expression (pred, depth):
+        op = getattr(pred, 'op', None)
+        if op not in _operators:
+            return leaf(pred)
+        if depth > _maxdepth:
+            if id(pred) not in deep:
+                deep[id(pred)] = _compile(pred)
+            return leaf(deep[id(pred)])
+
+        joiner, empty = _operators[op]
+        expr = ("(%s)" % joiner.join(expression(child, depth + 1)
+                                     for child in pred.children)
+                if pred.children
+                else empty)
+        return "not %s" % expr if op == '_not' else expr
+
+    body = expression(predicate, 1)
+    params = ", ".join(names[id(pred)] for pred in leaves)
+    source = ("def _factory (%s):\n"
+              "    def _compiled (*args, **kwargs):\n"
+              "        return True if %s else False\n"
+              "    return _compiled\n") % (params, body)
+
+    compiled = _define('_factory', source, {})(*map(_fast, leaves))
+    compiled.__doc__ = predicate.__doc__
+    return compiled
+
+# the widest `_args` slice whose indices a validator checks one by one,
+# in straight-line code (wider, open-ended, or stepped slices loop over
+# `args[key]`)
+_unrolled = 8
+
+def _validator (key, positional, kws):
+    """
+    Returns a ``__call__`` method for :func:`~predicates._args` nodes
+    of the same *shape*: the slice ``key``, whether or not there's a
+    positional predicate, and the (sorted) keyword names ``kws``. It
+    checks the node's ``predicate`` against each positional arg in
+    ``args[key]``, and each of its ``kw_predicates`` against
+    ``kwargs.get(kw)``, calling their :func:`~predicates._fast`
+    callables (the node's ``call`` and ``kwcalls``).
+
+    The slice's bounds and the keyword names are baked into the
+    generated code: e.g., ``_args[0:2](isstring, jack=isint)`` gets:
+
+    .. code-block:: python
+
+       def __call__ (self, *args, **kwargs):
+           p = self.call
+           n = len(args)
+           if n > 0 and not p(args[0]):
+               return False
+           if n > 1 and not p(args[1]):
+               return False
+           k = self.kwcalls
+           if not k[0][1](kwargs.get('jack')):
+               return False
+           return True
+
+    so a call builds no intermediate slices, and doesn't iterate over
+    the keyword predicates.
+    """
+    body = []
+
+    if positional:
+        body.append("p = self.call")
+        indices = _indices(key)
+        if indices is None:
+            body.extend(["for arg in args[key]:",
+                         "    if not p(arg):",
+                         "        return False"])
+        elif indices == 'all':
+            body.extend(["for arg in args:",
+                         "    if not p(arg):",
+                         "        return False"])
+        elif indices:
+            body.append("n = len(args)")
+            for i in indices:
+                body.extend(["if n > %d and not p(args[%d]):" % (i, i),
+                             "    return False"])
+
+    if kws:
+        body.append("k = self.kwcalls")
+    for (i, kw) in enumerate(kws):
+        body.extend(["if not k[%d][1](kwargs.get(%r)):" % (i, kw),
+                     "    return False"])
+
+    body.append("return True")
+    source = ("def _factory (key):\n"
+              "    def __call__ (self, *args, **kwargs):\n"
+              "%s\n"
+              "    return __call__\n") % "\n".join(" " * 8 + line
+                                                  for line in body)
+
+    return _define('_factory', source, {})(key)
+
+def _indices (key):
+    """
+    Returns ``'all'`` if the slice ``key`` selects every element, the
+    list of the indices it selects if it's a short, bounded,
+    non-negative range, or :data:`None` otherwise.
+    """
+    if key.step not in (None, 1):
+        return None
+    start = 0 if key.start is None else key.start
+    if start < 0:
+        return None
+    if key.stop is None:
+        return 'all' if start == 0 else None
+    if key.stop < 0 or key.stop - start > _unrolled:
+        return None
+    return range(start, key.stop)
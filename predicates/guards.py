@@ -0,0 +1,323 @@
+"""
+Call guards: decorators which check a function's arguments against a
+predicate before every call.
+
+The argument-structure predicates (:func:`~predicates._npos`,
+:func:`~predicates._nkw`, :func:`~predicates._nargs`,
+:func:`~predicates._inkw`, and :func:`~predicates._arity`) depend only
+on the *shape* of a call (the number of positional arguments, and the
+keyword names), so a guard checks them once per distinct shape, and
+remembers the verdict.
+
+Where checking every call costs too much, a guard can *sample* its
+calls instead, checking only as many as fit in a CPU budget, and
+counting failures rather than raising.
+"""
+
+from functools import wraps
+from threading import Lock
+from timeit import default_timer
+
+from predicates import (
+    _And,
+    _Arity,
+    _fast,
+    _fusedarity,
+    )
+from predicates.optimize import _optimize
+
+# when false, :func:`validate` returns the functions it decorates
+# unwrapped (it's off in optimized builds, i.e., under `python -O`)
+enabled = __debug__
+
+# the most call shapes a guard remembers verdicts for
+maxshapes = 256
+
+# the most calls a sampling guard lets through between checks
+maxevery = 10000
+
+def validate (predicate, budget=None):
+    """
+    Returns a decorator which wraps a function in a guard which raises
+    :exc:`TypeError` unless ``predicate(*args, **kwargs)`` is true for
+    the arguments of each call. E.g.,
+
+    .. code-block:: python
+
+       >>> @validate(_and(_npos(exactly=2), _args(isint)))
+       ... def add (a, b):
+       ...     return a + b
+       >>> add(4, 8)
+       12
+       >>> add(4, '8')
+       TypeError: add: arguments failed validation by _and(...)
+
+    The ``predicate`` is :func:`~predicates._optimize`\\ d, and split
+    into its argument-structure checks, whose verdict the guard caches
+    for each call shape (up to :data:`maxshapes` of them), and the
+    rest, which it checks on every call.
+
+    If :data:`enabled` is false when the function is decorated (as it
+    is, by default, under ``python -O``), the decorator returns the
+    function itself, so the guard costs nothing at all.
+
+    The guard exposes ``predicate``, its cached ``verdicts`` (by call
+    shape), and the original function, as ``__wrapped__``.
+
+    If a `budget` is given, the guard *samples* its calls, rather than
+    checking every one: it checks one call in every ``N``, adjusting
+    ``N`` (up to :data:`maxevery`) so that checking takes (about) the
+    `budget` fraction of the time spent in the guarded function (e.g.,
+    ``0.01`` for 1%). A sampling guard never raises; it counts each
+    failure (including a check which raises), and, from then on,
+    checks *every* call of the same shape as the one which failed. Its
+    ``sampling`` attribute holds its :class:`Sampling` state and
+    statistics.
+    """
+    if budget is not None and not 0 < budget < 1:
+        raise ValueError("'budget' must be between 0 and 1")
+
+    def decorator (func):
+        if not enabled:
+            return func
+        if budget is not None:
+            return _sampled(func, predicate, budget)
+        return _guarded(func, predicate)
+    return decorator
+
+def _shape (args, kwargs):
+    """
+    Returns the key for the shape of a call with ``args`` and
+    ``kwargs``: the number of positional args, paired with the
+    :func:`frozenset` of keyword names, if there are any.
+    """
+    return (len(args), frozenset(kwargs)) if kwargs else len(args)
+
+def _split (predicate):
+    """
+    Returns a pair of the argument-structure checks in ``predicate``
+    (as a single :func:`~predicates._arity`), and the rest of it,
+    either of which may be :data:`None` if ``predicate`` has none.
+    """
+    predicate = _optimize(predicate)
+    if isinstance(predicate, _Arity):
+        return (predicate, None)
+
+    if not isinstance(predicate, _And):
+        return (None, predicate)
+
+    arities = [child for child in predicate.children
+               if isinstance(child, _Arity)]
+    rest = [child for child in predicate.children
+            if not isinstance(child, _Arity)]
+
+    shape = (None if not arities
+             else arities[0] if len(arities) == 1
+             else _fusedarity(arities))
+    values = (None if not rest
+              else rest[0] if len(rest) == 1
+              else _And(tuple(rest)))
+    return (shape, values)
+
+def _guarded (func, predicate):
+    (shape, values) = _split(predicate)
+    # (the value checks run on every call, so they're called through
+    # their fast callable)
+    values = _fast(values)
+    verdicts = {}
+
+    def fail ():
+        raise TypeError("%s: arguments failed validation by %r"
+                        % (func.__name__, predicate))
+
+    @wraps(func)
+    def guarded (*args, **kwargs):
+        if shape is not None:
+            # (`_shape`, inlined)
+            key = (len(args), frozenset(kwargs)) if kwargs else len(args)
+            try:
+                verdict = verdicts[key]
+            except KeyError:
+                verdict = shape(*args, **kwargs)
+                if len(verdicts) >= maxshapes:
+                    verdicts.clear()
+                verdicts[key] = verdict
+            if not verdict:
+                fail()
+
+        if values is not None and not values(*args, **kwargs):
+            fail()
+
+        return func(*args, **kwargs)
+
+    guarded.predicate = predicate
+    guarded.verdicts = verdicts
+    guarded.__wrapped__ = func
+    return guarded
+
+def _checker (predicate):
+    """
+    Returns a function of ``(args, kwargs)`` which returns the truth of
+    ``predicate`` for them (caching the verdicts of its
+    argument-structure checks, as a full guard does), and the cache.
+    """
+    (shape, values) = _split(predicate)
+    values = _fast(values)
+    verdicts = {}
+
+    def check (args, kwargs):
+        if shape is not None:
+            key = _shape(args, kwargs)
+            try:
+                verdict = verdicts[key]
+            except KeyError:
+                verdict = shape(*args, **kwargs)
+                if len(verdicts) >= maxshapes:
+                    verdicts.clear()
+                verdicts[key] = verdict
+            if not verdict:
+                return False
+        return values is None or bool(values(*args, **kwargs))
+
+    return (check, verdicts)
+
+class Sampling (object):
+    """
+    The state, and statistics, of a sampling guard (see
+    :func:`validate`):
+
+    ``every``
+       The guard checks one call in ``every``.
+
+    ``calls``, ``checked``
+       The number of calls, and of those which were checked.
+
+    ``failures``
+       The number of failed checks, by call shape.
+
+    ``forced``
+       The call shapes which the guard checks on every call.
+
+    Call shapes are the number of positional arguments, or, for calls
+    with keyword arguments, a pair of the number of positional
+    arguments and the :func:`frozenset` of keyword names.
+
+    The guard may be called from several threads at once, so its state
+    is only updated under ``lock``.
+    """
+    __slots__ = ('budget', 'every', 'countdown', 'calls', 'checked',
+                 'failures', 'forced', 'checkcost', 'callcost', 'lock')
+
+    # the weight of the latest sample in the running averages of the
+    # cost of a check and of a call
+    decay = 0.1
+
+    def __init__ (self, budget):
+        self.budget = budget
+        self.every = self.countdown = 1
+        self.calls = self.checked = 0
+        self.failures = {}
+        self.forced = set()
+        self.checkcost = self.callcost = None
+        self.lock = Lock()
+
+    def due (self):
+        """
+        Counts a call, and returns whether it's due to be sampled (in
+        which case, the countdown to the next sample restarts).
+        """
+        with self.lock:
+            self.calls += 1
+            self.countdown -= 1
+            # (`<=`, not `==`: a countdown which somehow skipped past
+            # zero must still trigger a sample, or sampling stops)
+            if self.countdown <= 0:
+                self.countdown = self.every
+                return True
+            return False
+
+    def force (self, npos, kws=()):
+        """
+        Checks every call with ``npos`` positional arguments and the
+        keyword arguments named in ``kws``, from now on.
+        """
+        with self.lock:
+            self.forced.add((npos, frozenset(kws)) if kws else npos)
+
+    def failed (self, shape):
+        """
+        Records a failed check of a call of the given ``shape``.
+        """
+        with self.lock:
+            self.failures[shape] = self.failures.get(shape, 0) + 1
+            self.forced.add(shape)
+
+    def checkedforced (self):
+        """
+        Records a check of a call whose shape is forced.
+        """
+        with self.lock:
+            self.checked += 1
+
+    def sampled (self, checkcost, callcost):
+        """
+        Records the costs of a sampled call, and adjusts ``every`` to
+        keep the cost of checking within the budget.
+        """
+        with self.lock:
+            self.checked += 1
+            if self.checkcost is None:
+                (self.checkcost, self.callcost) = (checkcost, callcost)
+            else:
+                decay = self.decay
+                self.checkcost += decay * (checkcost - self.checkcost)
+                self.callcost += decay * (callcost - self.callcost)
+
+            # checking one call in `every` costs `checkcost / (every *
+            # callcost)` of the time spent in the function
+            every = self.checkcost / (self.budget * max(self.callcost, 1e-9))
+            self.every = self.countdown = max(1, min(int(every) + 1,
+                                                     maxevery))
+
+def _sampled (func, predicate, budget):
+    (check, verdicts) = _checker(predicate)
+    state = Sampling(budget)
+    forced = state.forced
+    due = state.due
+
+    def passes (args, kwargs):
+        # a check which raises (e.g., on arguments of the wrong type) has
+        # failed; a sampling guard never raises
+        try:
+            return check(args, kwargs)
+        except Exception:
+            return False
+
+    def sample (args, kwargs):
+        start = checked = default_timer()
+        # (invalid arguments may well make `func` raise, and it must
+        # still be sampled again)
+        try:
+            ok = passes(args, kwargs)
+            checked = default_timer()
+            if not ok:
+                state.failed(_shape(args, kwargs))
+            return func(*args, **kwargs)
+        finally:
+            state.sampled(checked - start, default_timer() - checked)
+
+    @wraps(func)
+    def guarded (*args, **kwargs):
+        if due():
+            return sample(args, kwargs)
+        if forced and _shape(args, kwargs) in forced:
+            state.checkedforced()
+            if not passes(args, kwargs):
+                state.failed(_shape(args, kwargs))
+        return func(*args, **kwargs)
+
+    guarded.predicate = predicate
+    guarded.verdicts = verdicts
+    guarded.sampling = state
+    guarded.__wrapped__ = func
+    return guarded
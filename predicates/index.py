@@ -0,0 +1,699 @@
+"""
+Indexes over sets of rules, which find the rules an object can match
+without trying each rule in turn.
+
+:class:`TypeIndex` dispatches on the type of an object, by way of the
+:func:`~predicates._isa` guards of its rules. :class:`RuleNetwork`
+turns the identity, equality, range, and membership tests of its rules
+into hash and interval lookups, which it shares across rules.
+:class:`RangeIndex` finds the :func:`~predicates._nis` ranges which
+contain a number.
+"""
+
+from abc import ABCMeta
+from bisect import bisect_left, bisect_right
+from functools import partial
+from operator import eq
+from types import ClassType
+
+from predicates import (
+    _IsA,
+    _In,
+    _IsIn,
+    _and,
+    _classes,
+    _frozen,
+    _reflexive,
+    )
+
+# the most terms (see :class:`RuleNetwork`) into which a rule is split
+maxterms = 64
+
+class TypeIndex (object):
+    """
+    An index of single-argument ``rules`` by their :func:`_isa`
+    *guards*: a rule which is an :func:`~predicates._isa`, or an
+    :func:`~predicates._and` with :func:`~predicates._isa` children,
+    can only be true for instances of their classes. E.g.,
+
+    .. code-block:: python
+
+       >>> index = TypeIndex([_and(isstring, _not(isempty)),
+       ...                    _and(ismap, _contains('jack')),
+       ...                    isint])
+       >>> index.candidates({'jack': 4})
+       [_and(_isa(Mapping), _contains('jack'))]
+       >>> index.matching("bad robot!")
+       [_and(_isa(basestring), _not(isempty))]
+
+    Rather than trying every rule's guard, the index looks up the
+    classes of ``type(obj).__mro__`` in a table of the guards' classes,
+    and checks :func:`issubclass` just once for each guard class which
+    defines its own subclass check (i.e., the :mod:`abstract base
+    classes <abc>`, like :class:`~collections.Mapping`, whose virtual
+    subclasses aren't in the MRO). It caches the candidate rules for
+    (up to `cachesize`) types; the cache is cleared whenever any ABC's
+    :meth:`~abc.ABCMeta.register` is called (which might change the
+    answers), or when it is full.
+
+    Rules without guards are candidates for every object. Candidates
+    are always in the order in which their rules were added.
+
+    Objects whose ``__class__`` isn't their type (old-style instances,
+    and some proxies) bypass the cache, and have each guard checked
+    with :func:`isinstance`.
+    """
+    __slots__ = ('rules', 'guards', 'entries', 'exact', 'checked',
+                 'cache', 'cachesize', 'token')
+
+    def __init__ (self, rules=(), cachesize=1024):
+        # `guards` maps each distinct guard `classinfo` to its number;
+        # `entries` holds, for each rule, its guard numbers and
+        # `classinfo`s, the rule, and the rest of it (or `None`, if
+        # it's all guard); `exact` and `checked` map each guard class
+        # to the numbers of the guards which include it
+        self.rules = []
+        self.guards = {}
+        self.entries = []
+        self.exact = {}
+        self.checked = {}
+        self.cache = {}
+        self.cachesize = cachesize
+        self.token = None
+        for rule in rules:
+            self.add(rule)
+
+    def __len__ (self):
+        return len(self.rules)
+
+    def __iter__ (self):
+        return iter(self.rules)
+
+    def add (self, rule):
+        """
+        Adds ``rule`` to the index.
+        """
+        (classinfos, rest) = _guarded(rule)
+        numbers = []
+        for classinfo in classinfos:
+            if classinfo not in self.guards:
+                number = self.guards[classinfo] = len(self.guards)
+                for cls in _classes(classinfo):
+                    table = (self.exact
+                             if type(cls) in (type, ClassType)
+                             else self.checked)
+                    table.setdefault(cls, set()).add(number)
+            numbers.append(self.guards[classinfo])
+
+        self.rules.append(rule)
+        self.entries.append((tuple(numbers), tuple(classinfos), rule, rest))
+        self.cache.clear()
+
+    def candidates (self, obj):
+        """
+        Returns the list of the rules whose guards ``obj`` passes.
+        """
+        return [rule for (rule, rest) in self._candidates(obj)]
+
+    def matching (self, obj):
+        """
+        Returns the list of the rules which are true for ``obj``
+        (checking only the rest of each candidate, past its guards).
+        """
+        return [rule for (rule, rest) in self._candidates(obj)
+                if rest is None or rest(obj)]
+
+    def _candidates (self, obj):
+        """
+        Returns the `(rule, rest)` pairs of the rules whose guards
+        ``obj`` passes.
+        """
+        cls = type(obj)
+        if obj.__class__ is not cls:
+            return [(rule, rest)
+                    for (numbers, classinfos, rule, rest) in self.entries
+                    if all(isinstance(obj, classinfo)
+                           for classinfo in classinfos)]
+
+        # `ABCMeta.register` bumps the counter, and may change answers
+        cache = self.cache
+        if self.token != ABCMeta._abc_invalidation_counter:
+            cache.clear()
+            self.token = ABCMeta._abc_invalidation_counter
+
+        try:
+            return cache[cls]
+        except KeyError:
+            pass
+
+        passed = set()
+        exact = self.exact
+        for base in cls.__mro__:
+            if base in exact:
+                passed |= exact[base]
+        for (base, numbers) in self.checked.iteritems():
+            if not numbers <= passed and issubclass(cls, base):
+                passed |= numbers
+
+        candidates = tuple((rule, rest)
+                           for (numbers, classinfos, rule, rest)
+                           in self.entries
+                           if all(number in passed for number in numbers))
+        if len(cache) >= self.cachesize:
+            cache.clear()
+        cache[cls] = candidates
+        return candidates
+
+def _guarded (rule):
+    """
+    Returns a pair of the list of the `classinfo`\\ s of the guards of
+    ``rule``, and the rest of it (or :data:`None`, if there's nothing
+    but guards).
+    """
+    if isinstance(rule, _IsA):
+        return ([rule.classinfo], None)
+
+    if getattr(rule, 'op', None) != '_and':
+        return ([], rule)
+
+    classinfos = [child.classinfo for child in rule.children
+                  if isinstance(child, _IsA)]
+    rest = [child for child in rule.children
+            if not isinstance(child, _IsA)]
+    if not classinfos:
+        return ([], rule)
+    return (classinfos,
+            None if not rest
+            else rest[0] if len(rest) == 1
+            else _and(*rest))
+
+
+class RuleNetwork (object):
+    """
+    A discrimination network over single-argument ``rules``: it finds
+    the rules which are true for an object without trying each rule in
+    turn. E.g.,
+
+    .. code-block:: python
+
+       >>> rules = [_and(_nis(atleast=4), _nis(atmost=8)),
+       ...          _or(_is(None), partial(eq, 4)),
+       ...          _and(ismap, _contains('jack'))]
+       >>> network = RuleNetwork(rules)
+       >>> network.matching(4) == rules[:2]
+       True
+       >>> network.matching({'jack': 4})
+       [_and(_isa(Mapping), _contains('jack'))]
+
+    Each rule is split into *terms* (the disjunctive normal form of
+    its :func:`~predicates._and`\\ s and :func:`~predicates._or`\\ s,
+    up to :data:`maxterms` of them), each a conjunction of *tests*,
+    which the network indexes, and of anything else. The tests are:
+
+    * :func:`~predicates._is` (and :func:`~predicates._in`, with
+      `identity`), which it looks up by the identity of the object;
+
+    * ``partial(eq, val)`` (for a hashable `val`), and
+      :func:`~predicates._in` (of hashable values), which it looks up
+      by the value of the object (with :func:`hash`);
+
+    * :func:`~predicates._nis`, which it looks up in a
+      :class:`RangeIndex`;
+
+    * :func:`~predicates._contains` (of hashable contents), which it
+      checks once for each distinct content, or, for a :class:`set`,
+      :class:`frozenset`, or :class:`dict` with fewer members than
+      there are distinct contents, looks up by each member.
+
+    Each distinct test (by structural equality) is checked once per
+    object, however many rules share it. Only the terms all of whose
+    tests pass (and terms with no tests) go any further: the rest of
+    each such term is evaluated (each distinct predicate, at most once
+    per object) until one of each rule's terms is true.
+
+    A test (or any other predicate of a term) which raises
+    :exc:`TypeError` (e.g., a :func:`~predicates._contains` of an
+    object which isn't a container) is false, where, alone, the rule
+    might have raised it, or might have short-circuited past it.
+    """
+    __slots__ = ('rules', 'tests', 'terms', 'waiting', 'always',
+                 'identities', 'constants', 'ranges', 'elements', 'needs')
+
+    def __init__ (self, rules=()):
+        # `tests` maps each distinct test's key to its number; `terms`
+        # holds each term's rule number, its number of tests, and the
+        # rest of it; `waiting` maps each test to the terms which need
+        # it, and `always` lists the terms which have no tests; the
+        # rest are the indexes of the tests, by kind
+        self.rules = []
+        self.tests = {}
+        self.terms = []
+        self.waiting = {}
+        self.always = []
+        self.identities = {}
+        self.constants = {}
+        self.ranges = RangeIndex()
+        self.elements = {}
+        self.needs = {}
+        for rule in rules:
+            self.add(rule)
+
+    def __len__ (self):
+        return len(self.rules)
+
+    def __iter__ (self):
+        return iter(self.rules)
+
+    def add (self, rule):
+        """
+        Adds ``rule`` to the network.
+        """
+        number = len(self.rules)
+        self.rules.append(rule)
+        try:
+            terms = _terms(rule)
+        except _TooManyTerms:
+            terms = [((), (rule,))]
+
+        for (tests, rest) in terms:
+            tests = set(self._test(test) for test in tests)
+            term = len(self.terms)
+            self.terms.append((number, len(tests), rest))
+            if not tests:
+                self.always.append(term)
+            for test in tests:
+                self.waiting[test].append(term)
+
+    def _test (self, pred):
+        """
+        Returns the number of the test ``pred``, indexing it if it's
+        new.
+        """
+        key = _testkey(pred)
+        if key in self.tests:
+            return self.tests[key]
+
+        test = self.tests[key] = len(self.tests)
+        self.waiting[test] = []
+        (kind, params) = key
+        if kind == '_is':
+            for ident in params:
+                self.identities.setdefault(ident, []).append(test)
+        elif kind == 'eq':
+            for val in params:
+                self.constants.setdefault(val, []).append(test)
+        elif kind == '_nis':
+            self.ranges._add(params[0], params[1], test)
+        else:
+            self.needs[test] = len(params)
+            for content in params:
+                self.elements.setdefault(content, []).append(test)
+        return test
+
+    def matching (self, obj):
+        """
+        Returns the list of the rules which are true for ``obj``, in
+        the order in which they were added.
+        """
+        counts = {}
+        ready = list(self.always)
+        terms = self.terms
+        waiting = self.waiting
+        for test in self._passed(obj):
+            for term in waiting[test]:
+                count = counts[term] = counts.get(term, 0) + 1
+                if count == terms[term][1]:
+                    ready.append(term)
+
+        matched = set()
+        verdicts = {}
+        for term in ready:
+            (rule, ntests, rest) = terms[term]
+            if rule in matched:
+                continue
+            for pred in rest:
+                key = _frozen(pred)
+                if key not in verdicts:
+                    try:
+                        verdicts[key] = bool(pred(obj))
+                    except TypeError:
+                        verdicts[key] = False
+                if not verdicts[key]:
+                    break
+            else:
+                matched.add(rule)
+
+        return [self.rules[i] for i in sorted(matched)]
+
+    def _passed (self, obj):
+        """
+        Returns the list of the tests which pass for ``obj``.
+        """
+        passed = list(self.identities.get(id(obj), ()))
+
+        if self.constants:
+            try:
+                passed.extend(self.constants.get(obj, ()))
+            except TypeError:
+                # unhashable objects (e.g., a :class:`set`) may still be
+                # equal to some of the (hashable) constants
+                passed.extend(set(test
+                                  for (val, tests)
+                                  in self.constants.iteritems()
+                                  if eq(val, obj)
+                                  for test in tests))
+
+        if self.ranges:
+            passed.extend(self.ranges._containing(obj))
+
+        if self.elements:
+            passed.extend(self._contained(obj))
+
+        return passed
+
+    def _contained (self, obj):
+        """
+        Returns the list of the :func:`~predicates._contains` tests
+        which pass for ``obj``.
+        """
+        elements = self.elements
+        if (type(obj) in (set, frozenset, dict) and
+            len(obj) < len(elements)):
+            found = (elements[member] for member in obj
+                     if member in elements)
+        else:
+            found = [tests for (content, tests) in elements.iteritems()
+                     if _within(content, obj)]
+
+        counts = {}
+        for tests in found:
+            for test in tests:
+                counts[test] = counts.get(test, 0) + 1
+        needs = self.needs
+        return [test for (test, count) in counts.iteritems()
+                if count == needs[test]]
+
+def _within (content, container):
+    # `content in container`, but false where that raises
+    # :exc:`TypeError` (e.g., `4 in 'jack'`)
+    try:
+        return content in container
+    except TypeError:
+        return False
+
+class _TooManyTerms (Exception):
+    pass
+
+def _testkey (pred):
+    """
+    Returns the key of ``pred`` if it's a test which a
+    :class:`RuleNetwork` can index (equal tests have equal keys), or
+    :data:`None`.
+    """
+    op = getattr(pred, 'op', None)
+    if op == '_is':
+        return ('_is', frozenset([id(pred.it)]))
+
+    if isinstance(pred, _IsIn):
+        return ('_is', pred.ids)
+
+    if isinstance(pred, _In):
+        if not pred.others:
+            return ('eq', pred.members)
+        return None
+
+    if op == '_nis':
+        return ('_nis', (pred.atleast, pred.atmost))
+
+    if op == '_contains':
+        if all(_frozen(content) is content for content in pred.contents):
+            return ('_contains', frozenset(pred.contents))
+        return None
+
+    # (a value which isn't equal to itself, like NaN, would be found by
+    # identity)
+    if (isinstance(pred, partial) and pred.func is eq and
+        len(pred.args) == 1 and not pred.keywords and
+        _frozen(pred.args[0]) is pred.args[0] and
+        _reflexive(pred.args[0])):
+        return ('eq', frozenset(pred.args))
+
+    return None
+
+def _terms (pred):
+    """
+    Returns the terms of ``pred``: a list of `(tests, rest)` pairs, one
+    for each conjunction in its disjunctive normal form, where `tests`
+    are the predicates which a :class:`RuleNetwork` can index, and
+    `rest`, the others. Raises :exc:`_TooManyTerms` if there would be
+    more than :data:`maxterms`.
+    """
+    op = getattr(pred, 'op', None)
+
+    if op == '_and':
+        terms = [((), ())]
+        for child in pred.children:
+            terms = [(tests + more, rest + others)
+                     for (tests, rest) in terms
+                     for (more, others) in _terms(child)]
+            if len(terms) > maxterms:
+                raise _TooManyTerms()
+        return terms
+
+    if op == '_or':
+        terms = []
+        for child in pred.children:
+            terms.extend(_terms(child))
+            if len(terms) > maxterms:
+                raise _TooManyTerms()
+        return terms
+
+    if op == '_return':
+        return [((), ())] if pred.val else []
+
+    if _testkey(pred) is not None:
+        return [((pred,), ())]
+    return [((), (pred,))]
+
+class RangeIndex (object):
+    """
+    An index of :func:`~predicates._nis` (or :func:`~predicates._fnis`)
+    ``predicates`` by their ranges, which finds the predicates which
+    are true for a number in ``O(log n + k)`` time (for `n` ranges, of
+    which `k` contain it), rather than trying each in turn. E.g.,
+
+    .. code-block:: python
+
+       >>> tiers = RangeIndex([_nis(atmost=9),
+       ...                     _nis(atleast=10, atmost=99),
+       ...                     _nis(atleast=50)])
+       >>> tiers.matching(64)
+       [_nis(10, 99), _nis(50, inf)]
+       >>> tiers.matching_many([4, 64, 128])
+       [[_nis(0, 9)], [_nis(10, 99), _nis(50, inf)], [_nis(50, inf)]]
+
+    The :func:`~predicates._fnis` predicates of an index must all
+    apply the same `func` (e.g., :func:`len`, to index by size), which
+    the index applies just once to each object.
+
+    Matching predicates are always in the order in which they were
+    added. Arguments (or results of `func`) which aren't numbers (or
+    are NaN) are checked against each range in turn (and aren't in
+    any range they can't be compared with), as are ranges whose bounds
+    aren't numbers (e.g., ``_nis(exactly=3+0j)``).
+    """
+    __slots__ = ('func', 'ranges', 'tree')
+
+    def __init__ (self, predicates=()):
+        # `ranges` holds the `(atleast, atmost, item)` of each range;
+        # `tree` is built on demand (see :func:`_rangetree`)
+        self.func = None
+        self.ranges = []
+        self.tree = None
+        for predicate in predicates:
+            self.add(predicate)
+
+    def __len__ (self):
+        return len(self.ranges)
+
+    def __iter__ (self):
+        return (item for (atleast, atmost, item) in self.ranges)
+
+    def add (self, predicate):
+        """
+        Adds ``predicate`` to the index. Raises :exc:`ValueError` if it
+        isn't a :func:`~predicates._nis` or :func:`~predicates._fnis`,
+        or if it doesn't apply the same `func` as the rest.
+        """
+        op = getattr(predicate, 'op', None)
+        if op == '_nis':
+            (func, nis) = (None, predicate)
+        elif op == '_fnis':
+            (func, nis) = (predicate.func, predicate.nis)
+        else:
+            raise ValueError("can only index _nis and _fnis predicates")
+
+        if self.ranges and func is not self.func:
+            raise ValueError("the predicates must all apply the same func")
+
+        self.func = func
+        self._add(nis.atleast, nis.atmost, predicate)
+
+    def _add (self, atleast, atmost, item):
+        self.ranges.append((atleast, atmost, item))
+        self.tree = None
+
+    def matching (self, obj):
+        """
+        Returns the list of the predicates which are true for ``obj``.
+        """
+        return self._containing(obj if self.func is None else self.func(obj))
+
+    def matching_many (self, objs):
+        """
+        Returns a list of the :meth:`matching` predicates for each of
+        ``objs``. Rather than searching the index for each, it sorts
+        them, and sweeps through them and the ranges together.
+        """
+        if self.func is not None:
+            objs = [self.func(obj) for obj in objs]
+
+        if self.tree is None:
+            self.tree = _rangetree(self.ranges)
+        (root, starts, ends, loose) = self.tree
+
+        results = [None] * len(objs)
+        numbers = []
+        for (i, n) in enumerate(objs):
+            if _isnumber(n):
+                numbers.append((n, i))
+            else:
+                results[i] = self._containing(n)
+        numbers.sort()
+
+        ranges = self.ranges
+        active = set()
+        (nstarts, nends) = (len(starts), len(ends))
+        started = ended = 0
+        for (n, i) in numbers:
+            while started < nstarts and starts[started][0] <= n:
+                active.add(starts[started][1])
+                started += 1
+            while ended < nends and ends[ended][0] < n:
+                active.discard(ends[ended][1])
+                ended += 1
+            found = list(active)
+            found.extend(_looselycontaining(ranges, loose, n))
+            found.sort()
+            results[i] = [ranges[number][2] for number in found]
+        return results
+
+    def _containing (self, n):
+        """
+        Returns the list of the items whose ranges contain ``n``.
+        """
+        ranges = self.ranges
+        if not _isnumber(n):
+            return [item for (atleast, atmost, item) in ranges
+                    if _inrange(atleast, atmost, n)]
+
+        if self.tree is None:
+            self.tree = _rangetree(ranges)
+
+        (node, starts, ends, loose) = self.tree
+        found = _looselycontaining(ranges, loose, n)
+        while node is not None:
+            (center, los, bylo, his, byhi, left, right) = node
+            # every range at a node contains its center
+            if n < center:
+                found.extend(bylo[:bisect_right(los, n)])
+                node = left
+            elif n > center:
+                found.extend(byhi[bisect_left(his, n):])
+                node = right
+            else:
+                found.extend(bylo)
+                break
+
+        found.sort()
+        return [ranges[number][2] for number in found]
+
+def _inrange (atleast, atmost, n):
+    # `atleast <= n <= atmost` (as :func:`~predicates._nis` checks it),
+    # but false where that raises :exc:`TypeError` (e.g., for a
+    # :class:`complex` `n`)
+    try:
+        if atleast == atmost:
+            return n == atleast
+        return atleast <= n <= atmost
+    except TypeError:
+        return False
+
+def _isnumber (n):
+    # (NaN isn't equal to itself, and no range contains it)
+    return isinstance(n, (int, long, float)) and n == n
+
+def _looselycontaining (ranges, loose, n):
+    """
+    Returns the list of the numbers of the ``loose`` ranges (see
+    :func:`_rangetree`) which contain ``n``.
+    """
+    return [number for number in loose
+            if _inrange(ranges[number][0], ranges[number][1], n)]
+
+def _rangetree (ranges):
+    """
+    Returns a tuple of the root of a centered interval tree over the
+    (non-empty) ``ranges``, the `(atleast, number)` and `(atmost,
+    number)` pairs of the ranges, each sorted, for sweeping, and the
+    numbers of the `loose` ranges, whose bounds aren't numbers (e.g.,
+    a :class:`complex` `exactly`), and so can't be ordered; those are
+    checked in turn.
+
+    Each node of the tree is a tuple of its `center`, the lower bounds
+    of the ranges which contain it, sorted, and their numbers, in the
+    same order; their upper bounds, sorted, and their numbers; and the
+    subtrees of the ranges which lie entirely below, and above, the
+    center.
+    """
+    numbered = []
+    loose = []
+    for (number, (atleast, atmost, item)) in enumerate(ranges):
+        if not (_isbound(atleast) and _isbound(atmost)):
+            loose.append(number)
+        elif atleast <= atmost:
+            numbered.append((atleast, atmost, number))
+    starts = sorted((atleast, number)
+                    for (atleast, atmost, number) in numbered)
+    ends = sorted((atmost, number)
+                  for (atleast, atmost, number) in numbered)
+    return (_rangenode(numbered), starts, ends, loose)
+
+def _isbound (bound):
+    # (unlike an argument, a bound may be infinite, or NaN, which just
+    # makes for an empty range)
+    return isinstance(bound, (int, long, float))
+
+def _rangenode (ranges):
+    if not ranges:
+        return None
+
+    # the median of the bounds keeps the tree balanced (and, since it
+    # is itself a bound, at least one range contains it)
+    bounds = sorted([atleast for (atleast, atmost, number) in ranges] +
+                    [atmost for (atleast, atmost, number) in ranges])
+    center = bounds[len(bounds) // 2]
+
+    below = [r for r in ranges if r[1] < center]
+    above = [r for r in ranges if r[0] > center]
+    here = [r for r in ranges if r[0] <= center <= r[1]]
+
+    bylo = sorted((atleast, number) for (atleast, atmost, number) in here)
+    byhi = sorted((atmost, number) for (atleast, atmost, number) in here)
+    return (center,
+            [atleast for (atleast, number) in bylo],
+            [number for (atleast, number) in bylo],
+            [atmost for (atmost, number) in byhi],
+            [number for (atmost, number) in byhi],
+            _rangenode(below),
+            _rangenode(above))
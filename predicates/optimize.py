@@ -0,0 +1,337 @@
+"""
+Algebraic optimizer for predicate trees.
+
+:func:`_optimize` rewrites a tree of `predicate nodes` into an
+equivalent tree which makes fewer calls per evaluation. It assumes
+(as the rest of the library does) that predicates are free of side
+effects: rewrites may skip calls that the original tree would have
+made.
+"""
+
+from functools import partial
+from operator import eq
+
+from predicates import (
+    Predicate,
+    _And,
+    _Or,
+    _Not,
+    _Args,
+    _ArgsPlan,
+    _IsA,
+    _Is,
+    _In,
+    _IsIn,
+    _Arity,
+    _in,
+    _fused,
+    _fusedarity,
+    _reflexive,
+    _zip,
+    true_,
+    false_,
+    )
+
+def _optimize (predicate):
+    """
+    Returns a predicate equivalent to ``predicate`` which does no more
+    (and, usually, less) work per call. It:
+
+    * flattens nested composites: ``_and(_and(a, b), c)`` becomes
+      ``_and(a, b, c)``, as does ``_or(_or(a, b), c)``, and
+      ``_not(_or(a, b), c)`` becomes ``_not(a, b, c)``.
+
+    * folds constants (i.e., :func:`_return`, including :func:`true_`
+      and :func:`false_`): ``_and(a, true_)`` becomes ``a``, and
+      ``_and(a, false_)`` becomes ``false_``.
+
+    * removes duplicate children: ``_or(a, b, a)`` becomes ``_or(a,
+      b)``.
+
+    * fuses the :func:`_isa` children of an :func:`_or` (or a
+      :func:`_not`) into a single :func:`_isa`, in the place of the
+      first: ``_or(isint, a, isfloat)`` becomes ``_or(_isa((int,
+      float)), a)``.
+
+    * fuses the :func:`_is` children of an :func:`_or` (or a
+      :func:`_not`) into a single identity :func:`_in`, and its
+      ``partial(eq, val)`` children into a single :func:`_in`, each in
+      the place of the first, if there are at least four of them:
+      ``_or(_is(a), b, _is(c), _is(d), _is(e))`` becomes
+      ``_or(_in((a, c, d, e), identity=True), b)``.
+
+    * fuses the argument-structure children of an :func:`_and`
+      (:func:`_npos`, :func:`_nkw`, :func:`_nargs`, :func:`_inkw`, and
+      :func:`_arity`) into a single :func:`_arity`, in the place of the
+      first.
+
+    * pushes :func:`_not` down with De Morgan's laws, wherever doing so
+      saves calls: ``_not(_not(a))`` becomes ``a``, and
+      ``_not(_and(_not(a), _not(b)))`` becomes ``_or(a, b)``.
+
+    It optimizes the children of the :ref:`predicate_application`
+    nodes (and :func:`_args`), too. Since the composites always return
+    a :func:`bool`, a composite with a single child only collapses into
+    that child when the child is a node known to return a
+    :func:`bool`, too.
+
+    It leaves :func:`~predicates.adaptive._adaptive` composites (and
+    their children) as they are, since rebuilding them would throw away
+    the order they've learned.
+
+    If there's nothing to optimize, ``predicate`` is returned
+    unchanged.
+    """
+    return _optimized(predicate, {})
+
+# the plain composites, by op (anything else with one of their ops,
+# e.g., an adaptive composite, is left alone)
+_plain = {
+    '_and': _And,
+    '_or':  _Or,
+    '_not': _Not,
+    }
+
+def _isplain (pred, op):
+    """
+    `True` if ``pred`` is a plain ``op`` composite.
+    """
+    return isinstance(pred, _plain[op])
+
+def _optimized (pred, memo):
+    """
+    Returns the optimized form of ``pred``, reusing the result for
+    subtrees shared within the tree.
+    """
+    # keep `pred` alive in the memo, so its `id` isn't reused
+    if id(pred) not in memo:
+        memo[id(pred)] = (pred, _rewritten(pred, memo))
+    return memo[id(pred)][1]
+
+def _rewritten (pred, memo):
+    if not isinstance(pred, Predicate):
+        return pred
+
+    if pred.op in _plain and not _isplain(pred, pred.op):
+        return pred
+
+    children = [_optimized(child, memo) for child in pred.children]
+    if pred.op in _plain:
+        rewritten = _composite(pred.op, children)
+        return pred if rewritten == pred else rewritten
+
+    if all(new is old for (new, old) in zip(children, pred.children)):
+        return pred
+    return _rebuilt(pred, children)
+
+def _rebuilt (pred, children):
+    """
+    Returns a copy of the (non-composite) node ``pred`` with new
+    ``children``.
+    """
+    if pred.op == '_zip':
+        return _zip(*children)
+
+    if isinstance(pred, _ArgsPlan):
+        return _ArgsPlan(zip(pred.params, children))
+
+    if pred.op == '_args':
+        pos_predicate = None
+        if pred.predicate is not None:
+            pos_predicate, children = children[0], children[1:]
+        kws = [kw for (kw, kw_predicate) in pred.kw_predicates]
+        return _Args(pred.key, pos_predicate, dict(zip(kws, children)))
+
+    if pred.op in ('_all', '_any', '_none', '_apply'):
+        return pred.__class__(children[0])
+
+    if pred.op in ('_each', '_some', '_noneof'):
+        return pred.__class__(children[0], pred.chunksize)
+
+    if pred.op == '_memo':
+        return pred.__class__(children[0], pred.maxsize, pred.ttl)
+
+    if pred.op == '_weakmemo':
+        return pred.__class__(children[0], pred.version)
+
+    return pred
+
+def _composite (op, children):
+    """
+    Returns the cheapest equivalent of the ``op`` composite (one of
+    ``'_and'``, ``'_or'``, or ``'_not'``) of the (already optimized)
+    ``children``.
+    """
+    # `_not(a, b)` is `not (a or b)`, so it flattens, and folds
+    # constants, just like an `_or`.
+    nested = '_and' if op == '_and' else '_or'
+
+    # the constant which decides the composite, if present (a
+    # truthy constant decides an `_or`, and a falsey constant decides
+    # an `_and`)
+    decisive = op != '_and'
+
+    flat = []
+    seen = set()
+    for child in _flattened(children, nested):
+        if _isconstant(child):
+            if bool(child.val) == decisive:
+                return false_ if op != '_or' else true_
+            continue
+
+        try:
+            if child in seen:
+                continue
+            seen.add(child)
+        except TypeError:
+            pass
+        flat.append(child)
+
+    if not flat:
+        return false_ if op == '_or' else true_
+
+    if op != '_and':
+        flat = _infused(_isafused(flat))
+    else:
+        flat = _arityfused(flat)
+
+    if op == '_not':
+        if len(flat) == 1:
+            return _negation(flat[0])
+        return min([_Not(tuple(flat)),
+                    _composite('_and', [_negation(child) for child in flat])],
+                   key=_cost)
+
+    if len(flat) == 1 and _isbool(flat[0]):
+        return flat[0]
+
+    return (_And if op == '_and' else _Or)(tuple(flat))
+
+def _isafused (children):
+    """
+    Returns ``children`` with all of its :func:`_isa` predicates fused
+    into one, in place of the first.
+    """
+    isas = [child for child in children if isinstance(child, _IsA)]
+    if len(isas) < 2:
+        return children
+
+    fused = _fused(isas)
+    return [fused if child is isas[0] else child
+            for child in children
+            if child is isas[0] or not isinstance(child, _IsA)]
+
+# the fewest identity (or equality) tests which :func:`_infused` fuses
+# (below that, it's about as fast to try each in turn)
+_wide = 4
+
+def _infused (children):
+    """
+    Returns ``children`` with all of its identity tests (:func:`_is`,
+    and identity :func:`_in`) fused into one :func:`_in`, and all of its
+    equality tests (``partial(eq, val)``, and :func:`_in`) into another,
+    each in place of the first, if there are at least :data:`_wide` of
+    them (counting the values of each :func:`_in`).
+    """
+    for identity in (True, False):
+        tests = [child for child in children
+                 if _invalues(child, identity) is not None]
+        if (len(tests) < 2 or
+            sum(len(_invalues(test, identity)) for test in tests) < _wide):
+            continue
+
+        fused = _in([val for test in tests
+                     for val in _invalues(test, identity)], identity)
+        children = [fused if child is tests[0] else child
+                    for child in children
+                    if child is tests[0] or
+                    _invalues(child, identity) is None]
+    return children
+
+def _invalues (pred, identity):
+    """
+    Returns the values which ``pred`` tests its argument for (identity
+    with, if `identity` is true, or else equality to), if it's such a
+    test, or :data:`None`.
+    """
+    if identity:
+        if isinstance(pred, _Is):
+            return (pred.it,)
+        if isinstance(pred, _IsIn):
+            return pred.values
+        return None
+
+    if isinstance(pred, _In):
+        return pred.values
+    # (a value which isn't equal to itself, like NaN, stays a partial:
+    # membership of an :func:`_in` would find it by identity)
+    if (isinstance(pred, partial) and pred.func is eq and
+        len(pred.args) == 1 and not pred.keywords and
+        _reflexive(pred.args[0])):
+        return pred.args
+    return None
+
+def _arityfused (children):
+    """
+    Returns ``children`` with all of its :func:`_arity` predicates
+    fused into one, in place of the first.
+    """
+    arities = [child for child in children if isinstance(child, _Arity)]
+    if len(arities) < 2:
+        return children
+
+    fused = _fusedarity(arities)
+    return [fused if child is arities[0] else child
+            for child in children
+            if child is arities[0] or not isinstance(child, _Arity)]
+
+def _flattened (children, op):
+    for child in children:
+        if _isplain(child, op):
+            for grandchild in child.children:
+                yield grandchild
+        else:
+            yield child
+
+def _negation (pred):
+    """
+    Returns the cheapest equivalent of ``_not(pred)``.
+    """
+    if _isconstant(pred):
+        return false_ if pred.val else true_
+
+    # not (not (a or b)) is (a or b)
+    if _isplain(pred, '_not'):
+        return _composite('_or', list(pred.children))
+
+    candidates = [_Not((pred,))]
+    if _isplain(pred, '_and'):
+        # not (a and b) is (not a) or (not b)
+        candidates.append(
+            _composite('_or', [_negation(child) for child in pred.children]))
+    elif _isplain(pred, '_or'):
+        candidates.append(_composite('_not', list(pred.children)))
+    return min(candidates, key=_cost)
+
+def _isconstant (pred):
+    return isinstance(pred, Predicate) and pred.op == '_return'
+
+def _isbool (pred):
+    """
+    `True` if ``pred`` is a node which always returns a :func:`bool`.
+    """
+    if not isinstance(pred, Predicate):
+        return False
+    if pred.op in ('_memo', '_weakmemo'):
+        # (they return whatever their predicate does)
+        return _isbool(pred.children[0])
+    return (pred.op not in ('_return', '_apply') or
+            _isconstant(pred) and isinstance(pred.val, bool))
+
+def _cost (pred):
+    """
+    The number of calls it takes to (fully) evaluate ``pred``.
+    """
+    if not isinstance(pred, Predicate):
+        return 1
+    return 1 + sum(_cost(child) for child in pred.children)
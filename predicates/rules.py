@@ -0,0 +1,167 @@
+"""
+Rule sets: many predicates, evaluated together against each input.
+
+Rules built from the same checks (the same :func:`~predicates._isa`,
+:func:`~predicates._contains`, or :func:`~predicates._args` leaves,
+or whole composites) would, called one by one, repeat those checks
+once per rule. A :class:`RuleSet` compiles all of its rules into a
+single function which evaluates each distinct subtree at most once per
+input, however many rules share it.
+"""
+
+from predicates import _fast, _frozen
+from predicates.codegen import _compile, _define, _maxdepth, _operators
+
+class RuleSet (object):
+    """
+    A set of ``rules`` (predicates), evaluated against the same
+    arguments at once. Calling it returns an :func:`int` bitmask, in
+    which bit ``i`` is set if ``rules[i]`` is true. E.g.,
+
+    .. code-block:: python
+
+       >>> rules = RuleSet([_and(isstring, isempty),
+       ...                  _and(isstring, _not(isempty)),
+       ...                  isint])
+       >>> rules("bad robot!")
+       2
+       >>> rules.matching("bad robot!")
+       [_and(_isa(basestring), _not(isempty))]
+
+    Within the composites (:func:`~predicates._and`,
+    :func:`~predicates._or`, and :func:`~predicates._not`), any
+    subtree which appears more than once, in one rule or across
+    several (by structural equality; see
+    :class:`~predicates.Predicate`), is evaluated at most once per
+    call, and only if some rule needs it (i.e., the rules
+    short-circuit, just as they do alone). So, in the example above,
+    ``isstring`` and ``isempty`` are each called (at most) once.
+
+    Any other predicate is a leaf. Since, e.g., an
+    :func:`~predicates._all` applies its predicate to different
+    arguments, a shared subtree *within* one is only shared as a
+    part of the whole node.
+
+    ``shared`` holds the distinct subtrees which are shared.
+    """
+    __slots__ = ('rules', 'shared', 'evaluate')
+
+    def __init__ (self, rules):
+        self.rules = tuple(rules)
+        (self.evaluate, self.shared) = _ruleset(self.rules)
+
+    def __len__ (self):
+        return len(self.rules)
+
+    def __iter__ (self):
+        return iter(self.rules)
+
+    def __call__ (self, *args, **kwargs):
+        return self.evaluate(*args, **kwargs)
+
+    def matching (self, *args, **kwargs):
+        """
+        Returns the list of the rules which are true for the given
+        arguments.
+        """
+        mask = self.evaluate(*args, **kwargs)
+        return [rule for (i, rule) in enumerate(self.rules)
+                if mask >> i & 1]
+
+def _stored (results, slot, val):
+    results[slot] = val
+    return val
+
+def _ruleset (rules):
+    """
+    Returns a pair of the generated function which evaluates
+    ``rules`` (returning their bitmask), and the list of their shared
+    subtrees. E.g., for ``[_and(a, b), _or(a, c)]``, it generates:
+
+    .. code-block:: python
+
+       def _ruleset (*args, **kwargs):
+           r = [None]
+           mask = 0
+           if ((r[0] if r[0] is not None else
+                _stored(r, 0, True if p0(*args, **kwargs) else False)) and
+               p1(*args, **kwargs)):
+               mask |= 1
+           if (...):
+               mask |= 2
+           return mask
+    """
+    # count the parents of each distinct subtree (descending into each
+    # only once, so that its own children aren't counted once for
+    # each of its parents)
+    parents = {}
+
+    def count (pred):
+        key = _frozen(pred)
+        parents[key] = parents.get(key, 0) + 1
+        if parents[key] == 1 and getattr(pred, 'op', None) in _operators:
+            for child in pred.children:
+                count(child)
+
+    for rule in rules:
+        count(rule)
+
+    slots = {}
+    shared = []
+    leaves = []
+    names = {}
+
+    def leaf (pred):
+        key = _frozen(pred)
+        if key not in names:
+            names[key] = 'p%d' % len(leaves)
+            # (subtrees too deep to inline are compiled on their own,
+            # and other nodes are called through their fast callables)
+            leaves.append(_compile(pred)
+                          if getattr(pred, 'op', None) in _operators
+                          else _fast(pred))
+        return "%s(*args, **kwargs)" % names[key]
+
+    def expression (pred, depth):
+        op = getattr(pred, 'op', None)
+        if op in _operators and depth <= _maxdepth:
+            joiner, empty = _operators[op]
+            # (a shared subtree nests twice over: once for its slot)
+            depth += 2 if parents[_frozen(pred)] > 1 else 1
+            expr = ("(%s)" % joiner.join(expression(child, depth)
+                                         for child in pred.children)
+                    if pred.children
+                    else empty)
+            if op == '_not':
+                expr = "not %s" % expr
+        else:
+            expr = leaf(pred)
+
+        key = _frozen(pred)
+        if parents[key] < 2:
+            return expr
+
+        if key not in slots:
+            slots[key] = len(shared)
+            shared.append(pred)
+        slot = slots[key]
+        return ("(r[%d] if r[%d] is not None else "
+                "_stored(r, %d, True if %s else False))"
+                % (slot, slot, slot, expr))
+
+    body = ["if %s:\n            mask |= %d" % (expression(rule, 1), 1 << i)
+            for (i, rule) in enumerate(rules)]
+
+    params = ", ".join(['_stored'] + ['p%d' % i
+                                      for i in range(len(leaves))])
+    source = ("def _factory (%s):\n"
+              "    def _ruleset (*args, **kwargs):\n"
+              "        r = [None] * %d\n"
+              "        mask = 0\n"
+              "%s"
+              "        return mask\n"
+              "    return _ruleset\n") % (params, len(shared),
+                                          "".join(" " * 8 + line + "\n"
+                                                  for line in body))
+
+    return (_define('_factory', source, {})(_stored, *leaves), shared)
@@ -0,0 +1,286 @@
+"""
+Predicates over banks of substrings, prefixes, and suffixes.
+
+``_contains('a', 'b', 'c')`` scans its argument once per substring,
+and ``s.startswith(prefixes)`` tries each prefix in turn. These
+factories build, once, an automaton (for substrings) or a trie (for
+prefixes and suffixes) of the whole bank, which checks an argument in a
+single pass over it, however many strings are in the bank.
+"""
+
+from collections import deque
+
+from predicates import (
+    Predicate,
+    _interned,
+    true_,
+    false_,
+    )
+
+# the fewest needles for which :func:`_contains_any` and
+# :func:`_contains_all` build an automaton: for fewer, ``needle in
+# text`` (in C) for each of them is faster than one pass of the
+# automaton (in Python)
+minneedles = 256
+
+def _contains_any (*needles):
+    """
+    Returns a `callable` which returns `True` if *any* of the strings
+    ``needles`` is a substring of its argument.
+
+    The signature of the returned callable is:
+
+    .. function:: fn (text:basestring) -> bool
+
+    If there are at least :data:`minneedles` of them, it scans
+    ``text`` once, with an Aho-Corasick automaton of all of the
+    ``needles``. Fewer (or any non-string argument) are checked as
+    :func:`_contains` would, with ``needle in text`` for each.
+    """
+    if not needles:
+        return false_
+    return _interned(_ContainsAny(needles))
+
+def _contains_all (*needles):
+    """
+    Returns a `callable` which returns `True` if *each* of the strings
+    ``needles`` is a substring of its argument. It's equivalent to
+    :func:`_contains`, but, for a string argument, it scans it just
+    once (see :func:`_contains_any`), stopping as soon as it has found
+    them all.
+    """
+    if not needles:
+        return true_
+    return _interned(_ContainsAll(needles))
+
+def _startswith (*prefixes):
+    """
+    Returns a `callable` which returns `True` if its argument starts
+    with *any* of the strings ``prefixes``, i.e., it's
+    ``text.startswith(prefixes)``, but, rather than trying each prefix
+    in turn, it walks down a trie of them, character by character, for
+    (at most) the length of the longest one. It's false for any
+    argument which isn't a string.
+
+    The signature of the returned callable is:
+
+    .. function:: fn (text:basestring) -> bool
+    """
+    if not prefixes:
+        return false_
+    return _interned(_StartsWith(prefixes))
+
+def _endswith (*suffixes):
+    """
+    Returns a `callable` which returns `True` if its argument ends with
+    *any* of the strings ``suffixes`` (see :func:`_startswith`).
+
+    The signature of the returned callable is:
+
+    .. function:: fn (text:basestring) -> bool
+    """
+    if not suffixes:
+        return false_
+    return _interned(_EndsWith(suffixes))
+
+class _Needles (Predicate):
+    __slots__ = ()
+
+    def __init__ (self, needles):
+        self.needles = needles
+        self.automaton = (_Automaton(needles)
+                          if len(needles) >= minneedles
+                          else None)
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return self.needles
+
+class _ContainsAny (_Needles):
+    __slots__ = ('__doc__', 'needles', 'automaton')
+    op = '_contains_any'
+
+    def __call__ (self, text):
+        if self.automaton is not None and isinstance(text, basestring):
+            return self.automaton.any(text)
+        for needle in self.needles:
+            if needle in text:
+                return True
+        return False
+
+class _ContainsAll (_Needles):
+    __slots__ = ('__doc__', 'needles', 'automaton')
+    op = '_contains_all'
+
+    def __call__ (self, text):
+        if self.automaton is not None and isinstance(text, basestring):
+            return self.automaton.all(text)
+        for needle in self.needles:
+            if needle not in text:
+                return False
+        return True
+
+class _Automaton (object):
+    """
+    An Aho-Corasick automaton of ``needles``: a trie of them, in which
+    each state (a node of the trie) also has a *failure* link, to the
+    state of the longest proper suffix of its string which is also in
+    the trie, and the set of the (numbers of the) needles which end
+    there.
+    """
+    __slots__ = ('goto', 'fail', 'found', 'count')
+
+    def __init__ (self, needles):
+        goto = [{}]
+        found = [set()]
+        for (number, needle) in enumerate(needles):
+            state = 0
+            for ch in needle:
+                if ch not in goto[state]:
+                    goto[state][ch] = len(goto)
+                    goto.append({})
+                    found.append(set())
+                state = goto[state][ch]
+            found[state].add(number)
+
+        # breadth-first, so each state's failure state (which is
+        # shallower) is done first
+        fail = [0] * len(goto)
+        queue = deque(goto[0].itervalues())
+        while queue:
+            state = queue.popleft()
+            for (ch, child) in goto[state].iteritems():
+                queue.append(child)
+                suffix = fail[state]
+                while suffix and ch not in goto[suffix]:
+                    suffix = fail[suffix]
+                if state:
+                    fail[child] = goto[suffix].get(ch, 0)
+                found[child] |= found[fail[child]]
+
+        self.goto = goto
+        self.fail = fail
+        self.found = [frozenset(numbers) for numbers in found]
+        # (repeated needles end at the same state, so they're found
+        # together)
+        self.count = len(needles)
+
+    def any (self, text):
+        """
+        `True` if any of the needles is in ``text``.
+        """
+        (goto, fail, found) = (self.goto, self.fail, self.found)
+        if found[0]:
+            return True
+
+        state = 0
+        for ch in text:
+            while True:
+                child = goto[state].get(ch)
+                if child is not None:
+                    state = child
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if found[state]:
+                return True
+        return False
+
+    def all (self, text):
+        """
+        `True` if each of the needles is in ``text``.
+        """
+        (goto, fail, found) = (self.goto, self.fail, self.found)
+        seen = set(found[0])
+        count = self.count
+        if len(seen) == count:
+            return True
+
+        state = 0
+        for ch in text:
+            while True:
+                child = goto[state].get(ch)
+                if child is not None:
+                    state = child
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if found[state]:
+                seen |= found[state]
+                if len(seen) == count:
+                    return True
+        return False
+
+class _Affixes (Predicate):
+    __slots__ = ()
+
+    def __init__ (self, affixes):
+        self.affixes = affixes
+        self.trie = _trie(self._keys(affixes))
+        self.__doc__ = None
+
+    @property
+    def params (self):
+        return self.affixes
+
+class _StartsWith (_Affixes):
+    __slots__ = ('__doc__', 'affixes', 'trie')
+    op = '_startswith'
+
+    @staticmethod
+    def _keys (affixes):
+        return affixes
+
+    def __call__ (self, text):
+        if not isinstance(text, basestring):
+            return False
+        return _walk(self.trie, text)
+
+class _EndsWith (_Affixes):
+    __slots__ = ('__doc__', 'affixes', 'trie')
+    op = '_endswith'
+
+    @staticmethod
+    def _keys (affixes):
+        return [affix[::-1] for affix in affixes]
+
+    def __call__ (self, text):
+        if not isinstance(text, basestring):
+            return False
+        return _walk(self.trie, reversed(text))
+
+# the key of a trie node which marks the end of a key (it can't clash
+# with the single characters of the rest of the keys)
+_end = ''
+
+def _trie (keys):
+    """
+    Returns a trie of ``keys``: a :class:`dict` of each of their first
+    characters to the trie of the rest of them, in which the key
+    :data:`_end` marks the end of a key.
+    """
+    root = {}
+    for key in keys:
+        node = root
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[_end] = True
+    return root
+
+def _walk (trie, chars):
+    """
+    `True` if some key of ``trie`` is a prefix of ``chars``.
+    """
+    node = trie
+    if _end in node:
+        return True
+    for ch in chars:
+        node = node.get(ch)
+        if node is None:
+            return False
+        if _end in node:
+            return True
+    return False
@@ -0,0 +1,369 @@
+"""
+Optional NumPy backend for predicate trees.
+
+:func:`_vectorize` compiles a predicate tree into a function which
+evaluates it over a whole :class:`~numpy.ndarray` (or a :class:`dict`
+of column arrays) at once, as a handful of ufunc and mask operations,
+and returns a boolean mask. Anything it can't vectorize falls back to
+the scalar predicates, evaluated only where the rest of the tree left
+the answer undecided.
+
+It requires :mod:`numpy`, which is not otherwise a dependency.
+"""
+
+from __future__ import absolute_import
+
+from functools import partial
+from itertools import izip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from predicates import (
+    _ArgsPlan,
+    _In,
+    _evaluated,
+    isstring,
+    lt, le, eq, ne, ge, gt,
+    truth,
+    )
+
+# the array kinds whose elements (as Python objects) are all of a
+# single type, and the kinds which compare as numbers
+_scalar_kinds = 'biufcSU'
+_numeric_kinds = 'biuf'
+
+# the :mod:`operator` comparisons, by the names of their ufuncs
+_comparisons = {
+    lt: 'less',
+    le: 'less_equal',
+    eq: 'equal',
+    ne: 'not_equal',
+    ge: 'greater_equal',
+    gt: 'greater',
+    }
+
+def _vectorize (predicate):
+    """
+    Returns a `callable` which evaluates ``predicate`` over an entire
+    array, returning a boolean :class:`~numpy.ndarray` mask.
+
+    The signature of the returned `callable` is:
+
+    .. function:: fn (data) -> numpy.ndarray
+
+    ``data`` is either a one-dimensional array-like, each element of
+    which is an argument to ``predicate`` (i.e., ``fn(data)[i]`` is
+    ``predicate(data.tolist()[i])``), or a :class:`dict` of equal-length
+    column arrays, each row of which is the *keyword* arguments to
+    ``predicate`` (so, e.g., ``_args(price=_nis(atmost=100))`` checks
+    the ``price`` column). E.g.,
+
+    .. code-block:: python
+
+       >>> fn = _vectorize(_and(isint, _nis(atleast=4, atmost=16)))
+       >>> fn(numpy.array([1, 4, 8, 15, 16, 23, 42]))
+       array([False,  True,  True,  True,  True, False, False])
+
+    It vectorizes the composites (:func:`~predicates._and`,
+    :func:`~predicates._or`, :func:`~predicates._not`), the
+    :ref:`predicate_application` factories, :func:`~predicates._nis`,
+    :func:`~predicates._fnis` of a :class:`~numpy.ufunc`,
+    :func:`~predicates._isa` and :func:`~predicates._is` (which, over
+    an array of numbers, booleans, or strings, are the same for every
+    element), :func:`~predicates._in` (of hashable values, over
+    numeric arrays), :func:`~predicates._return`, and
+    :func:`~functools.partial`\\ s of the :mod:`operator` comparisons
+    (e.g., ``partial(lt, 4)``) over numeric arrays.
+
+    Any other predicate, or array, falls back to the scalar predicate
+    (via :meth:`~predicates.Predicate.evaluate_many`). Within a
+    composite, the children are evaluated in order, each only on the
+    elements which the children before it left undecided (so, as for
+    the scalar tree, a child is never evaluated where an earlier one
+    guards it).
+
+    Raises :exc:`ImportError` if :mod:`numpy` isn't installed.
+    """
+    if numpy is None:
+        raise ImportError("_vectorize requires numpy")
+
+    (plan, vectorized) = _plan(predicate)
+
+    def fn (data):
+        if isinstance(data, dict):
+            data = dict((name, _column(column))
+                        for (name, column) in data.items())
+            lengths = set(len(column) for column in data.values())
+            if len(lengths) > 1:
+                raise ValueError("columns must all have the same length")
+            n = lengths.pop() if lengths else 0
+        else:
+            data = _column(data)
+            n = len(data)
+        return plan(data, n)
+
+    fn.__doc__ = getattr(predicate, '__doc__', None)
+    return fn
+
+def _column (data):
+    column = numpy.asarray(data)
+    if column.ndim != 1:
+        raise ValueError("arrays must be one-dimensional")
+    return column
+
+# A *plan* is a `(fn, vectorized)` pair, where `fn(data, n)` returns a
+# new mask over the `n` rows of `data` (an array, or a dict of column
+# arrays), and `vectorized` is false for scalar fallbacks.
+
+def _plan (pred):
+    op = getattr(pred, 'op', None)
+
+    if op in ('_and', '_or', '_not'):
+        return _composite(op, [_plan(child) for child in pred.children])
+
+    # (over columns, there are no positional arguments to apply these
+    # to, so they're true, or, for an `_any`, false, for every row)
+    if op in ('_all', '_any'):
+        return _positional(_plan(pred.predicate), op == '_all')
+
+    if op == '_none':
+        return _positional(_inverted(_plan(pred.predicate)), True)
+
+    if op == '_zip':
+        # a single argument only meets the first predicate
+        if not pred.children:
+            return _constant(True)
+        return _positional(_plan(pred.children[0]), True)
+
+    if op == '_return':
+        return _constant(bool(pred.val))
+
+    if op == '_args':
+        return _args(pred)
+
+    if op == '_arity':
+        return _arity(pred)
+
+    if op == '_nis':
+        return _elementwise(pred, partial(_between, pred.atleast, pred.atmost))
+
+    if op == '_fnis' and isinstance(pred.func, numpy.ufunc):
+        return _elementwise(pred, partial(_fnis, pred.func,
+                                          pred.nis.atleast, pred.nis.atmost))
+
+    if op == '_isa':
+        return _elementwise(pred, partial(_isa, pred.classinfo))
+
+    if op == '_is':
+        return _elementwise(pred, partial(_is, pred.it))
+
+    if isinstance(pred, _In) and not pred.others:
+        return _elementwise(pred, partial(_in, pred.members))
+
+    if (isinstance(pred, partial) and pred.func in _comparisons and
+        len(pred.args) == 1 and not pred.keywords):
+        return _elementwise(pred, partial(_compare, pred.func, pred.args[0]))
+
+    return (partial(_scalar, pred), False)
+
+def _constant (val):
+    return (lambda data, n: numpy.full(n, val, dtype=bool), True)
+
+def _inverted (plan):
+    (fn, vectorized) = plan
+    return (lambda data, n: ~fn(data, n), vectorized)
+
+def _positional (plan, val):
+    """
+    Returns ``plan`` over an array, and a constant ``val`` mask over
+    columns.
+    """
+    (fn, vectorized) = plan
+
+    def positional (data, n):
+        if isinstance(data, dict):
+            return numpy.full(n, val, dtype=bool)
+        return fn(data, n)
+
+    return (positional, vectorized)
+
+def _composite (op, plans):
+    children = [fn for (fn, vectorized) in plans]
+
+    # a false child decides an `_and`; a true child decides an `_or`
+    # (or a `_not`, which is `not (a or b)`)
+    decides = op != '_and'
+
+    def fn (data, n):
+        # true wherever no child has (yet) decided the composite; each
+        # child only sees those rows, as each scalar child would only
+        # be called if the children before it hadn't decided
+        undecided = numpy.ones(n, dtype=bool)
+        for child in children:
+            rows = numpy.flatnonzero(undecided)
+            if not len(rows):
+                break
+            if len(rows) == n:
+                mask = child(data, n)
+                undecided = ~mask if decides else mask.astype(bool)
+            else:
+                mask = child(_take(data, rows), len(rows))
+                undecided[rows] = ~mask if decides else mask
+
+        return ~undecided if op == '_or' else undecided
+
+    return (fn, all(vectorized for (fn, vectorized) in plans))
+
+def _take (data, rows):
+    if isinstance(data, dict):
+        return dict((name, column[rows]) for (name, column) in data.items())
+    return data[rows]
+
+def _args (pred):
+    """
+    Returns the plan for an :func:`~predicates._args` node. Over an
+    array, its positional predicates (those which select the first
+    argument) apply to the array; over columns, each of its keyword
+    predicates applies to its column. Missing arguments are
+    :data:`None`, as they are for the scalar predicate.
+    """
+    if isinstance(pred, _ArgsPlan):
+        positional = [predicate for (sel, predicate) in pred.selectors
+                      if not isstring(sel) and range(1)[sel]]
+        keywords = pred.keywords
+    else:
+        positional = ([pred.predicate]
+                      if pred.predicate is not None and range(1)[pred.key]
+                      else [])
+        keywords = pred.kw_predicates
+
+    plans = [_keyword(kw, kw_predicate) for (kw, kw_predicate) in keywords]
+    positional = _composite('_and', [_plan(predicate)
+                                     for predicate in positional])
+
+    def fn (data, n):
+        mask = numpy.ones(n, dtype=bool)
+        if not isinstance(data, dict):
+            mask &= positional[0](data, n)
+        for (plan, vectorized) in plans:
+            mask &= plan(data, n)
+        return mask
+
+    return (fn, all(vectorized for (plan, vectorized)
+                    in plans + [positional]))
+
+def _arity (pred):
+    """
+    Returns the plan for an :func:`~predicates._arity` node, which is
+    the same for every row: one positional argument for an array, and
+    one keyword argument per column for columns.
+    """
+    def fn (data, n):
+        if isinstance(data, dict):
+            val = pred(**dict.fromkeys(data))
+        else:
+            val = pred(None)
+        return numpy.full(n, val, dtype=bool)
+
+    return (fn, True)
+
+def _keyword (kw, predicate):
+    (plan, vectorized) = _plan(predicate)
+
+    def fn (data, n):
+        if isinstance(data, dict) and kw in data:
+            return plan(data[kw], n)
+        return numpy.full(n, bool(predicate(None)), dtype=bool)
+
+    return (fn, vectorized)
+
+def _elementwise (pred, kernel):
+    """
+    Returns the plan for the leaf ``pred``, which ``kernel(array)``
+    vectorizes over the arrays it supports (returning :data:`None` for
+    the rest).
+    """
+    def fn (data, n):
+        if not isinstance(data, dict):
+            mask = kernel(data)
+            if mask is not None:
+                return mask
+        return _scalar(pred, data, n)
+
+    return (fn, True)
+
+def _scalar (pred, data, n):
+    """
+    Returns the mask of the scalar predicate ``pred`` over ``data``.
+    """
+    if isinstance(data, dict):
+        names = list(data)
+        rows = izip(*[data[name].tolist() for name in names])
+        flags = bytearray(truth(pred(**dict(izip(names, row))))
+                          for row in rows)
+    else:
+        flags = _evaluated(pred, data.tolist())
+    return numpy.frombuffer(flags, dtype=numpy.bool_)
+
+def _element (dtype):
+    """
+    Returns the type of the elements of an array of ``dtype`` as
+    Python objects (i.e., the elements of its :meth:`tolist`), or
+    :data:`None` if they may be of mixed types.
+    """
+    if dtype.kind not in _scalar_kinds:
+        return None
+    return type(numpy.zeros(1, dtype=dtype).tolist()[0])
+
+def _between (atleast, atmost, a):
+    if a.dtype.kind not in _numeric_kinds:
+        return None
+    # NaNs compare false, as they do for the scalar predicate
+    with numpy.errstate(invalid='ignore'):
+        mask = a >= atleast
+        if atmost != float('inf'):
+            mask &= a <= atmost
+    return mask
+
+def _fnis (func, atleast, atmost, a):
+    # (the ufunc may not even apply to, e.g., strings, which the scalar
+    # predicate is left to deal with)
+    if a.dtype.kind not in _numeric_kinds:
+        return None
+    return _between(atleast, atmost, func(a))
+
+def _isa (classinfo, a):
+    element = _element(a.dtype)
+    if element is None:
+        return None
+    return numpy.full(len(a), issubclass(element, classinfo), dtype=bool)
+
+def _is (it, a):
+    if a.dtype.kind == 'b' and isinstance(it, bool):
+        return a.copy() if it else ~a
+
+    # no element can be `it` if it's not even the same type (but,
+    # e.g., small ints are shared, so the same type may be `it`)
+    element = _element(a.dtype)
+    if element is None or type(it) is element:
+        return None
+    return numpy.zeros(len(a), dtype=bool)
+
+def _in (members, a):
+    if a.dtype.kind not in _numeric_kinds:
+        return None
+    # (only numbers can equal the elements of a numeric array)
+    numbers = [val for val in members
+               if isinstance(val, (bool, int, long, float))]
+    return numpy.in1d(a, numbers)
+
+def _compare (op, val, a):
+    if (a.dtype.kind not in _numeric_kinds or
+        not isinstance(val, (bool, int, long, float))):
+        return None
+    # `partial(lt, val)(x)` is `val < x`
+    with numpy.errstate(invalid='ignore'):
+        return getattr(numpy, _comparisons[op])(val, a)
@@ -17,6 +17,9 @@ requirements = {
             'xtraceback>=0.3.3',
             'pygments',
             ],
+        'numpy': [
+            'numpy',
+            ],
         },
     }
 
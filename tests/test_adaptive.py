@@ -0,0 +1,293 @@
+from predicates import *
+
+from predicates import (
+    _and,
+    _or,
+    _not,
+    _all,
+
+    _npos,
+    _args,
+
+    _optimize,
+    _adaptive,
+    Profile,
+    )
+
+from functools import partial
+from operator import eq
+
+import os
+import sys
+import tempfile
+import threading
+
+
+# test helpers
+def counted (result):
+    """
+    Returns a predicate which always returns ``result``, and counts
+    its calls.
+    """
+    def pred (*args, **kwargs):
+        pred.calls += 1
+        return result
+    pred.calls = 0
+    return pred
+
+def slow (*args, **kwargs):
+    sum(range(2000))
+    return False
+
+def fast (*args, **kwargs):
+    return False
+
+# profiles tell predicates apart by name, so they can't tell
+# `counted` predicates apart
+def usually (*args, **kwargs):
+    return True
+
+def rarely (*args, **kwargs):
+    return False
+
+
+class TestAdaptive (object):
+    def test_bad_spec (self):
+        for (sample, period) in ((0, 1), (1, 0)):
+            try:
+                _adaptive(_and(isint), sample, period)
+            except ValueError:
+                pass
+            else:
+                assert False, "should have raised ValueError"
+
+    def test_equivalent (self):
+        tree = _and(_or(isint, isstring, isnone), _not(isbool, isempty))
+        adaptive = _adaptive(tree, sample=3, period=2)
+        for val in ('', "bad robot!", (), 0, 42, True, None, 4.8) * 10:
+            assert adaptive(val) is tree(val)
+
+    def test_structure (self):
+        tree = _and(isint, _all(_or(isnone, isstring)))
+        adaptive = _adaptive(tree)
+        assert adaptive.op == '_and'
+        assert adaptive.children[1].op == '_all'
+        assert adaptive.children[1].children[0].op == '_or'
+        assert adaptive.children[1].children[0] is not tree.children[1].children[0]
+
+        assert _adaptive(isint) is isint
+        assert _adaptive(tree) == _adaptive(tree)
+
+        shared = _or(isnone, isstring)
+        adaptive = _adaptive(_and(shared, _not(shared)))
+        assert adaptive.children[0] is adaptive.children[1].children[0]
+
+    def test_reorder_selectivity (self):
+        usually, rarely = counted(True), counted(False)
+        adaptive = _adaptive(_and(usually, rarely), sample=1, period=10)
+        assert adaptive.children == (usually, rarely)
+
+        for i in range(10):
+            assert not adaptive(i)
+        assert adaptive.children == (rarely, usually)
+
+        # once reordered, `usually` is short-circuited past, except
+        # when sampled
+        adaptive = _adaptive(_and(usually, rarely), sample=10, period=1)
+        for i in range(10):
+            adaptive(i)
+        usually.calls = 0
+        for i in range(100):
+            adaptive(i)
+        assert usually.calls == 10
+
+    def test_reorder_cost (self):
+        adaptive = _adaptive(_or(slow, fast), sample=1, period=20)
+        for i in range(20):
+            assert not adaptive(i)
+        assert adaptive.children == (fast, slow)
+
+    def test_reorder_or (self):
+        rarely, usually = counted(False), counted(True)
+        adaptive = _adaptive(_not(rarely, usually), sample=1, period=10)
+        for i in range(10):
+            assert not adaptive(i)
+        assert adaptive.children == (usually, rarely)
+
+    def test_statistics (self):
+        usually, rarely = counted(True), counted(False)
+        adaptive = _adaptive(_and(usually, rarely), sample=2, period=100)
+        for i in range(10):
+            adaptive(i)
+
+        stats = adaptive.statistics()
+        assert [pred for (pred, samples, cost, decisive) in stats] == [usually, rarely]
+        assert [samples for (pred, samples, cost, decisive) in stats] == [5, 5]
+        assert [decisive for (pred, samples, cost, decisive) in stats] == [0, 5]
+        assert all(cost >= 0 for (pred, samples, cost, decisive) in stats)
+
+    def test_threads (self):
+        # concurrent callers can push the countdown past zero, and the
+        # composite must go on sampling (and so, learning) regardless
+        usually, rarely = counted(True), counted(False)
+        adaptive = _adaptive(_and(usually, rarely), sample=10, period=10)
+
+        def call ():
+            for i in range(20000):
+                adaptive(i)
+
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=call) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+        assert 0 < adaptive.countdown <= 10
+        assert adaptive.children == (rarely, usually)
+
+        adaptive.countdown = -5
+        rarely.calls = usually.calls = 0
+        adaptive(4)
+        assert (rarely.calls, usually.calls) == (1, 1)
+        assert adaptive.countdown == 10
+
+    def test_guarded (self):
+        # `startsa` depends on `isstring` guarding it
+        startsa = lambda s: s.startswith('a')
+        tree = _and(isstring, startsa)
+        adaptive = _adaptive(tree, sample=10, period=1)
+        for val in range(100):
+            assert adaptive(val) is tree(val)
+        assert adaptive.children == (isstring, startsa)
+        assert adaptive.raised == [False, True]
+
+    def test_guarded_reordered (self):
+        # learned on strings alone, `startsa` goes first, until it
+        # raises
+        startsa = lambda s: s.startswith('a')
+        tree = _and(isstring, startsa)
+        adaptive = _adaptive(tree, sample=1, period=10)
+        for i in range(10):
+            assert not adaptive("bad robot!")
+        assert adaptive.children == (startsa, isstring)
+
+        adaptive.countdown = 100
+        assert adaptive(4) is False
+        assert adaptive.children == (isstring, startsa)
+
+        # the learned order never puts it ahead again
+        adaptive.countdown = 1
+        for i in range(20):
+            assert not adaptive("bad robot!")
+        assert adaptive.children == (isstring, startsa)
+
+    def test_guarded_or (self):
+        tree = _or(isnone, _not(isstring), lambda s: s.startswith('a'))
+        adaptive = _adaptive(tree, sample=1, period=5)
+        for val in [None, 4, "apple", "bad robot!"] * 10:
+            assert adaptive(val) is tree(val)
+
+    def test_optimized (self):
+        # the optimizer leaves adaptive composites, and the order
+        # they've learned, alone (rather than rebuilding them as plain
+        # composites)...
+        adaptive = _adaptive(_and(slow, fast), sample=1, period=10)
+        for i in range(10):
+            adaptive(42)
+        assert adaptive.children == (fast, slow)
+
+        assert _optimize(adaptive) is adaptive
+        assert _optimize(_and(isint, adaptive)).children == (isint, adaptive)
+        nested = _adaptive(_or(isnone, isstring))
+        assert _optimize(_or(isint, nested)).children == (isint, nested)
+        assert _optimize(_not(nested)).children == (nested,)
+
+        # ...and so does :func:`validate` (which optimizes its predicate)
+        adaptive = _adaptive(_and(_npos(exactly=1), _args(isint)),
+                             sample=1, period=100)
+        guarded = validate(adaptive)(lambda n: n)
+        for i in range(10):
+            assert guarded(i) == i
+        assert adaptive.samples == 10
+
+
+class TestProfile (object):
+    def trained (self, *preds):
+        adaptive = _adaptive(_and(*preds), sample=1, period=10)
+        for i in range(10):
+            adaptive(i)
+        return adaptive
+
+    def test_apply (self):
+        profile = Profile()
+        profile.record(self.trained(usually, rarely))
+
+        # a structurally equal tree, in either order
+        assert profile.apply(_and(usually, rarely)).children == (rarely, usually)
+        assert profile.apply(_and(rarely, usually)).children == (rarely, usually)
+
+    def test_nested (self):
+        profile = Profile()
+        profile.record(_all(self.trained(usually, rarely)))
+
+        applied = profile.apply(_or(isnone, _all(_and(usually, rarely))))
+        assert applied == _or(isnone, _all(_and(rarely, usually)))
+
+    def test_unknown (self):
+        profile = Profile()
+        profile.record(self.trained(usually, rarely))
+
+        # composites without statistics (including those which have
+        # gained or lost children) keep their order
+        tree = _and(usually, isint, rarely)
+        assert profile.apply(tree) == tree
+        tree = _or(usually, rarely)
+        assert profile.apply(tree) == tree
+
+    def test_persistence (self):
+        profile = Profile()
+        profile.record(self.trained(usually, rarely))
+        profile.record(self.trained(usually, rarely))
+
+        (fd, path) = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            profile.save(path)
+            loaded = Profile.load(path)
+        finally:
+            os.remove(path)
+
+        assert loaded.composites == profile.composites
+        assert loaded.apply(_and(usually, rarely)).children == (rarely, usually)
+
+    def test_guarded (self):
+        startsa = lambda s: s.startswith('a')
+        adaptive = _adaptive(_and(isstring, startsa), sample=1, period=10)
+        for val in ["bad robot!"] * 9 + [4]:
+            adaptive(val)
+        profile = Profile()
+        profile.record(adaptive)
+        assert profile.apply(_and(isstring, startsa)).children == (isstring, startsa)
+
+    def test_partials (self):
+        # partials are told apart by their functions and arguments
+        (iseight, isfour) = (partial(eq, 8), partial(eq, 4))
+        adaptive = _adaptive(_or(iseight, isfour), sample=1, period=10)
+        for i in range(10):
+            adaptive(4)
+        profile = Profile()
+        profile.record(adaptive)
+        assert len(profile.composites.values()[0]) == 2
+        assert profile.apply(_or(iseight, isfour)).children == (isfour, iseight)
+
+    def test_adaptive (self):
+        profile = Profile()
+        profile.record(self.trained(usually, rarely))
+
+        adaptive = _adaptive(_and(usually, rarely), profile=profile)
+        assert adaptive.children == (rarely, usually)
+        assert not adaptive(42)
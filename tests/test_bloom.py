@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import raises
+
+from predicates import *
+
+from predicates import (
+    _inbloom,
+
+    BloomFilter,
+    SortedFile,
+    )
+
+
+keys = ['jack', 'kate', 'sawyer', 'hurley', 'locke', 'sayid', u'j\xfcrgen',
+        '', 'bad robot!']
+others = ['ben', 'desmond', 'juliet', 'jac', 'jackk', 'z', u'jurgen', 4,
+          None]
+
+
+class TestBloomFilter (object):
+    def setup (self):
+        self.dir = tempfile.mkdtemp()
+
+    def teardown (self):
+        shutil.rmtree(self.dir)
+
+    def path (self, name, lines=None):
+        path = os.path.join(self.dir, name)
+        if lines is not None:
+            with open(path, 'wb') as out:
+                out.writelines(line + '\n' for line in lines)
+        return path
+
+    def test_members (self):
+        bloom = BloomFilter(len(keys), error_rate=0.001)
+        bloom.update(keys)
+        assert len(bloom) == len(keys)
+        for key in keys:
+            assert key in bloom
+        assert 4 not in bloom
+        assert None not in bloom
+
+    def test_error_rate (self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        bloom.update(str(i) for i in range(1000))
+        assert all(str(i) in bloom for i in range(1000))
+
+        mistakes = sum(1 for i in range(1000, 11000) if str(i) in bloom)
+        assert mistakes < 300
+
+    @raises(ValueError)
+    def test_bad_error_rate (self):
+        BloomFilter(1000, error_rate=1)
+
+    def test_fromfile (self):
+        lines = [key.encode('utf-8') for key in keys]
+        bloom = BloomFilter.fromfile(self.path('keys', lines))
+        assert len(bloom) == len(keys)
+        for key in keys:
+            assert key in bloom
+
+    def test_save_load (self):
+        bloom = BloomFilter(len(keys))
+        bloom.update(keys)
+        path = self.path('bloom')
+        bloom.save(path)
+
+        loaded = BloomFilter.load(path)
+        assert (loaded.nbits, loaded.nhashes, len(loaded)) == \
+            (bloom.nbits, bloom.nhashes, len(bloom))
+        for key in keys + others:
+            assert (key in loaded) == (key in bloom)
+
+    @raises(ValueError)
+    def test_load_not_bloom (self):
+        BloomFilter.load(self.path('keys', keys[:4]))
+
+    def test_sorted_file (self):
+        lines = sorted(key.encode('utf-8') for key in keys)
+        exact = SortedFile(self.path('sorted', lines))
+        for key in keys:
+            assert key in exact
+        for key in others:
+            assert key not in exact
+
+    def test_sorted_file_empty (self):
+        exact = SortedFile(self.path('empty', []))
+        assert 'jack' not in exact
+
+    def test_sorted_file_many (self):
+        lines = sorted('%d' % i for i in range(0, 2000, 2))
+        exact = SortedFile(self.path('sorted', lines))
+        assert all(str(i) in exact for i in range(0, 2000, 2))
+        assert not any(str(i) in exact for i in range(1, 2000, 2))
+
+    def test_inbloom (self):
+        bloom = BloomFilter(len(keys))
+        bloom.update(keys)
+        lines = sorted(key.encode('utf-8') for key in keys)
+        fn = _inbloom(bloom, SortedFile(self.path('sorted', lines)))
+        assert fn.op == '_inbloom'
+        for key in keys:
+            assert fn(key)
+        for key in others:
+            assert not fn(key)
+
+    def test_inbloom_approximate (self):
+        bloom = BloomFilter(len(keys))
+        bloom.update(keys)
+        fn = _inbloom(bloom)
+        assert all(fn(key) for key in keys)
+        assert not fn(4)
+
+    def test_inbloom_exact_only_for_candidates (self):
+        class Exact (object):
+            checked = []
+            def __contains__ (self, key):
+                self.checked.append(key)
+                return key in keys
+
+        bloom = BloomFilter(len(keys), error_rate=0.0001)
+        bloom.update(keys)
+        fn = _inbloom(bloom, Exact())
+        assert fn('jack')
+        assert not fn('desmond')
+        assert Exact.checked == ['jack']
@@ -0,0 +1,179 @@
+from predicates import *
+
+from predicates import (
+    _and,
+    _or,
+    _not,
+    _all,
+    _args,
+
+    _compile,
+    )
+
+
+# test helpers
+def fail (*args, **kwargs):
+    raise Exception("should've short-circuited past this")
+
+def true (*args, **kwargs):
+    return True
+
+def false (*args, **kwargs):
+    return False
+
+class Thing (object):
+    pass
+
+
+class TestCompile (object):
+    def test_leaf (self):
+        assert _compile(isstring) is isstring
+        assert _compile(_all(isstring))('jack', 'kate')
+
+    def test_empty (self):
+        assert _compile(_and())(True)
+        assert not _compile(_or())(True)
+        assert _compile(_not())(True)
+
+    def test_and (self):
+        assert _compile(_and(isstring, isempty))('')
+        assert not _compile(_and(isstring, isempty))("bad robot!")
+        assert not _compile(_and(isstring, isempty))(())
+
+    def test_or (self):
+        assert _compile(_or(isempty, not_))(0)
+        assert _compile(_or(isfalse, isstring))('')
+        assert not _compile(_or(isfalse, isstring))(True)
+
+    def test_not (self):
+        assert _compile(_not(isfalse, isstring))(True)
+        assert not _compile(_not(isempty, isfalse))('')
+
+    def test_composition (self):
+        fn = _compile(_and(_not(isstring), _or(isempty, isatom)))
+        assert not fn('')
+        assert fn(())
+        assert fn(42)
+        assert not fn((42,))
+
+    def test_matches_tree (self):
+        tree = _or(_and(isstring, _not(isempty)),
+                   _and(isnsiterable, _or(isempty, _not(isseq))),
+                   _not(_or(isint, isstring, isnsiterable)))
+        fn = _compile(tree)
+        for val in ('', "bad robot!", (), (4, 8), {}, {'jack': 4},
+                    42, 4.8, None, Thing):
+            assert fn(val) is tree(val)
+
+    def test_returns_bool (self):
+        assert _compile(_and(truth))(42) is True
+        assert _compile(_or(truth))(0) is False
+        assert _compile(_and(truth, truth))("bad robot!") is True
+
+    def test_shared_leaves (self):
+        fn = _compile(_and(_or(isint, isstring), _or(isstring, isfloat)))
+        assert fn('jack')
+        assert not fn(42)
+        assert not fn(4.8)
+
+    def test_args_and_kwargs (self):
+        fn = _compile(_and(_all(isstring), lambda *args, **kwargs: 'kate' in kwargs))
+        assert fn('jack', 'sawyer', kate=15)
+        assert not fn('jack', 'sawyer')
+        assert not fn('jack', 4, kate=15)
+
+    def test_short_circuit (self):
+        assert not _compile(_and(false, fail))()
+        assert _compile(_or(true, fail))()
+        assert not _compile(_not(true, fail))()
+        assert not _compile(_and(_or(false, _and(false, fail)), fail))()
+
+    def test_docstring (self):
+        tree = _and(isstring, isempty)
+        assert _compile(tree).__doc__ == tree.__doc__
+
+    def test_deep (self):
+        # deeper than the parser can nest parentheses
+        tree = isint
+        for i in range(150):
+            tree = (_not(tree) if i % 3 == 0
+                    else _and(isnsiterable, tree) if i % 3 == 1
+                    else _or(isnone, tree))
+        fn = _compile(tree)
+        for val in ('', (), 42, None, 4.8):
+            assert fn(val) is tree(val)
+
+
+class TestArgsValidator (object):
+    calls = [
+        (), (4,), ('jack',), ('jack', 'kate'), ('jack', 4), (4, 'jack'),
+        ('jack', 'kate', 'sawyer', 'hurley', 4),
+        tuple('jack' for i in range(12)) + (4,),
+        ]
+
+    def slow (self, key, pos_predicate, kw_predicates):
+        # the original, interpreted `_args` semantics
+        def check (*args, **kwargs):
+            if pos_predicate is not None:
+                for arg in args[key]:
+                    if not pos_predicate(arg):
+                        return False
+            for (kw, pred) in kw_predicates.items():
+                if not pred(kwargs.get(kw)):
+                    return False
+            return True
+        return check
+
+    def test_equivalent (self):
+        keys = (slice(None), slice(0, 1), slice(0, 2), slice(1, 3),
+                slice(2, None), slice(0, 12), slice(-1, None),
+                slice(-3, -1), slice(None, None, 2), slice(3, 1))
+        kwargs = ({}, {'jack': 'kate'}, {'jack': 4}, {'kate': 4},
+                  {'jack': 'kate', 'kate': 4})
+        for key in keys:
+            for (pos, kws) in ((isstring, {}),
+                               (None, {'jack': isstring}),
+                               (isstring, {'jack': isstring, 'kate': isint})):
+                fast = _args[key](pos, **kws)
+                slow = self.slow(key, pos, kws)
+                for args in self.calls:
+                    for kw in kwargs:
+                        assert fast(*args, **kw) == slow(*args, **kw), \
+                            (key, pos, kws, args, kw)
+
+    def test_shapes (self):
+        # nodes of the same shape share a (generated) class
+        assert _args[0:2](isstring).__class__ is _args[0:2](isint).__class__
+        assert _args[0:2](isstring).__class__ is not _args[0:3](isstring).__class__
+        assert (_args(jack=isint).__class__ is not
+                _args(kate=isint).__class__)
+        from predicates import _Args
+        assert isinstance(_args[0](isint), _Args)
+        assert _args[0](isint).op == '_args'
+
+    def test_maxargshapes (self):
+        # once there's no room for new shapes, nodes share a generic
+        # class, which still behaves the same
+        import predicates
+        (maxargshapes, predicates.maxargshapes) = (predicates.maxargshapes,
+                                                   len(predicates._argshapes))
+        try:
+            count = len(predicates._argshapes)
+            fn = _args[4:9:2](isstring, sawyer=isint, hurley=isstring)
+            assert fn.__class__ is predicates._GenericArgs
+            assert _args[5:9:2](isstring).__class__ is fn.__class__
+            assert len(predicates._argshapes) == count
+            assert fn == _args[4:9:2](isstring, sawyer=isint, hurley=isstring)
+
+            for (key, pos, kws) in ((slice(0, 2, 1), isstring, {}),
+                                    (slice(None), None, {'locke': isstring}),
+                                    (slice(1, None), isstring,
+                                     {'locke': isstring, 'ben': isint})):
+                generic = _args[key](pos, **kws)
+                assert generic.__class__ is predicates._GenericArgs
+                slow = self.slow(key, pos, kws)
+                for args in self.calls:
+                    for kw in ({}, {'locke': 'ben'}, {'ben': 4}):
+                        assert generic(*args, **kw) == slow(*args, **kw)
+        finally:
+            predicates.maxargshapes = maxargshapes
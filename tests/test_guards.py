@@ -0,0 +1,242 @@
+import sys
+import threading
+
+from predicates import *
+
+from predicates import (
+    _and,
+    _args,
+    _npos,
+    _nkw,
+    _inkw,
+    _arity,
+    )
+
+from nose.tools import raises
+
+import predicates.guards
+from predicates.guards import maxevery
+
+
+# test helpers
+def add (a, b, **kwargs):
+    """Adds `a` and `b`."""
+    return a + b
+
+
+class TestValidate (object):
+    def test_valid (self):
+        guarded = validate(_and(_npos(exactly=2), _args(isint)))(add)
+        assert guarded(4, 8) == 12
+
+    @raises(TypeError)
+    def test_invalid_value (self):
+        validate(_and(_npos(exactly=2), _args(isint)))(add)(4, '8')
+
+    @raises(TypeError)
+    def test_invalid_shape (self):
+        validate(_and(_npos(exactly=2), _args(isint)))(add)(4, 8, 15)
+
+    @raises(TypeError)
+    def test_invalid_keywords (self):
+        validate(_inkw(atmost=['jack']))(add)(4, 8, kate=15)
+
+    def test_wrapper (self):
+        pred = _args(isint)
+        guarded = validate(pred)(add)
+        assert guarded.__name__ == 'add'
+        assert guarded.__doc__ == add.__doc__
+        assert guarded.__wrapped__ is add
+        assert guarded.predicate is pred
+
+    def test_disabled (self):
+        try:
+            predicates.guards.enabled = False
+            assert validate(_args(isint))(add) is add
+        finally:
+            predicates.guards.enabled = __debug__
+
+    def test_shape_cache (self):
+        guarded = validate(_and(_npos(exactly=2), _args(isint)))(add)
+        for i in range(3):
+            guarded(4, 8)
+            guarded(4, 8, jack=15)
+        assert guarded.verdicts == {2: True, (2, frozenset(['jack'])): True}
+
+        # without any argument-structure checks, there's nothing to cache
+        guarded = validate(_args(isint))(add)
+        guarded(4, 8)
+        assert guarded.verdicts == {}
+
+    def test_shape_verdicts (self):
+        guarded = validate(_and(_npos(exactly=2),
+                                _inkw(atmost=['jack', 'kate'])))(add)
+        for i in range(3):
+            assert guarded(4, 8) == 12
+            assert guarded(4, 8, jack=15) == 12
+            assert guarded(4, 8, kate=15, jack=16) == 12
+            for (args, kwargs) in (((4,), {}),
+                                   ((4, 8), {'sawyer': 15}),
+                                   ((4, 8, 15), {'jack': 16})):
+                try:
+                    guarded(*args, **kwargs)
+                except TypeError:
+                    pass
+                else:
+                    assert False, "should've raised TypeError"
+
+    def test_split (self):
+        split = predicates.guards._split
+        assert split(_npos(exactly=2)) == (_npos(exactly=2), None)
+        assert split(_args(isint)) == (None, _args(isint))
+        assert (split(_and(_npos(exactly=2), _args(isint), _nkw(atmost=1))) ==
+                (_arity(npos=(2, 2), nkw=(0, 1)), _args(isint)))
+        assert (split(_and(_npos(exactly=2), _args(isint), isnone)) ==
+                (_npos(exactly=2), _and(_args(isint), isnone)))
+
+
+class TestSampling (object):
+    def test_bad_budget (self):
+        for budget in (0, 1, -0.5, 2):
+            try:
+                validate(_args(isint), budget=budget)
+            except ValueError:
+                pass
+            else:
+                assert False, "should've raised ValueError"
+
+    def test_no_exceptions (self):
+        guarded = validate(_args(isint), budget=0.5)(add)
+        assert guarded('4', '8') == '48'
+        assert guarded.sampling.failures == {2: 1}
+
+    def test_raising (self):
+        # a sampled call which raises still counts, and the guard goes
+        # on sampling
+        def negate (n):
+            return -n
+        guarded = validate(_args(isint), budget=0.5)(negate)
+        try:
+            guarded('4')
+        except TypeError:
+            pass
+        else:
+            assert False, "should've raised TypeError"
+        state = guarded.sampling
+        assert state.failures == {1: 1}
+        assert state.checked == 1
+        assert state.countdown > 0
+
+        for i in range(1000):
+            guarded(4)
+        assert state.checked > 1
+
+    def test_raising_check (self):
+        # a check which raises has failed
+        startsa = validate(_args(lambda s: s.startswith('a')), budget=0.5)
+        guarded = startsa(lambda s: s)
+        state = guarded.sampling
+        assert guarded(4) == 4
+        assert state.failures == {1: 1}
+        assert state.countdown > 0
+
+        # ...and, forced, it still doesn't raise
+        assert guarded(8) == 8
+        assert state.failures == {1: 2}
+        for i in range(1000):
+            guarded('apple')
+        assert state.failures == {1: 2}
+
+    def test_forced (self):
+        guarded = validate(_args(isint), budget=0.01)(add)
+        state = guarded.sampling
+
+        # the first call is always checked
+        guarded('4', '8')
+        assert state.failures == {2: 1}
+        assert 2 in state.forced
+
+        # from then on, every call of the failed shape is checked...
+        for i in range(10):
+            guarded('4', '8')
+        assert state.failures == {2: 11}
+
+        # ...but not other shapes
+        state.every = state.countdown = 1000
+        for i in range(10):
+            guarded('4', '8', jack=15)
+        assert state.failures == {2: 11}
+
+        state.force(2, ['jack'])
+        guarded('4', '8', jack=15)
+        assert state.failures == {2: 11, (2, frozenset(['jack'])): 1}
+
+    def test_sampling (self):
+        # the check costs more than `add` itself, so, within 5%, most
+        # calls go unchecked
+        guarded = validate(_args(isint), budget=0.05)(add)
+        for i in range(500):
+            assert guarded(4, 8) == 12
+        state = guarded.sampling
+        assert state.calls == 500
+        assert 0 < state.checked < 100
+        assert state.every > 1
+        assert state.failures == {}
+
+    def test_threads (self):
+        # concurrent callers neither lose count of calls, nor push the
+        # countdown past the point where it'd trigger another sample
+        guarded = validate(_args(isint), budget=0.05)(add)
+        state = guarded.sampling
+
+        def call ():
+            for i in range(20000):
+                guarded(4, 8)
+
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=call) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+
+        assert state.calls == 160000
+        assert 0 < state.countdown <= state.every
+
+        checked = state.checked
+        for i in range(2 * maxevery):
+            guarded(4, 8)
+        assert state.checked > checked
+
+    def test_cheap_checks (self):
+        # ...whereas, for a slow function, it can afford to check
+        # every call
+        def slow (a, b):
+            sum(range(20000))
+            return a + b
+        guarded = validate(_args(isint), budget=0.05)(slow)
+        for i in range(20):
+            guarded(4, 8)
+        assert guarded.sampling.every == 1
+        assert guarded.sampling.checked == 20
+
+    def test_expensive_checks (self):
+        def check (*args, **kwargs):
+            sum(range(5000))
+            return True
+        guarded = validate(check, budget=0.01)(add)
+        for i in range(200):
+            guarded(4, 8)
+        # checks cost far more than the budget, so they're rare
+        assert guarded.sampling.checked < 10
+
+    def test_disabled (self):
+        try:
+            predicates.guards.enabled = False
+            assert validate(_args(isint), budget=0.01)(add) is add
+        finally:
+            predicates.guards.enabled = __debug__
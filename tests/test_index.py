@@ -0,0 +1,321 @@
+from collections import Mapping, Sequence
+from datetime import datetime
+from functools import partial
+from operator import eq
+
+import random
+
+from nose.tools import raises
+
+from predicates import *
+
+from predicates import (
+    _and,
+    _or,
+    _not,
+    _isa,
+    _is,
+    _nis,
+    _contains,
+    _return,
+    _fnis,
+    _in,
+
+    TypeIndex,
+    RuleNetwork,
+    RangeIndex,
+    )
+
+
+# test helpers
+class Thing (object):
+    pass
+
+class OtherThing (Thing):
+    pass
+
+class OldThing:
+    pass
+
+class Registered (object):
+    pass
+
+def fail (*args, **kwargs):
+    raise Exception("should've skipped this rule")
+
+def counted (pred):
+    def counting (*args, **kwargs):
+        counting.calls += 1
+        return pred(*args, **kwargs)
+    counting.calls = 0
+    return counting
+
+
+class TestTypeIndex (object):
+    def test_candidates (self):
+        rules = [_and(isstring, _not(isempty)),
+                 _and(ismap, _contains('jack')),
+                 isint,
+                 _isa(Thing)]
+        index = TypeIndex(rules)
+        assert len(index) == 4
+        assert index.candidates("bad robot!") == [rules[0]]
+        assert index.candidates({}) == [rules[1]]
+        assert index.candidates(True) == [rules[2]]
+        assert index.candidates(OtherThing()) == [rules[3]]
+        assert index.candidates(4.8) == []
+
+    def test_matching (self):
+        rules = [_and(isstring, _not(isempty)),
+                 _and(ismap, _contains('jack')),
+                 _and(isint, fail)]
+        index = TypeIndex(rules)
+        assert index.matching("bad robot!") == [rules[0]]
+        assert index.matching('') == []
+        assert index.matching({'jack': 4}) == [rules[1]]
+        assert index.matching({'kate': 4}) == []
+
+    def test_unguarded (self):
+        rules = [isint, _contains('jack'), _or(isint, isempty)]
+        index = TypeIndex(rules)
+        assert index.candidates('') == rules[1:]
+        assert index.matching('jack') == [rules[1]]
+
+    def test_multiple_guards (self):
+        rules = [_and(isseq, isstring), _and(isseq, islist)]
+        index = TypeIndex(rules)
+        assert index.candidates("bad robot!") == [rules[0]]
+        assert index.candidates([]) == [rules[1]]
+        assert index.candidates(()) == []
+
+    def test_tuple_guards (self):
+        rules = [_isa((int, float)), _isa((Mapping, Thing))]
+        index = TypeIndex(rules)
+        assert index.candidates(4.8) == [rules[0]]
+        assert index.candidates({}) == [rules[1]]
+        assert index.candidates(Thing()) == [rules[1]]
+
+    def test_abc_register (self):
+        rules = [_isa(Sequence), _isa(Registered)]
+        index = TypeIndex(rules)
+        obj = Registered()
+        assert index.candidates(obj) == [rules[1]]
+
+        # registering invalidates the cached candidates
+        Sequence.register(Registered)
+        assert index.candidates(obj) == rules
+
+    def test_old_style (self):
+        rules = [_isa(OldThing), _isa(object)]
+        index = TypeIndex(rules)
+        assert index.candidates(OldThing()) == rules
+        assert index.candidates(Thing()) == [rules[1]]
+
+    def test_add (self):
+        index = TypeIndex([isint])
+        assert index.candidates('') == []
+        index.add(isstring)
+        assert index.candidates('') == [isstring]
+
+    def test_cachesize (self):
+        index = TypeIndex([isint], cachesize=2)
+        for val in (4, 4.8, '', 8):
+            index.candidates(val)
+        assert len(index.cache) <= 2
+
+
+class TestRuleNetwork (object):
+    jack = object()
+
+    rules = [_and(_nis(atleast=4), _nis(atmost=8)),
+             _or(_is(None), partial(eq, 4)),
+             _and(ismap, _contains('jack')),
+             _contains('jack', 'kate'),
+             _or(_is(jack), _and(isstring, _not(isempty))),
+             _and(_or(_nis(exactly=15), _nis(exactly=16)),
+                  _or(isint, _contains(23))),
+             _not(_nis(atmost=42)),
+             partial(eq, "bad robot!"),
+             _return(True),
+             _return(False),
+             _or(),
+             _in([4, 'jack', frozenset(['jack'])]),
+             _and(_in([None, jack], identity=True), _not(_is(None))),
+             _in([[4], 8])]
+
+    values = [None, 0, 4, 4.0, 8, 8.5, 15, 16, 23, 42, 43, float('nan'),
+              '', "bad robot!", 'jack', {}, {'jack': 4},
+              {'jack': 4, 'kate': 8}, ['jack', 'kate', 'sawyer'],
+              set(['jack', 'kate']), frozenset(['jack']), jack, object()]
+
+    def test_matching (self):
+        network = RuleNetwork(self.rules)
+        assert len(network) == len(self.rules)
+        for val in self.values:
+            expected = [rule for rule in self.rules
+                        if self.truth(rule, val)]
+            assert network.matching(val) == expected, (val, expected)
+
+    def truth (self, rule, val):
+        try:
+            return bool(rule(val))
+        except TypeError:
+            return False
+
+    def test_shared (self):
+        isjack = counted(_contains('jack'))
+        network = RuleNetwork([_and(ismap, isjack),
+                               _and(_nis(atleast=4), isjack),
+                               _or(partial(eq, 4), _and(isseq, isjack))])
+        assert network.matching({'jack': 4}) == [network.rules[0]]
+        assert isjack.calls == 1
+
+    def test_untested (self):
+        # terms whose tests fail go no further
+        network = RuleNetwork([_and(_is(None), fail),
+                               _and(partial(eq, 8), fail),
+                               _and(_nis(atmost=0), fail),
+                               _and(_contains('jack'), fail)])
+        assert network.matching(4) == []
+        assert network.matching('kate') == []
+
+    def test_unhashable (self):
+        rules = [partial(eq, frozenset([4])), partial(eq, 4)]
+        network = RuleNetwork(rules)
+        assert network.matching(set([4])) == [rules[0]]
+        assert network.matching([4]) == []
+
+    def test_mixed_contents (self):
+        # `4 in 'jackson'` raises, but `'jack' in 'jackson'` is true
+        rules = [_contains('jack'), _contains(4)]
+        network = RuleNetwork(rules)
+        assert network.matching('jackson') == [rules[0]]
+        assert network.matching(['jack', 4]) == rules
+
+    def test_raising_rest (self):
+        # the rule alone short-circuits past the `_contains` on 3
+        rule = _or(partial(eq, 3),
+                   _not(_contains('a', 'b'), isnone),
+                   _or(_is(3)))
+        network = RuleNetwork([rule, _and(isint, _not(_contains('a')))])
+        assert network.matching(3) == [rule]
+        assert network.matching('ab') == []
+
+    def test_incomparable (self):
+        rules = [_nis(atleast=1), _and(ismap, _contains('a')),
+                 _or(_is(None), _not(isint))]
+        network = RuleNetwork(rules)
+        assert network.matching(datetime.now()) == [rules[2]]
+        assert network.matching(1j) == [rules[2]]
+        assert network.matching({'a': 1j}) == rules[1:]
+
+    def test_unorderable_bounds (self):
+        rules = [_nis(exactly=3+0j), _nis(atleast=2)]
+        network = RuleNetwork(rules)
+        assert network.matching(3) == rules
+        assert network.matching(4) == [rules[1]]
+
+    def test_nan (self):
+        # NaN isn't equal to itself, so it isn't looked up by hash
+        nan = float('nan')
+        rules = [partial(eq, nan), _or(partial(eq, 4), partial(eq, nan))]
+        network = RuleNetwork(rules)
+        assert network.matching(nan) == []
+        assert network.matching(4) == [rules[1]]
+
+    def test_maxterms (self):
+        wide = _or(*[partial(eq, i) for i in range(16)])
+        rule = _and(wide, wide, wide)
+        network = RuleNetwork([rule])
+        assert network.matching(4) == [rule]
+        assert network.matching(42) == []
+
+    def test_add (self):
+        network = RuleNetwork()
+        assert network.matching(4) == []
+        network.add(_nis(atleast=1))
+        network.add(_nis(atleast=2))
+        assert network.matching(4) == [_nis(atleast=1), _nis(atleast=2)]
+
+
+class TestRangeIndex (object):
+    def brute (self, preds, n):
+        return [pred for pred in preds if pred(n)]
+
+    def test_matching (self):
+        preds = [_nis(atmost=9), _nis(atleast=10, atmost=99),
+                 _nis(atleast=50), _nis(exactly=64)]
+        index = RangeIndex(preds)
+        assert len(index) == 4
+        assert list(index) == preds
+        assert index.matching(64) == preds[1:]
+        assert index.matching(9.5) == []
+        assert index.matching(-1) == []
+        assert index.matching(100) == [preds[2]]
+
+    def test_random (self):
+        rand = random.Random(42)
+        preds = []
+        for i in range(200):
+            atleast = rand.randint(0, 1000)
+            preds.append(_nis(atleast=atleast,
+                              atmost=atleast + rand.randint(0, 100)))
+        preds.append(_nis(atleast=500))
+        index = RangeIndex(preds)
+
+        values = [rand.uniform(-10, 1200) for i in range(100)]
+        values.extend(rand.randint(0, 1100) for i in range(100))
+        for n in values:
+            assert index.matching(n) == self.brute(preds, n)
+        assert (index.matching_many(values) ==
+                [self.brute(preds, n) for n in values])
+
+    def test_not_numbers (self):
+        preds = [_nis(atleast=4), _nis(atmost=8)]
+        index = RangeIndex(preds)
+        assert index.matching(1j) == []
+        assert index.matching(datetime.now()) == []
+        assert index.matching_many([1j, 4]) == [[], preds]
+        assert RangeIndex([_nis(exactly=3)]).matching(3+0j) == [_nis(exactly=3)]
+        for val in (float('nan'), 'jack', None, float('inf')):
+            assert index.matching(val) == self.brute(preds, val)
+        values = [None, 4, float('nan'), 16, 'jack']
+        assert (index.matching_many(values) ==
+                [self.brute(preds, n) for n in values])
+
+    def test_unorderable_bounds (self):
+        # ranges whose bounds can't be ordered are checked in turn
+        preds = [_nis(exactly=3+0j), _nis(atleast=2, atmost=4),
+                 _nis(exactly=1j), _nis(atleast=float('nan'))]
+        index = RangeIndex(preds)
+        assert index.matching(3) == preds[:2]
+        assert index.matching(3+0j) == [preds[0]]
+        assert index.matching(1j) == [preds[2]]
+        values = [1, 3, 3.0, 4, 5]
+        assert (index.matching_many(values) ==
+                [self.brute(preds, n) for n in values])
+
+    def test_fnis (self):
+        preds = [_fnis(len, atmost=2), _fnis(len, atleast=2)]
+        index = RangeIndex(preds)
+        assert index.matching('') == [preds[0]]
+        assert index.matching('ab') == preds
+        assert index.matching_many(['abc', [4]]) == [[preds[1]], [preds[0]]]
+
+    @raises(ValueError)
+    def test_mixed_funcs (self):
+        RangeIndex([_fnis(len, atmost=2), _nis(atmost=2)])
+
+    @raises(ValueError)
+    def test_not_ranges (self):
+        RangeIndex([isint])
+
+    def test_add (self):
+        index = RangeIndex([_nis(atleast=4)])
+        assert index.matching(8) == [_nis(atleast=4)]
+        index.add(_nis(atmost=8))
+        assert index.matching(8) == [_nis(atleast=4), _nis(atmost=8)]
+
+    def test_empty (self):
+        assert RangeIndex().matching(4) == []
+        assert RangeIndex().matching_many([4, 8]) == [[], []]
@@ -0,0 +1,251 @@
+from predicates import *
+
+from predicates import (
+    _and,
+    _or,
+    _not,
+    _zip,
+    _all,
+    _each,
+    _args,
+    _nis,
+    _return,
+    _isa,
+    _npos,
+    _inkw,
+    _arity,
+    _is,
+    _in,
+    _memo,
+    _weakmemo,
+
+    _optimize,
+    )
+
+from functools import partial
+from operator import eq
+
+
+# test helpers
+def fail (*args, **kwargs):
+    raise Exception("should've short-circuited past this")
+
+def true (*args, **kwargs):
+    return True
+
+def false (*args, **kwargs):
+    return False
+
+values = ('', "bad robot!", (), (4, 8), [], {}, {'jack': 4},
+          0, 42, 4.8, True, False, None)
+
+def equivalent (pred, optimized):
+    return all(bool(pred(val)) == bool(optimized(val)) for val in values)
+
+
+class TestOptimizeFlatten (object):
+    def test_and (self):
+        assert (_optimize(_and(_and(isint, isbool), istrue)) ==
+                _and(isint, isbool, istrue))
+        assert (_optimize(_and(isint, _and(isbool, _and(istrue, not_)))) ==
+                _and(isint, isbool, istrue, not_))
+
+    def test_or (self):
+        assert (_optimize(_or(_or(isnone, istrue), isempty)) ==
+                _or(isnone, istrue, isempty))
+
+    def test_not (self):
+        assert (_optimize(_not(_or(isnone, istrue), isempty)) ==
+                _not(isnone, istrue, isempty))
+
+    def test_mixed (self):
+        tree = _and(_or(isint, isfloat), _and(_not(isbool), _nis(atleast=0)))
+        optimized = _optimize(tree)
+        assert optimized == _and(_or(isint, isfloat), _not(isbool),
+                                 _nis(atleast=0))
+
+    def test_application (self):
+        assert (_optimize(_all(_and(_and(isint, isbool), istrue))) ==
+                _all(_and(isint, isbool, istrue)))
+        assert (_optimize(_zip(_or(_or(isint, isbool)), isnone)) ==
+                _zip(_or(isint, isbool), isnone))
+        assert (_optimize(_args[0](_and(_and(isint)), jack=_or(_or(isnone)))) ==
+                _args[0](isint, jack=isnone))
+        assert (_optimize(_each(_and(_and(isint, isbool)), 10)) ==
+                _each(_and(isint, isbool), 10))
+        assert (_optimize(_args[0, 'jack'](_and(_and(isint)), _or(_or(isnone)))) ==
+                _args[0, 'jack'](isint, isnone))
+
+
+class TestOptimizeConstants (object):
+    def test_and (self):
+        assert _optimize(_and(isint, true_)) is isint
+        assert _optimize(_and(isint, false_)) is false_
+        assert _optimize(_and(fail, false_)) is false_
+        assert _optimize(_and(true_, _return("bad robot!"))) is true_
+        assert _optimize(_and()) is true_
+
+    def test_or (self):
+        assert _optimize(_or(isint, false_)) is isint
+        assert _optimize(_or(isint, true_)) is true_
+        assert _optimize(_or(fail, _return(42))) is true_
+        assert _optimize(_or()) is false_
+
+    def test_not (self):
+        assert _optimize(_not(true_)) is false_
+        assert _optimize(_not(false_)) is true_
+        assert _optimize(_not(isint, true_)) is false_
+        assert _optimize(_not(isint, false_)) == _not(isint)
+        assert _optimize(_not()) is true_
+
+    def test_nested (self):
+        assert _optimize(_and(isint, _or(isbool, true_))) is isint
+        assert _optimize(_or(isint, _and(isbool, false_))) is isint
+        assert _optimize(_and(isint, _not(_or(isbool, true_)))) is false_
+
+
+class TestOptimizeDuplicates (object):
+    def test_duplicates (self):
+        assert _optimize(_or(isint, isbool, isint)) == _or(isint, isbool)
+        assert (_optimize(_and(_not(isnone), isint, _not(isnone))) ==
+                _and(_not(isnone), isint))
+        assert _optimize(_and(isint, _and(isint))) is isint
+        assert _optimize(_or(not_, not_)) == _or(not_)
+
+
+class TestOptimizeFuseIsa (object):
+    def test_or (self):
+        assert (_optimize(_or(isint, isnone, isfloat)) ==
+                _or(_isa((int, float)), isnone))
+        assert (_optimize(_or(isnone, isint, _or(isfloat, isempty))) ==
+                _or(isnone, _isa((int, float)), isempty))
+        assert (_optimize(_or(_or(isint, isnone), _or(isfloat, islong))) ==
+                _or(_isa((int, float, long)), isnone))
+
+    def test_not (self):
+        assert (_optimize(_not(isint, isnone, isfloat)) ==
+                _not(_isa((int, float)), isnone))
+        assert (_optimize(_not(_or(isint, isnone), isfloat)) ==
+                _not(_isa((int, float)), isnone))
+
+    def test_and (self):
+        # intersections don't fuse
+        tree = _and(isint, isbool)
+        assert _optimize(tree) is tree
+
+
+class TestOptimizeFuseIn (object):
+    def test_identity (self):
+        (jack, kate) = (object(), object())
+        tree = _or(_is(jack), isint, _is(kate), isnone, istrue)
+        optimized = _optimize(tree)
+        assert optimized == _or(_in([jack, kate, None, True], identity=True),
+                                isint)
+        assert optimized(jack)
+        assert optimized(4)
+        assert not optimized(object())
+
+    def test_equality (self):
+        tree = _or(isnone, *[partial(eq, val) for val in (4, 8, 15, 16)])
+        assert _optimize(tree) == _or(isnone, _in([4, 8, 15, 16]))
+        assert equivalent(tree, _optimize(tree))
+
+    def test_nan (self):
+        # NaN isn't equal to itself, so it isn't fused into a set
+        nan = float('nan')
+        tree = _or(*[partial(eq, val) for val in (nan, 1, 2, 3)])
+        assert not _optimize(tree)(nan)
+
+        tree = _or(*[partial(eq, val) for val in (nan, 4, 8, 15, 16)])
+        optimized = _optimize(tree)
+        assert optimized.children[0].args == (nan,)
+        assert optimized.children[1] == _in([4, 8, 15, 16])
+        assert not optimized(nan)
+        assert optimized(15)
+
+    def test_in (self):
+        assert (_optimize(_or(_in([4, 8]), partial(eq, 15), _in([16]))) ==
+                _in([4, 8, 15, 16]))
+        assert (_optimize(_not(_in([4, 8]), _in([15, 16]))) ==
+                _not(_in([4, 8, 15, 16])))
+
+    def test_narrow (self):
+        # too few to be worth fusing
+        tree = _or(isnone, istrue, partial(eq, 4))
+        assert _optimize(tree) is tree
+
+    def test_and (self):
+        # intersections don't fuse
+        tree = _and(*[partial(eq, val) for val in (4, 8, 15, 16)])
+        assert _optimize(tree) is tree
+
+
+class TestOptimizeFuseArity (object):
+    def test_and (self):
+        assert (_optimize(_and(_npos(atmost=2), isint, _inkw(atleast=['jack']))) ==
+                _and(_arity(npos=(0, 2), required=['jack']), isint))
+        assert (_optimize(_and(_npos(atmost=2), _and(_inkw(atleast=['jack'])))) ==
+                _arity(npos=(0, 2), required=['jack']))
+
+    def test_or (self):
+        # unions don't fuse
+        tree = _or(_npos(atmost=2), _inkw(atleast=['jack']))
+        assert _optimize(tree) is tree
+
+
+class TestOptimizeNegation (object):
+    def test_double_negation (self):
+        assert _optimize(_not(_not(isint))) is isint
+        assert _optimize(_not(_not(isint, isfloat))) == _or(isint, isfloat)
+
+    def test_de_morgan (self):
+        assert (_optimize(_not(_and(_not(isint), _not(isfloat)))) ==
+                _or(isint, isfloat))
+        assert (_optimize(_not(_not(isint), _not(isfloat))) ==
+                _and(isint, isfloat))
+        assert (_optimize(_and(isnsiterable, _not(_or(isempty, isseq)))) ==
+                _and(isnsiterable, _not(isempty, isseq)))
+
+    def test_no_gain (self):
+        tree = _not(_and(isint, isfloat))
+        assert _optimize(tree) == tree
+
+
+class TestOptimizeSemantics (object):
+    def test_unchanged (self):
+        tree = _and(isint, _not(isbool))
+        assert _optimize(tree) is tree
+        assert _optimize(isint) is isint
+        assert _optimize(not_) is not_
+
+    def test_non_bool_children (self):
+        # composites return bools, so they can't collapse into
+        # children which might not
+        assert _optimize(_and(truth)) == _and(truth)
+        assert _optimize(_and(truth))(42) is True
+        assert _optimize(_or(_return(42), false_)) is true_
+
+        # nor can they collapse into memos of them
+        assert _optimize(_and(_memo(len)))('abc') is True
+        assert _optimize(_or(_weakmemo(repr)))(Exception()) is True
+        memo = _memo(isint)
+        assert _optimize(_and(memo)) is memo
+
+    def test_equivalent (self):
+        trees = (
+            _and(_or(isint, isfloat), _not(_not(isbool)), true_),
+            _not(_and(_not(isstring), _not(isempty)), isnone),
+            _or(_and(isnsiterable, _not(_or(isempty, isseq))),
+                _not(_not(isnone), _not(istrue)),
+                _and(isstring, isstring, _or(isempty, false_))),
+            _not(_not(_not(_and(isint, _not(isbool))))),
+            )
+        for tree in trees:
+            assert equivalent(tree, _optimize(tree))
+
+    def test_less_work (self):
+        from predicates.optimize import _cost
+        tree = _or(_and(isnsiterable, _not(_or(isempty, isseq))),
+                   _not(_not(isnone), _not(istrue)),
+                   _and(isstring, isstring, _or(isempty, false_)))
+        assert _cost(_optimize(tree)) < _cost(tree)
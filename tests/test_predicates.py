@@ -1,3 +1,5 @@
+import functools
+
 from nose.tools import raises
 
 from predicates import *
@@ -7,6 +9,8 @@ from predicates import *
 from predicates import (
     _apply,
     _return,
+    _memo,
+    _weakmemo,
 
     _and,
     _or,
@@ -15,6 +19,9 @@ from predicates import (
     _all,
     _any,
     _none,
+    _each,
+    _some,
+    _noneof,
 
     _args,
     _nis,
@@ -23,11 +30,15 @@ from predicates import (
     _npos,
     _nkw,
     _inkw,
+    _arity,
 
     _contains,
+    _in,
 
     _isa,
     _is,
+
+    _fast,
     )
 
 
@@ -90,6 +101,90 @@ class TestTypePredicates (object):
         C.__name__ = ''
         assert _isa(C).__doc__ == "`True` if `obj` is an instance of <class 'test_predicates.'>"
 
+    def test_isa_fused (self):
+        assert _or(isint, isfloat) == _isa((int, float))
+        assert _or(isint, isfloat, islong) == _isa((int, float, long))
+        assert _or(isint, _isa((float, (long, int)))) == _isa((int, float, long))
+        assert _or(isint, isint) == _isa(int)
+        assert _not(isint, isfloat) == _not(_isa((int, float)))
+
+        assert _or(isint, isfloat)(4.8)
+        assert not _or(isint, isfloat)("bad robot!")
+        assert _not(isint, isfloat)("bad robot!")
+        assert not _not(isint, isfloat)(42)
+
+        # not all `_isa` predicates
+        assert _or(isint, isnone).op == '_or'
+        assert _or(isint).op == '_or'
+
+    def test_isa_fused_docstring (self):
+        assert _or(isint, isfloat).__doc__ == "`True` if `obj` is an instance of (int, float)"
+        assert _or(isint, isint).__doc__ == "`True` if `obj` is an instance of :class:`int`"
+
+    def test_isa_cache (self):
+        from collections import Sized
+
+        pred = _isa(Sized, cachesize=2)
+        assert pred.cache == {}
+        assert pred([])
+        assert pred('')
+        assert not pred(42)
+        assert len(pred.cache) <= 2
+        assert pred([4, 8])
+        assert not pred(4.8)
+        assert pred == _isa(Sized)
+
+        pred.setcachesize(0)
+        assert pred.cache is None
+        assert pred([])
+
+    def test_isa_cache_register (self):
+        from abc import ABCMeta
+
+        class Base (object):
+            __metaclass__ = ABCMeta
+
+        class Other (object):
+            pass
+
+        pred = _isa(Base, cachesize=16)
+        assert not pred(Other())
+        assert pred.cache
+        Base.register(Other)
+        assert pred(Other())
+
+    def test_isa_cache_old_style (self):
+        class Old:
+            pass
+
+        class OldSized:
+            def __len__ (self):
+                return 0
+
+        pred = _isa(Old, cachesize=16)
+        assert pred(Old())
+        assert not pred(OldSized())
+        assert not pred.cache
+
+    def test_cachetypes (self):
+        try:
+            cachetypes(16)
+            assert issized.cache == {}
+            assert ismap.cache == {}
+            assert isstring.cache is None
+
+            assert isempty([])
+            assert not isempty([4, 8])
+            assert isatom("bad robot!")
+            assert not isatom((4, 8))
+            assert isnsiterable({})
+            assert list in issized.cache
+        finally:
+            cachetypes(0)
+        assert issized.cache is None
+        assert isempty([])
+        assert isatom(42)
+
     def test_isatom (self):
         assert isatom("bad robot!")
         assert isatom(u"bad robot!")
@@ -138,6 +233,90 @@ class TestValuePredicates (object):
 
         assert not _contains('bad', 'robo')(('bad', 'robot!'))
 
+    def test_in (self):
+        fn = _in([4, 8, 15, 16, 23, 42, "bad robot!"])
+        assert fn(4)
+        assert fn(4.0)
+        assert fn("bad robot!")
+        assert not fn(5)
+        assert not fn('')
+        assert not fn(None)
+
+    def test_in_none (self):
+        assert _in([]) is false_
+
+    def test_in_unhashable (self):
+        # sorted, and bisected
+        fn = _in([[4, 8], [15, 16], (23, 42), 'jack'])
+        assert fn([4, 8])
+        assert fn([15, 16])
+        assert fn((23, 42))
+        assert fn('jack')
+        assert not fn([4])
+        assert not fn((4, 8))
+        assert not fn([23, 42])
+
+        # searched in turn
+        fn = _in([{'jack': 4}, set([8]), 'kate'])
+        assert fn({'jack': 4})
+        assert fn(set([8]))
+        assert fn(frozenset([8]))
+        assert not fn({})
+
+        # unorderable, so searched in turn
+        fn = _in([[1j], [2j]])
+        assert fn([2j])
+        assert not fn([3j])
+        # ...or sorted, but not against this argument
+        assert _in([(1, [2]), (3, [4])])((1j, 2)) is False
+
+        # an unhashable argument, equal to a hashable value
+        assert _in([frozenset([4]), 8])(set([4]))
+        assert not _in([4, 8])([4])
+
+        # tuples of sets don't sort consistently with their equality,
+        # so they're searched in turn
+        fn = _in([(set([i]),) for i in range(50)])
+        assert fn((frozenset([7]),))
+        assert fn((set([49]),))
+        assert not fn((set([50]),))
+
+        # unhashable arguments are found by bisection, too
+        fn = _in([[i] for i in range(100)] + [[1j], 'jack'])
+        assert fn.bisected == [[i] for i in range(100)]
+        assert fn([42]) and fn([42.0]) and fn([1j])
+        assert not fn([100]) and not fn(['jack'])
+        assert _in([frozenset([4]), [8]])(set([4]))
+        assert _in([[4], 8])(set()) is False
+
+        # NaN isn't equal to itself, even though the set would find it
+        nan = float('nan')
+        assert not _in([nan, 4])(nan)
+        assert _in([nan, 4])(4)
+
+    def test_in_identity (self):
+        (jack, kate) = ([], [])
+        fn = _in([jack, None, 4.8], identity=True)
+        assert fn(jack)
+        assert fn(None)
+        assert not fn(kate)
+        assert not fn([])
+        assert not fn(4)
+
+    def test_in_node (self):
+        assert _in([4, 8]) is _in((8, 4))
+        assert _in([4, 8]) is not _in([4, 8], identity=True)
+        assert _in([4, 8]).op == '_in'
+        assert _in([4, 8]).params == ((4, 8),)
+
+    def test_in_many (self):
+        values = [4, 4.0, 5, '', [4], set([4]), None]
+        for fn in (_in([4, frozenset([4]), None]),
+                   _in([4, [4]]),
+                   _in([4, None], identity=True)):
+            assert (list(fn.evaluate_many(values)) ==
+                    [int(bool(fn(val))) for val in values])
+
 
 class TestIdentityPredicates (object):
     def test_is (self):
@@ -359,6 +538,65 @@ class TestApplicationPredicates (object):
         assert not _not(true, fail)()
 
 
+class TestStreamingPredicates (object):
+    def stream (self, *items):
+        """
+        Yields ``items``, then fails (so it can only be exhausted by a
+        predicate which doesn't stop early).
+        """
+        for item in items:
+            yield item
+        fail()
+
+    def test_each (self):
+        for chunksize in (None, 1, 2, 100):
+            assert _each(isstring, chunksize)([])
+            assert _each(isstring, chunksize)(['jack', 'kate', 'sawyer'])
+            assert _each(isstring, chunksize)(iter(['jack', 'kate']))
+            assert not _each(isstring, chunksize)(['jack', 4, 'kate'])
+            assert _each(_and(isint, _nis(atleast=4)), chunksize)(xrange(4, 42))
+
+    def test_some (self):
+        for chunksize in (None, 1, 2, 100):
+            assert not _some(isstring, chunksize)([])
+            assert _some(isstring, chunksize)([4, 8, 'kate'])
+            assert not _some(isstring, chunksize)(iter([4, 8]))
+
+    def test_noneof (self):
+        for chunksize in (None, 1, 2, 100):
+            assert _noneof(isstring, chunksize)([])
+            assert _noneof(isstring, chunksize)([4, 8, 15])
+            assert not _noneof(isstring, chunksize)(iter([4, 'kate', 8]))
+
+    def test_short_circuit (self):
+        assert not _each(isstring)(self.stream('jack', 4))
+        assert not _each(isstring, 2)(self.stream('jack', 4))
+        assert _some(isint)(self.stream('jack', 4))
+        assert _some(isint, 2)(self.stream('jack', 4))
+        assert not _noneof(isint)(self.stream('jack', 4))
+        assert not _noneof(isint, 2)(self.stream('jack', 4))
+
+    def test_lazy (self):
+        consumed = []
+        def items ():
+            for i in xrange(10 ** 9):
+                consumed.append(i)
+                yield i
+        assert not _each(_nis(atmost=4))(items())
+        assert len(consumed) == 6
+        del consumed[:]
+        assert not _each(_nis(atmost=4), 3)(items())
+        assert len(consumed) == 6
+
+    def test_plain_function (self):
+        assert _each(true, 2)([1, 2, 3])
+        assert not _some(false, 2)([1, 2, 3])
+
+    @raises(ValueError)
+    def test_bad_chunksize (self):
+        _each(isint, 0)
+
+
 class TestNumericRangePredicates (object):
     @raises(ValueError)
     def test_nis_bad_spec (self):
@@ -409,6 +647,13 @@ class TestNumericRangePredicates (object):
         assert not _nis(exactly=1)(2)
         assert not _nis(exactly=2)(1)
 
+        # (by equality, so it needn't be ordered)
+        assert _nis(exactly=3)(3+0j)
+        assert not _nis(exactly=3)(3j)
+        assert not _nis(exactly=3)(None)
+        assert _nis(exactly=3+0j)(3)
+        assert not _nis(exactly=1j)(1)
+
     @raises(ValueError)
     def test_fnis_bad_spec (self):
         _fnis(lambda: 0, atleast=1, exactly=2)
@@ -648,28 +893,93 @@ class TestArgContentPredicates (object):
         assert _and(_args[0:1](isstring),
                     _args[1:2](isnone))("bad robot!", None)
 
-    # ___TODO:___ string keys for `_args[...]`
-    def todo_args_string (self):
-        pass
-
-    def todo_args_string_slice (self):
-        pass
-
-    # ___TODO:___ multi-dimensional slices for `_args[...]`
-    def todo_args_multi_idx (self):
-        pass
+    def test_args_idx_negative (self):
+        assert _args[-2](isstring)(4, 'kate', 8)
+        assert not _args[-2](isstring)(4, 8, 'kate')
+        assert _args[-1](isstring)(4, 8, 'kate')
+
+    def test_args_string (self):
+        assert _args['hurley'](isint)(hurley=16)
+        assert _args['hurley'](isint)(4, 8, hurley=16)
+        assert not _args['hurley'](isint)(hurley='16')
+        assert not _args['hurley'](isint)()
+        assert _args['hurley'](isnone)()
+
+    def test_args_string_kw (self):
+        # keyword selectors combine with keyword arguments
+        fn = _args['hurley'](isint, hurley=_nis(atleast=16), jack=isstring)
+        assert fn(hurley=16, jack='')
+        assert not fn(hurley=15, jack='')
+        assert not fn(hurley='16', jack='')
+        assert not fn(hurley=16)
+
+    def test_args_multi_idx (self):
+        fn = _args[0, 2](isstring, isint)
+        assert fn()
+        assert fn('jack')
+        assert fn('jack', (), 4)
+        assert fn('jack', (), 4, ())
+        assert not fn(4)
+        assert not fn('jack', (), 'kate')
+
+    def test_args_multi_idx_slice (self):
+        fn = _args[0, 1, 3:5](isstring, isint, isfloat)
+        assert fn("bad robot!", 4, (), 8.0, 15.0)
+        assert fn("bad robot!", 4, (), 8.0, 15.0, ())
+        assert fn("bad robot!", 4, ())
+        assert not fn("bad robot!", 4, (), 8.0, 15)
+        assert not fn("bad robot!", 4.0, (), 8.0, 15.0)
+
+    def test_args_multi_overlapping (self):
+        fn = _args[0:4, 3:5](isstring, _not(isempty))
+        assert fn('', '', "bad robot!")
+        assert fn('', "bad robot!", '', 'jack', (42,))
+        assert not fn('', "bad robot!", '', 'jack', ())
+        assert not fn('', "bad robot!", '', '', (42,))
+        assert not fn('', "bad robot!", '', 4, (42,))
+
+    def test_args_multi_once (self):
+        # each argument is checked exactly once, however many
+        # selectors it's in
+        calls = []
+        def counted (arg):
+            calls.append(arg)
+            return True
+        fn = _args[0:3, 1:4, :](counted, counted, counted)
+        assert fn(4, 8, 15, 16, 23)
+        assert calls == [4, 8, 15, 16, 23]
+
+    def test_args_multi_string (self):
+        fn = _args['jack', 'kate'](isstring, isint)
+        assert fn(jack='', kate=15)
+        assert not fn(jack='')
+        assert not fn(jack=4, kate=15)
+
+    def test_args_multi_mixed (self):
+        fn = _args[0, 1, 3:5, 'hurley'](isstring, isint, isfloat, isint)
+        assert fn("bad robot!", 4, (), 8.0, 15.0, hurley=16)
+        assert not fn("bad robot!", 4, (), 8.0, 15, hurley=16)
+        assert not fn("bad robot!", 4, (), 8.0, 15.0)
+        assert not fn("bad robot!", 4, (), 8.0, 15.0, hurley='16')
+
+    def test_args_multi_negative (self):
+        fn = _args[0, -1](isstring, isint)
+        assert fn('jack', 'kate', 4)
+        assert not fn('jack', 'kate')
+        # a single argument is both the first and the last
+        assert not fn('jack')
+        assert not fn(4)
 
-    def todo_args_multi_idx_slice (self):
-        pass
-
-    def todo_args_multi_string (self):
-        pass
-
-    def todo_args_multi_string_slice (self):
-        pass
+    @raises(ValueError)
+    def test_args_multi_count (self):
+        _args[0, 1](isstring)
 
-    def todo_args_multi_mixed (self):
-        pass
+    def test_args_multi_node (self):
+        fn = _args[0, 3:5, 'hurley'](isstring, isfloat, isint)
+        assert fn == _args[0, 3:5, 'hurley'](isstring, isfloat, isint)
+        assert fn != _args[0, 3:6, 'hurley'](isstring, isfloat, isint)
+        assert fn.children == (isstring, isfloat, isint)
+        assert repr(fn) == "_args[0:1, 3:5, 'hurley'](_isa(basestring), _isa(float), _isa(int))"
 
 
 class TestPositionalArgCountPredicates (object):
@@ -997,6 +1307,54 @@ class TestKeywordArgPresencePredicates (object):
         assert not _inkw(exactly={'jack': 4, 'kate': 8})(jack=True, kate=True, sawyer=True)
 
 
+class TestArityPredicates (object):
+    def test_arity (self):
+        fn = _arity(npos=(1, 2), nkw=(0, 1), nargs=(2, 3),
+                    required=['jack'], allowed=['jack', 'kate'])
+        assert fn(4, jack=8)
+        assert fn(4, 8, jack=15)
+        assert not fn(4)
+        assert not fn(jack=8)
+        assert not fn(4, 8, 15, jack=16)
+        assert not fn(4, kate=8)
+        assert not fn(4, sawyer=8)
+        assert not fn(4, jack=8, kate=15)
+        assert _arity()()
+        assert _arity()(4, 8, jack=15)
+
+    def test_fused (self):
+        fn = _and(_npos(atmost=2), _nkw(atleast=1), _nargs(exactly=3),
+                  _inkw(atleast=['jack']), _inkw(atmost=['jack', 'kate']))
+        assert fn == _arity(npos=(0, 2), nkw=(1, float('inf')),
+                            nargs=(3, 3), required=['jack'],
+                            allowed=['jack', 'kate'])
+        assert fn(4, 8, jack=15)
+        assert fn(4, jack=8, kate=15)
+        assert not fn(4, 8, 15)
+        assert not fn(4, 8, kate=15)
+        assert not fn(4, 8, jack=15, kate=16)
+
+    def test_fused_allowed (self):
+        fn = _and(_inkw(atmost=['jack', 'kate']),
+                  _inkw(atmost=['kate', 'sawyer']))
+        assert fn(kate=4)
+        assert not fn(jack=4)
+        assert not fn(sawyer=4)
+
+    def test_unfused (self):
+        # anything else in the `_and` stops the fusion
+        fn = _and(_npos(atmost=2), _args(isint))
+        assert fn.op == '_and'
+        assert fn(4, 8)
+        assert not fn(4, 'jack')
+
+    def test_equality (self):
+        assert _nargs(exactly=2) == _nargs(exactly=2)
+        assert _nargs(exactly=2) != _npos(exactly=2)
+        assert _inkw(atleast=['jack']) == _inkw(atleast=('jack',))
+        assert hash(_inkw(atleast=['jack'])) == hash(_inkw(atleast=('jack',)))
+
+
 class TestReturnHelper (object):
     def test_return (self):
         assert _return(True)()
@@ -1027,9 +1385,535 @@ class TestReturnHelper (object):
         assert _return("bad robot!") is _return("bad robot!")
 
         assert not _return(True) is _return(False)
+        assert not _return(1) is _return(True)
         assert not _return(lambda: True) is _return(lambda: True)
 
         # lists aren't hashable
         l = list()
         assert not _return(l) is _return(l)
         assert not _return(list()) is _return(list())
+
+
+class TestMemoHelper (object):
+    def counted (self, result=True):
+        def pred (*args, **kwargs):
+            pred.calls += 1
+            return result
+        pred.calls = 0
+        return pred
+
+    def test_memo (self):
+        pred = self.counted(42)
+        memo = _memo(pred)
+        assert memo(4) == 42
+        assert memo(4) == 42
+        assert memo(8, jack=15) == 42
+        assert memo(8, jack=15) == 42
+        assert pred.calls == 2
+        assert (memo.hits, memo.misses, memo.evictions) == (2, 2, 0)
+
+    def test_memo_results (self):
+        memo = _memo(isint)
+        assert memo(4) and memo(4)
+        assert not memo('4') and not memo('4')
+        assert memo.hits == 2
+
+    def test_memo_keywords (self):
+        # positional arguments which look like keyword arguments
+        memo = _memo(lambda *args, **kwargs: (args, kwargs))
+        assert memo(1, a=1) == ((1,), {'a': 1})
+        assert (memo((1,), frozenset([('a', 1)])) ==
+                (((1,), frozenset([('a', 1)])), {}))
+        assert memo.misses == 2
+
+    def test_memo_typed (self):
+        # equal, but of different types
+        memo = _memo(isbool)
+        assert not memo(1)
+        assert memo(True)
+        memo = _memo(isint)
+        assert memo(1)
+        assert not memo(1.0)
+        memo = _memo(lambda **kwargs: isfloat(kwargs['jack']))
+        assert not memo(jack=1)
+        assert memo(jack=1.0)
+        assert memo.misses == 2
+
+    def test_memo_unhashable (self):
+        pred = self.counted()
+        memo = _memo(pred)
+        assert memo([4, 8])
+        assert memo([4, 8])
+        assert memo(4, jack=[8])
+        assert pred.calls == 3
+        assert (memo.hits, memo.misses) == (0, 0)
+
+    def test_memo_lru (self):
+        pred = self.counted()
+        memo = _memo(pred, maxsize=2)
+        memo(4)
+        memo(8)
+        memo(4)        # 8 is now the least recently used...
+        memo(15)       # ...so it's evicted
+        assert memo.evictions == 1
+        assert pred.calls == 3
+        memo(4)
+        assert pred.calls == 3
+        memo(8)
+        assert pred.calls == 4
+
+    def test_memo_ttl (self):
+        pred = self.counted()
+        memo = _memo(pred, ttl=-1)
+        memo(4)
+        memo(4)
+        assert pred.calls == 2
+
+        memo = _memo(pred, ttl=3600)
+        memo(4)
+        memo(4)
+        assert pred.calls == 3
+
+    def test_memo_clear (self):
+        pred = self.counted()
+        memo = _memo(pred)
+        memo(4)
+        memo.clear()
+        memo(4)
+        assert pred.calls == 2
+        assert memo.misses == 2
+
+    @raises(ValueError)
+    def test_memo_bad_maxsize (self):
+        _memo(isint, maxsize=0)
+
+    def test_memo_shared (self):
+        pred = self.counted()
+        shared = _memo(pred)
+        tree = _or(_and(shared, isnone), _and(isint, shared))
+        for i in range(3):
+            assert tree(4)
+            assert not tree('4')
+        assert pred.calls == 2
+
+    def test_memo_node (self):
+        memo = _memo(isint, maxsize=16)
+        assert memo.op == '_memo'
+        assert memo.children == (isint,)
+        assert memo == _memo(isint, maxsize=16)
+        assert memo != _memo(isint, maxsize=32)
+        assert memo.__doc__ == isint.__doc__
+
+
+class TestWeakMemoHelper (object):
+    class Config (dict):
+        # (plain dicts can't be weakly referenced, but subclasses can)
+        generation = 0
+
+    def counted (self, pred):
+        def counting (obj):
+            counting.calls += 1
+            return pred(obj)
+        counting.calls = 0
+        return counting
+
+    def test_weakmemo (self):
+        pred = self.counted(isempty)
+        memo = _weakmemo(pred)
+        config = self.Config()
+        assert memo(config)
+        assert memo(config)
+        assert not memo(self.Config(jack=4))
+        assert pred.calls == 2
+        assert (memo.hits, memo.misses, memo.uncached) == (1, 2, 0)
+
+    def test_weakmemo_unhashable (self):
+        # identity, not equality
+        pred = self.counted(isempty)
+        memo = _weakmemo(pred)
+        (jack, kate) = (self.Config(), self.Config())
+        for i in range(3):
+            memo(jack)
+            memo(kate)
+        assert pred.calls == 2
+
+    def test_weakmemo_freed (self):
+        import gc
+        memo = _weakmemo(isempty)
+        config = self.Config()
+        memo(config)
+        assert len(memo.cache) == 1
+        del config
+        gc.collect()
+        assert len(memo.cache) == 0
+
+    def test_weakmemo_version (self):
+        pred = self.counted(isempty)
+        memo = _weakmemo(pred, version=lambda obj: obj.generation)
+        config = self.Config()
+        assert memo(config)
+
+        # a change the hook doesn't see goes unnoticed...
+        config['jack'] = 4
+        assert memo(config)
+
+        # ...until the version changes
+        config.generation += 1
+        assert not memo(config)
+        assert not memo(config)
+        assert pred.calls == 2
+
+    def test_weakmemo_not_weakrefable (self):
+        pred = self.counted(isempty)
+        memo = _weakmemo(pred)
+        config = {}
+        assert memo(config)
+        config['jack'] = 4
+        assert not memo(config)
+        assert pred.calls == 2
+        assert memo.uncached == 2
+        assert not memo.cache
+
+    def test_weakmemo_clear (self):
+        pred = self.counted(isempty)
+        memo = _weakmemo(pred)
+        config = self.Config()
+        memo(config)
+        memo.clear()
+        memo(config)
+        assert pred.calls == 2
+
+    def test_weakmemo_node (self):
+        memo = _weakmemo(ismap)
+        assert memo.op == '_weakmemo'
+        assert memo.children == (ismap,)
+        assert memo == _weakmemo(ismap)
+        assert _and(memo, _not(isempty))(self.Config(jack=4))
+
+
+class TestInterning (object):
+    def test_interned (self):
+        assert _and(isstring, _not(isempty)) is _and(isstring, _not(isempty))
+        assert _isa((int, float)) is _isa((int, float))
+        assert _is(None) is _is(None)
+        assert _nis(exactly=2) is _nis(atleast=2, atmost=2)
+        assert _contains(23, 42) is _contains(23, 42)
+        assert _args[0](isint, jack=isstring) is _args[0](isint, jack=isstring)
+        assert _npos(atleast=1) is _npos(atleast=1)
+        assert _each(isint, chunksize=4) is _each(isint, chunksize=4)
+
+    def test_distinct (self):
+        assert _and(isstring, isempty) is not _and(isempty, isstring)
+        assert _nis(1, 2) is not _nis(1.0, 2.0)
+        assert _is(1) is not _is(True)
+        assert _isa(int) is not _isa(int, docstring="`True` if an int")
+
+    def test_stateful (self):
+        assert _isa(int, cachesize=8) is not _isa(int, cachesize=8)
+        assert _isa(int, cachesize=8) is not _isa(int)
+        assert _memo(isint) is not _memo(isint)
+        assert _weakmemo(isint) is not _weakmemo(isint)
+
+    def test_stateful_children (self):
+        # a tree over a stateful node keeps that very node
+        first = _memo(len)
+        keep = _and(isstring, first)
+        second = _memo(len)
+        fn = _and(isstring, second)
+        assert fn.children[1] is second
+        fn("bad robot!")
+        assert second.misses == 1
+        assert first.misses == 0
+
+        cached = _isa(Mapping, cachesize=100)
+        fn = _or(cached, isnone)
+        assert fn.children[0] is cached
+        assert _not(_or(cached, isnone)).children[0].children[0] is cached
+
+    def test_docstring (self):
+        # a node whose docstring is changed is no longer handed out
+        fn = _and(isint, _nis(atleast=3))
+        fn.__doc__ = 'x'
+        fresh = _and(isint, _nis(atleast=3))
+        assert fresh is not fn
+        assert fresh.__doc__ is None
+        assert fresh == fn
+        assert _and(isint, _nis(atleast=3)) is fresh
+
+        isa = _isa(complex)
+        isa.__doc__ = 'x'
+        assert _isa(complex) is not isa
+        assert _isa(complex).__doc__ != 'x'
+
+    def test_weak (self):
+        import gc
+        import predicates
+        table = predicates._interntable
+        fn = _contains("bad robot!", 'jack')
+        assert fn in table.values()
+        count = len(table)
+        del fn
+        gc.collect()
+        assert len(table) == count - 1
+
+    def test_maxinterned (self):
+        import predicates
+        (maxinterned, predicates.maxinterned) = (predicates.maxinterned, 4)
+        try:
+            fns = [_contains(n) for n in range(8)]
+            assert len(predicates._interntable) <= 4
+            assert _contains(7) is fns[7]
+        finally:
+            predicates.maxinterned = maxinterned
+
+    def test_quick (self):
+        # factories find their nodes by the identities of their
+        # children, but only ever those very children
+        import predicates
+        fn = _and(isstring, _not(isempty))
+        assert fn in predicates._quicktable.values()
+        assert _and(fn.children[0], fn.children[1]) is fn
+
+        cached = _isa(int, cachesize=8)
+        keep = _or(isint, isnone)
+        fn = _or(cached, isnone)
+        assert fn is not keep
+        assert fn.children[0] is cached
+        assert _isa(int, isint.__doc__) is isint
+        assert _args[1:](isint, jack=isnone) is _args[1:](isint, jack=isnone)
+        assert _args[1:](jack=isint) is not _args[1:](isint)
+
+    def test_deep (self):
+        # building, hashing and comparing deep trees doesn't recurse
+        # all the way down
+        def chain (leaf, depth):
+            fn = leaf
+            for i in range(depth):
+                fn = _not(fn)
+            return fn
+
+        fn = chain(isint, 600)
+        assert fn is chain(isint, 600)
+        assert hash(fn) == hash(chain(isint, 600))
+
+        # (over a stateful node, they're equal but not interned)
+        memo = _memo(len)
+        (first, second) = (chain(memo, 300), chain(memo, 300))
+        assert first is not second
+        assert first == second
+        assert not first != second
+        assert first != chain(memo, 299)
+        assert first != chain(_memo(repr), 300)
+
+
+class TestPredicateNodes (object):
+    def test_introspection (self):
+        fn = _and(isstring, _not(isempty))
+        assert fn.op == '_and'
+        assert fn.children == (isstring, _not(isempty))
+        assert fn.children[1].op == '_not'
+        assert fn.children[1].children == (isempty,)
+
+        assert isstring.op == '_isa'
+        assert isstring.children == ()
+        assert isstring.params == (basestring,)
+        assert _nis(atleast=1, atmost=3).params == (1, 3)
+        assert _contains(23, 42).params == (23, 42)
+        assert _args[0](isint, jack=isstring).children == (isint, isstring)
+
+    def test_equality (self):
+        assert _and(isstring, _not(isempty)) == _and(isstring, _not(isempty))
+        assert _isa((int, float)) == _isa((int, float))
+        assert _nis(exactly=2) == _nis(atleast=2, atmost=2)
+        assert _args[0](isint, jack=isstring) == _args[0](isint, jack=isstring)
+        assert _inkw(exactly=('jack',)) == _inkw(exactly=['jack'])
+        assert _npos(atleast=1) == _npos(atleast=1)
+
+        assert _and(isstring, isempty) != _or(isstring, isempty)
+        assert _and(isstring, isempty) != _and(isempty, isstring)
+        assert _isa(int) != _isa(float)
+        assert _npos(atleast=1) != _nkw(atleast=1)
+        assert _args[0](isint) != _args[1](isint)
+        assert _return(1) != _return(True)
+        assert not _and(isstring) == isstring
+
+    def test_equality_identity (self):
+        l = []
+        assert _is(l) == _is(l)
+        assert _is(l) != _is([])
+        assert _contains(l) == _contains(l)
+        assert _contains(l) != _contains([])
+
+    def test_hash (self):
+        rules = set([_and(isstring, _not(isempty)),
+                     _and(isstring, _not(isempty)),
+                     _or(isint, isfloat),
+                     _is([])])
+        assert len(rules) == 3
+        assert _and(isstring, _not(isempty)) in rules
+        assert hash(_nis(atleast=1)) == hash(_nis(atleast=1))
+
+    def test_operators (self):
+        assert (isstring & ~isnone) == _and(isstring, _not(isnone))
+        assert (isstring & _not(isempty)) == _and(isstring, _not(isempty))
+        assert (isint | isfloat) == _or(isint, isfloat)
+        assert (not_ & isstring) == _and(not_, isstring)
+        assert (truth | isstring) == _or(truth, isstring)
+
+        assert (isstring & _not(isempty))("bad robot!")
+        assert not (isstring & _not(isempty))('')
+        assert (~isnone)(42)
+
+    def test_slots (self):
+        for fn in (_and(isint), _isa(int), _is(None), _contains(42),
+                   _nis(exactly=1), _args(isint), _inkw(exactly=())):
+            assert not hasattr(fn, '__dict__')
+
+    def test_docstring (self):
+        assert isstring.__doc__ == "`True` if `obj` is a :func:`string <basestring>`."
+        assert isnone.__doc__ == "`True` if `obj` *is* :data:`None`."
+        assert _is(None).__doc__ == "`True` if `obj` is None"
+
+    def test_name (self):
+        assert isint.__name__ == '_isa'
+        assert _and(isint, isnone).__name__ == '_and'
+
+        # (so that a node can be wrapped, as the closures it replaced
+        # could be)
+        @functools.wraps(isint)
+        def wrapped (obj):
+            return isint(obj)
+        assert wrapped.__name__ == '_isa'
+        assert wrapped.__doc__ == isint.__doc__
+        assert wrapped(42)
+
+    def test_repr (self):
+        assert repr(_and(isint, _not(isempty))) == "_and(_isa(int), _not(isempty))"
+        assert repr(_args[0](isint, jack=isstring)) == "_args[0:1](_isa(int), jack=_isa(basestring))"
+        assert repr(_args(isint)) == "_args[:](_isa(int))"
+
+    def test_fast (self):
+        values = (None, 0, 3, 3+0j, 42, "bad robot!", (4, 8), [15, 16])
+        for fn in (isint, isnone, _is(None), _nis(1, 5), _nis(exactly=3),
+                   _contains(4, 8), _contains(), _and(isint, _not(isnone)),
+                   _args(isint)):
+            fast = _fast(fn)
+            for val in values:
+                try:
+                    expected = fn(val)
+                except TypeError:
+                    continue
+                assert fast(val) == expected
+
+        # anything else is its own fast callable
+        assert _fast(len) is len
+
+    def test_fast_cachetypes (self):
+        # a fast `_isa` still uses the cache, once it's enabled
+        fast = _fast(issized)
+        try:
+            cachetypes(16)
+            assert fast([])
+            assert not fast(42)
+            assert list in issized.cache
+        finally:
+            cachetypes(0)
+        assert fast([])
+
+    def test_bound (self):
+        # a bound `_isa` is as the node is now: `isinstance`, unless the
+        # cache is enabled
+        bound = issized._bound()
+        assert bound([])
+        assert not bound(42)
+        try:
+            cachetypes(16)
+            bound = issized._bound()
+            assert bound([])
+            assert list in issized.cache
+        finally:
+            cachetypes(0)
+
+    def test_deep_calls (self):
+        # each level of nesting costs a single Python call
+        fn = isint
+        for i in range(400):
+            fn = _and(fn, isint)
+        assert fn(4)
+        assert not fn("bad robot!")
+
+
+class TestBatchEvaluation (object):
+    values = ('', "bad robot!", (), (4, 8), [], {}, {'jack': 4},
+              0, 42, 4.8, 15L, True, False, None, Thing())
+
+    def counted (self, pred):
+        def counting (val):
+            counting.calls += 1
+            return pred(val)
+        counting.calls = 0
+        return counting
+
+    def test_evaluate_many (self):
+        preds = (isint, isstring, isiterable, isnone, istrue,
+                 true_, false_, _return(42),
+                 _and(isstring, _not(isempty)),
+                 _or(isint, isnone, isempty),
+                 _not(isbool, isempty),
+                 _and(), _or(), _not(),
+                 _all(isint), _any(isint), _none(isint),
+                 _zip(isint, isstring), _zip(),
+                 _args(isint),
+                 _and(_or(isnone, istrue), _not(_and(isint, isbool))))
+        for pred in preds:
+            expected = bytearray(1 if pred(val) else 0 for val in self.values)
+            assert pred.evaluate_many(self.values) == expected, pred
+
+    def test_evaluate_many_values (self):
+        assert (_nis(atleast=4).evaluate_many([3, 4, 8, 16.5]) ==
+                bytearray(b'\x00\x01\x01\x01'))
+        assert (_contains(4).evaluate_many([(4, 8), [15], {4: 8}]) ==
+                bytearray(b'\x01\x00\x01'))
+
+    def test_evaluate_many_iterable (self):
+        assert isint.evaluate_many(iter([1, 'a', 2])) == bytearray(b'\x01\x00\x01')
+        assert _and(isint).evaluate_many(x for x in [1, 'a']) == bytearray(b'\x01\x00')
+        assert isint.evaluate_many([]) == bytearray()
+
+    def test_filter_many (self):
+        assert isint.filter_many([1, 'a', 2, None]) == [1, 2]
+        assert (_or(isnone, isstring).filter_many(iter([1, 'a', 2, None])) ==
+                ['a', None])
+
+    def test_partition_many (self):
+        assert (isint.partition_many([1, 'a', 2, None]) ==
+                ([1, 2], ['a', None]))
+        assert _not(isint).partition_many([]) == ([], [])
+
+    def test_and_survivors (self):
+        second = self.counted(isbool)
+        pred = _and(isint, second)
+        assert pred.evaluate_many(self.values) == bytearray(
+            1 if isinstance(val, bool) else 0 for val in self.values)
+        assert second.calls == len([val for val in self.values if isint(val)])
+        assert _and(false_, fail).evaluate_many(self.values) == bytearray(len(self.values))
+
+    def test_or_failures (self):
+        second = self.counted(isstring)
+        pred = _or(isint, second)
+        pred.evaluate_many(self.values)
+        assert second.calls == len([val for val in self.values if not isint(val)])
+        assert _or(true_, fail).evaluate_many(self.values) == bytearray(b'\x01') * len(self.values)
+        assert _not(true_, fail).evaluate_many(self.values) == bytearray(len(self.values))
+
+    def test_isa_old_style (self):
+        class Old:
+            pass
+
+        class OldSized:
+            def __len__ (self):
+                return 0
+
+        values = [Old(), OldSized(), Old(), 42]
+        assert _isa(Old).evaluate_many(values) == bytearray(b'\x01\x00\x01\x00')
+        assert issized.evaluate_many(values) == bytearray(b'\x00\x01\x00\x00')
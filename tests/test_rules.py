@@ -0,0 +1,106 @@
+from predicates import *
+
+from predicates import (
+    _and,
+    _or,
+    _not,
+    _all,
+    _args,
+    _contains,
+
+    RuleSet,
+    )
+
+
+# test helpers
+def counted (pred):
+    def counting (*args, **kwargs):
+        counting.calls += 1
+        return pred(*args, **kwargs)
+    counting.calls = 0
+    return counting
+
+def fail (*args, **kwargs):
+    raise Exception("should've short-circuited past this")
+
+
+class TestRuleSet (object):
+    def test_mask (self):
+        rules = RuleSet([_and(isstring, isempty),
+                         _and(isstring, _not(isempty)),
+                         isint])
+        assert len(rules) == 3
+        assert rules('') == 1
+        assert rules("bad robot!") == 2
+        assert rules(4) == 4
+        assert rules(4.8) == 0
+
+    def test_matching (self):
+        rules = RuleSet([isint, _or(isint, isstring), isstring])
+        assert rules.matching(4) == [isint, _or(isint, isstring)]
+        assert rules.matching(4.8) == []
+
+    def test_empty (self):
+        assert RuleSet([])("bad robot!") == 0
+
+    def test_equivalent (self):
+        preds = [_and(isstring, _not(isempty)),
+                 _or(isint, _and(isstring, isempty)),
+                 _not(isint, isstring),
+                 _all(isint),
+                 _and(),
+                 _or()]
+        rules = RuleSet(preds)
+        for val in (4, '', "bad robot!", 4.8, None, [], [4]):
+            mask = rules(val)
+            for (i, pred) in enumerate(preds):
+                assert bool(mask >> i & 1) == bool(pred(val))
+
+    def test_shared (self):
+        isjack = counted(_contains('jack'))
+        issawyer = counted(_contains('sawyer'))
+        rules = RuleSet([_and(isjack, issawyer),
+                         _or(isjack, issawyer),
+                         _and(ismap, _and(isjack, issawyer)),
+                         _not(isjack)])
+        assert rules({'jack': 4, 'sawyer': 8}) == 7
+        assert isjack.calls == 1
+        assert issawyer.calls == 1
+        assert _and(isjack, issawyer) in rules.shared
+
+    def test_short_circuit (self):
+        rules = RuleSet([_and(isint, fail), _or(isstring, fail)])
+        assert rules("bad robot!") == 2
+
+    def test_lazy (self):
+        # a shared subtree which no rule needs isn't evaluated
+        isjack = counted(_contains('jack'))
+        rules = RuleSet([_and(ismap, isjack), _and(ismap, _not(isjack))])
+        assert rules(4) == 0
+        assert isjack.calls == 0
+
+    def test_args (self):
+        rules = RuleSet([_args[0](isint),
+                         _and(_args[0](isint), _args[1](isstring))])
+        assert rules(4, "bad robot!") == 3
+        assert rules(4, 8) == 1
+        assert rules(4, jack=8) == 3
+
+    def test_deep (self):
+        # deeper than the parser can nest parentheses, with shared
+        # subtrees
+        chain = [isint]
+        for i in range(150):
+            chain.append(_and(isnsiterable, chain[-1]) if i % 2
+                         else _or(isnone, chain[-1]))
+        rules = [chain[-1], _not(chain[-1]), chain[50], chain[100]]
+        mask = RuleSet(rules)
+        for val in ((), 42, None, 4.8):
+            assert mask(val) == sum(1 << i for (i, rule) in enumerate(rules)
+                                    if rule(val))
+
+    def test_many (self):
+        # more rules than fit in a machine word
+        rules = RuleSet([isint] * 100)
+        assert rules(4) == (1 << 100) - 1
+        assert rules('') == 0
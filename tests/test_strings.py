@@ -0,0 +1,152 @@
+import random
+
+import predicates.strings
+from predicates import *
+
+from predicates import (
+    _contains,
+    _contains_any,
+    _contains_all,
+    _startswith,
+    _endswith,
+    )
+
+
+def words (rand, count, alphabet='abc'):
+    return [''.join(rand.choice(alphabet)
+                    for i in xrange(rand.randint(1, 4)))
+            for j in xrange(count)]
+
+
+class Automaton (object):
+    # force the automaton, however few the needles
+    def setup (self):
+        self.minneedles = predicates.strings.minneedles
+        predicates.strings.minneedles = 1
+
+    def teardown (self):
+        predicates.strings.minneedles = self.minneedles
+
+
+class TestContainsAny (Automaton):
+    def test_overlapping (self):
+        pred = _contains_any('he', 'she', 'his', 'hers')
+        assert pred.automaton is not None
+        assert pred("ushers")
+        assert pred("this")
+        assert pred("she")
+        assert not pred("hs")
+        assert not pred("")
+
+    def test_failure_links (self):
+        # 'bcd' is only found by following the failure link from 'abc'
+        pred = _contains_any('abce', 'bcd')
+        assert pred("abcd")
+        assert not pred("abcf")
+
+    def test_equivalent (self):
+        rand = random.Random(4)
+        for i in xrange(200):
+            needles = words(rand, rand.randint(1, 6))
+            text = ''.join(words(rand, 3))
+            assert (_contains_any(*needles)(text)
+                    == any(needle in text for needle in needles))
+
+    def test_empty (self):
+        assert _contains_any() is false_
+        assert _contains_any('')("bad robot!")
+        assert _contains_any('')("")
+
+    def test_unicode (self):
+        pred = _contains_any(u'caf\xe9', 'robot')
+        assert pred(u"le caf\xe9")
+        assert pred(u"bad robot!")
+        assert not pred(u"cafe")
+
+    def test_not_string (self):
+        pred = _contains_any('jack', 'sawyer')
+        assert pred({'jack': 4})
+        assert pred(['kate', 'sawyer'])
+        assert not pred(['jac', 'k'])
+
+    def test_few (self):
+        # below `minneedles`, there's no automaton
+        predicates.strings.minneedles = 3
+        pred = _contains_any('hurley', 'locke')
+        assert pred.automaton is None
+        assert pred("hurley and locke")
+        assert not pred("kate")
+
+
+class TestContainsAll (Automaton):
+    def test_all (self):
+        pred = _contains_all('he', 'she', 'hers')
+        assert pred("ushers")
+        assert not pred("she")
+        assert not pred("")
+
+    def test_repeated (self):
+        pred = _contains_all('jack', 'jack', 'ack')
+        assert pred("jack")
+        assert not pred("jac")
+
+    def test_equivalent (self):
+        rand = random.Random(8)
+        for i in xrange(200):
+            needles = words(rand, rand.randint(1, 6))
+            text = ''.join(words(rand, 4))
+            assert (_contains_all(*needles)(text)
+                    == _contains(*needles)(text))
+
+    def test_empty (self):
+        assert _contains_all() is true_
+        assert _contains_all('')("")
+        assert not _contains_all('', 'a')("")
+
+    def test_not_string (self):
+        pred = _contains_all('jack', 'sawyer')
+        assert pred({'jack': 4, 'sawyer': 8})
+        assert not pred({'jack': 4})
+
+
+class TestAffixes (object):
+    def test_startswith (self):
+        pred = _startswith('bad', 'robot', 'b')
+        assert pred("bad robot!")
+        assert pred("b")
+        assert pred("robots")
+        assert not pred("a bad robot!")
+        assert not pred("")
+
+    def test_endswith (self):
+        pred = _endswith('robot!', 'ot', 'jack')
+        assert pred("bad robot!")
+        assert pred("bot")
+        assert pred(u"jack")
+        assert not pred("ja")
+
+    def test_equivalent (self):
+        rand = random.Random(15)
+        for i in xrange(200):
+            affixes = tuple(words(rand, rand.randint(1, 6)))
+            text = ''.join(words(rand, 2))
+            assert _startswith(*affixes)(text) == text.startswith(affixes)
+            assert _endswith(*affixes)(text) == text.endswith(affixes)
+
+    def test_empty (self):
+        assert _startswith() is false_
+        assert _endswith() is false_
+        assert _startswith('')("")
+        assert _endswith('', 'jack')("kate")
+
+    def test_not_string (self):
+        assert not _startswith('jack')(['jack'])
+        assert not _endswith('jack')(None)
+
+
+class TestInterning (object):
+    def test_interned (self):
+        assert _contains_any('jack', 'kate') is _contains_any('jack', 'kate')
+        assert _startswith('jack') is _startswith('jack')
+        assert _startswith('jack') is not _endswith('jack')
+        assert _contains_any('jack') is not _contains_all('jack')
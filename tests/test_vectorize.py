@@ -0,0 +1,162 @@
+from nose.plugins.skip import SkipTest
+
+try:
+    import numpy
+except ImportError:
+    raise SkipTest("numpy isn't installed")
+
+from functools import partial
+
+from predicates import *
+
+from predicates import (
+    _and,
+    _or,
+    _not,
+    _zip,
+    _all,
+    _any,
+    _none,
+    _args,
+    _nis,
+    _fnis,
+    _npos,
+    _nkw,
+    _inkw,
+    _in,
+    _return,
+
+    _vectorize,
+    )
+
+
+# test helpers
+def fail (*args, **kwargs):
+    raise Exception("should've short-circuited past this")
+
+def counted (pred):
+    def counting (*args, **kwargs):
+        counting.calls += 1
+        return pred(*args, **kwargs)
+    counting.calls = 0
+    return counting
+
+arrays = (
+    numpy.array([1, 4, 8, 15, 16, 23, 42]),
+    numpy.array([0.5, 4.0, float('nan'), 16.5, -23.0]),
+    numpy.array([True, False, True]),
+    numpy.array(['jack', '', 'hurley'], dtype='S'),
+    numpy.array([4, 'kate', None, 8.5, ()], dtype=object),
+    numpy.array([], dtype=int),
+    )
+
+def scalar (pred, array):
+    return numpy.array([bool(pred(val)) for val in array.tolist()],
+                       dtype=bool)
+
+
+class TestVectorize (object):
+    def test_equivalent (self):
+        preds = (
+            isint, isfloat, isbool, isstring, isnone, istrue, isfalse,
+            true_, false_, _return(42),
+            _nis(atleast=4), _nis(atmost=16), _nis(atleast=4, atmost=16),
+            _nis(exactly=8),
+            _and(isint, _nis(atleast=4, atmost=16)),
+            _or(isbool, _nis(atmost=4)),
+            _not(isfloat, _nis(exactly=16)),
+            _and(), _or(), _not(),
+            _all(isint), _none(isint), _zip(isint), _zip(),
+            _args[0](isint), _args[1:](fail),
+            _args[0, 1](isint, fail), _args[-1, 'jack'](isint, isnone),
+            partial(lt, 4), partial(ge, 16), partial(eq, 8),
+            _and(_or(isint, isfloat), partial(gt, 16)),
+            _or(istrue, isempty),
+            _npos(exactly=1), _nkw(atleast=1),
+            _in([4, 16, 23.0, True, 'jack']), _in(['jack', 'kate']),
+            _in([[4], 8]),
+            _or(isstring, _fnis(numpy.abs, atleast=4)),
+            )
+        for pred in preds:
+            vectorized = _vectorize(pred)
+            for array in arrays:
+                try:
+                    expected = scalar(pred, array)
+                except TypeError:
+                    continue
+                assert (vectorized(array) == expected).all(), (pred, array)
+
+    def test_mask (self):
+        fn = _vectorize(_and(isint, _nis(atleast=4, atmost=16)))
+        mask = fn([1, 4, 8, 15, 16, 23, 42])
+        assert mask.dtype == bool
+        assert mask.tolist() == [False, True, True, True, True, False, False]
+
+    def test_fnis_ufunc (self):
+        fn = _vectorize(_fnis(numpy.abs, atmost=4))
+        assert fn(numpy.array([-8, -4, 0, 4, 8])).tolist() == [False, True, True, True, False]
+
+        # (`numpy.abs` doesn't apply to strings, but `isint` guards it)
+        fn = _vectorize(_and(isint, _fnis(numpy.abs, atmost=2)))
+        assert fn(numpy.array(['jack'])).tolist() == [False]
+        assert fn(numpy.array([-1, 4])).tolist() == [True, False]
+
+    def test_fallback_undecided (self):
+        # scalar children only see the rows the children before them
+        # left undecided
+        slow = counted(lambda val: val % 2 == 0)
+        fn = _vectorize(_and(_nis(atleast=10), slow))
+        assert fn(numpy.arange(20)).tolist() == [val >= 10 and val % 2 == 0
+                                                 for val in range(20)]
+        assert slow.calls == 10
+
+        fn = _vectorize(_or(true_, fail))
+        assert fn(numpy.arange(20)).all()
+
+    def test_scalar_guard (self):
+        # ...and so do vectorized children, after a scalar guard
+        pred = _and(lambda x: isinstance(x, int), _fnis(numpy.abs, atleast=1))
+        array = numpy.array([1, 'a'], dtype=object)
+        assert _vectorize(pred)(array).tolist() == [True, False]
+        assert scalar(pred, array).tolist() == [True, False]
+
+    def test_columns (self):
+        columns = {
+            'price': numpy.array([4.0, 8.5, 150.0, 16.0]),
+            'qty':   numpy.array([1, 0, 5, 3]),
+            }
+        fn = _vectorize(_args(price=_nis(atmost=100), qty=_nis(atleast=1)))
+        assert fn(columns).tolist() == [True, False, False, True]
+
+        assert _vectorize(_inkw(atleast=['qty']))(columns).all()
+        assert not _vectorize(_npos(atleast=1))(columns).any()
+
+        # missing columns are `None`
+        fn = _vectorize(_args(price=_nis(atmost=100), jack=isnone))
+        assert fn(columns).tolist() == [True, True, False, True]
+
+        fn = _vectorize(_args['price', 'qty'](_nis(atmost=100), _nis(atleast=1)))
+        assert fn(columns).tolist() == [True, False, False, True]
+
+        # anything else is evaluated row by row, as keyword arguments
+        fn = _vectorize(_and(_args(price=_nis(atmost=100)),
+                             lambda price, qty: price * qty > 10))
+        assert fn(columns).tolist() == [False, False, False, True]
+
+    def test_columns_positional (self):
+        # over columns, there are no positional arguments
+        columns = {'jack': numpy.array([4, 8])}
+        for pred in (_all(isint), _any(isint), _none(isint), _zip(isint)):
+            fn = _vectorize(pred)
+            assert fn(columns).tolist() == [pred(jack=4), pred(jack=8)], pred
+
+    def test_bad_data (self):
+        fn = _vectorize(isint)
+        for data in (numpy.zeros((2, 2)),
+                     {'jack': [4, 8], 'kate': [15]}):
+            try:
+                fn(data)
+            except ValueError:
+                pass
+            else:
+                assert False, "should've raised ValueError"